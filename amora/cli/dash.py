@@ -1,3 +1,5 @@
+from typing import Optional
+
 import typer
 
 app = typer.Typer(help="Amora Web UI")
@@ -71,6 +73,11 @@ def serve():
     ...
     ```
 
+    ## Cache Warming
+
+    With `AMORA_DASH_CACHE_WARMER_INTERVAL_SECONDS` set, `amora dash warm --interval`
+    runs on a separate process alongside the workers, keeping the storage cache warm.
+
     ## User Authentication
 
     ![amora dash authentication](../static/user-guide/web-ui/web-ui-auth.gif)
@@ -108,7 +115,7 @@ def serve():
     from amora.dash.app import dash_app
     from amora.dash.config import settings
     from amora.dash.gunicorn.application import StandaloneApplication
-    from amora.dash.gunicorn.config import child_exit, when_ready
+    from amora.dash.gunicorn.config import child_exit, on_exit, when_ready
 
     if settings.DEBUG:
         return dash_app.run(
@@ -127,40 +134,56 @@ def serve():
                 "child_exit": child_exit,
             }
         )
+    if settings.CACHE_WARMER_INTERVAL_SECONDS is not None:
+        options.update(
+            {
+                "when_ready": when_ready,
+                "on_exit": on_exit,
+            }
+        )
 
     StandaloneApplication(app=dash_app.server, options=options).run()
 
 
+@app.command("warm")
+def warm(
+    interval: Optional[int] = typer.Option(
+        None,
+        "--interval",
+        help="Warms the cache again every `interval` seconds, until interrupted",
+    ),
+):
+    """
+    Pre-computes the data behind the UI pages into the storage cache, so users never
+    wait on a cold cache: the summary and data sample of every model, and the answer
+    of every question, including the ones of the dashboards. The computations run
+    concurrently, on `AMORA_DASH_THREAD_POOL_EXECUTOR_WORKERS` threads.
+
+    Requires the storage cache, `AMORA_STORAGE_CACHE_ENABLED=1`. `amora dash serve`
+    keeps the cache warm on the background when `AMORA_DASH_CACHE_WARMER_INTERVAL_SECONDS`
+    is set.
+    """
+    import time
+
+    from amora.dash.cache_warmer import warm_cache
+
+    while True:
+        result = warm_cache()
+        typer.echo(
+            f"🔥 Warmed {result.succeeded} cache entries in {result.seconds:.1f}s"
+            f" ({result.failed} failed)"
+        )
+        if interval is None:
+            return
+        time.sleep(interval)
+
+
 @app.command(
     "inspect",
-    help="Inspect the project data queries and generates a cache to speedup the interface",
+    help="Inspect the project data queries and generates a cache to speedup the interface. "
+    "An alias of `amora dash warm`",
 )
 def inspect():
-    from concurrent.futures import ThreadPoolExecutor
+    from amora.dash.cache_warmer import warm_cache
 
-    from amora.config import settings as amora_settings
-    from amora.dash.config import settings
-    from amora.logger import logger
-    from amora.meta_queries import summarize
-    from amora.models import list_models
-    from amora.providers.bigquery import sample
-    from amora.questions import QUESTIONS
-
-    if not amora_settings.STORAGE_CACHE_ENABLED:
-        logger.debug("Cache disabled. Skipping cache generation.")
-        return
-
-    with ThreadPoolExecutor(
-        max_workers=settings.THREAD_POOL_EXECUTOR_WORKERS
-    ) as executor:
-        # cache model summary
-        for model, path_ in list_models():
-            executor.submit(summarize, model)
-
-        # cache model data sample
-        for model, path_ in list_models():
-            executor.submit(sample, model)
-
-        # cache data questions
-        for question in QUESTIONS:
-            executor.submit(question.answer_df)
+    warm_cache()
@@ -1,7 +1,6 @@
 from datetime import datetime
 from typing import Optional
 
-import pandas as pd
 import typer
 
 from amora.cli.shared_options import models_option
@@ -22,6 +21,8 @@ def feature_store_plan():
     The changes computed by the `plan` command are informational, and are not actually applied to the registry.
     """
 
+    import pandas as pd
+
     from amora.feature_store import fs, registry
     from amora.feature_store.config import settings
 
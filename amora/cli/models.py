@@ -4,23 +4,8 @@ from pathlib import Path
 from typing import List, Optional
 
 import typer
-from jinja2 import Environment, PackageLoader, select_autoescape
-from rich.console import Console
-from rich.table import Table
-from rich.text import Text
-from shed import shed
 
 from amora.config import settings
-from amora.models import Model, list_models
-from amora.providers.bigquery import (
-    BIGQUERY_TYPES_TO_PYTHON_TYPES,
-    BIGQUERY_TYPES_TO_SQLALCHEMY_TYPES,
-    DryRunResult,
-    dry_run,
-    estimated_query_cost_in_usd,
-    estimated_storage_cost_in_usd,
-    get_schema,
-)
 
 app = typer.Typer(help="List or import Amora Models")
 
@@ -45,13 +30,27 @@ def models_list(
     amora models list
     ```
     You can also use the option `--with-total-bytes` to use
-    BigQuery query dry run feature to gather model total bytes information
+    BigQuery query dry run feature to gather model total bytes information.
+    Models are dry run concurrently, on `AMORA_GCP_BIGQUERY_DRY_RUN_NUM_THREADS`
+    threads, and dry run results are reused for up to
+    `AMORA_GCP_BIGQUERY_DRY_RUN_CACHE_MAX_AGE_SECONDS`.
 
     ```shell
     amora models list --with-total-bytes
     ```
 
     """
+    from rich.console import Console
+    from rich.table import Table
+    from rich.text import Text
+
+    from amora.models import Model, list_models
+    from amora.providers.bigquery import (
+        DryRunResult,
+        dry_run_models,
+        estimated_query_cost_in_usd,
+        estimated_storage_cost_in_usd,
+    )
 
     @dataclass
     class ResultItem:
@@ -115,16 +114,17 @@ def models_list(
 
             return None
 
-    results = []
     placeholder = "-"
 
-    for model, _model_file_path in list_models():
-        if with_total_bytes:
-            result_item = ResultItem(model=model, dry_run_result=dry_run(model))
-        else:
-            result_item = ResultItem(model=model, dry_run_result=None)
-
-        results.append(result_item)
+    models = [model for model, _model_file_path in list_models()]
+    if with_total_bytes:
+        dry_run_results = dry_run_models(models)
+        results = [
+            ResultItem(model=model, dry_run_result=dry_run_results[model])
+            for model in models
+        ]
+    else:
+        results = [ResultItem(model=model, dry_run_result=None) for model in models]
 
     if format == "table":
         table = Table(
@@ -192,6 +192,14 @@ def models_import(
     amora models import --table-reference my_gcp_project.my_dataset.my_table my_gcp_project/my_dataset/my_table
     ```
     """
+    from jinja2 import Environment, PackageLoader, select_autoescape
+    from shed import shed
+
+    from amora.providers.bigquery import (
+        BIGQUERY_TYPES_TO_PYTHON_TYPES,
+        BIGQUERY_TYPES_TO_SQLALCHEMY_TYPES,
+        get_schema,
+    )
 
     env = Environment(
         loader=PackageLoader("amora"),
@@ -0,0 +1,45 @@
+from typing import Optional
+
+import typer
+
+app = typer.Typer(help="Manage the storage cache")
+
+
+@app.command(name="gc")
+def gc(
+    max_bytes: Optional[int] = typer.Option(
+        None,
+        "--max-bytes",
+        help="Size budget of the cache, in bytes. Defaults to `AMORA_STORAGE_CACHE_MAX_BYTES`",
+    ),
+    max_age: Optional[int] = typer.Option(
+        None,
+        "--max-age",
+        help="Maximum age of a cache entry, in seconds",
+    ),
+    dry_run: bool = typer.Option(
+        False,
+        "--dry-run",
+        help="Reports what would be removed, without removing it",
+    ),
+) -> None:
+    """
+    Garbage collects the storage cache of the configured `AMORA_STORAGE_CACHE_PROVIDER`.
+
+    Expired entries, and entries older than `--max-age`, are removed. Then, while the
+    cache is larger than `--max-bytes`, the least recently used entries are removed.
+    """
+    from datetime import timedelta
+
+    from amora.storage import CACHE
+
+    result = CACHE.gc(
+        max_bytes=max_bytes,
+        max_age=timedelta(seconds=max_age) if max_age is not None else None,
+        dry_run=dry_run,
+    )
+    verb = "Would remove" if dry_run else "Removed"
+    typer.echo(
+        f"🗑 {verb} {result.removed_entries} entries ({result.removed_bytes} bytes). "
+        f"{result.entries} entries ({result.size_bytes} bytes) remaining."
+    )
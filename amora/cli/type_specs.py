@@ -1,3 +1,9 @@
+from enum import Enum
 from typing import List
 
 Models = List[str]
+
+
+class OverBudgetActions(str, Enum):
+    abort = "abort"
+    skip = "skip"
@@ -1,16 +1,16 @@
 from concurrent import futures
-from typing import Dict, List, Optional
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Set
 
-import pytest
 import typer
 
-from amora import compilation, manifest, materialization, utils
-from amora.cli import dash, feature_store, models
+from amora.cli import dash, feature_store, models, storage
 from amora.cli.shared_options import force_option, models_option, target_option
-from amora.cli.type_specs import Models
+from amora.cli.type_specs import Models, OverBudgetActions
 from amora.config import settings
-from amora.dag import DependencyDAG
-from amora.models import list_models
+
+if TYPE_CHECKING:
+    from amora.materialization import Plan
 
 app = typer.Typer(
     pretty_exceptions_enable=False,
@@ -28,36 +28,59 @@ def compile(
 ) -> None:
     """
     Generates executable SQL from model files. Compiled SQL files are written to the `./target` directory.
+
+    Models are compiled concurrently by `AMORA_COMPILE_NUM_WORKERS` processes, and the compiled SQL
+    is stored on a content-addressed cache, so unchanged models are copied from the cache
+    instead of compiled again, even with `--force`. The models to compile are selected
+    from the models index, and only the cache misses are imported.
+
+    Model files are only hashed when their inode, size or modification time changed,
+    and the hashing hit/miss counters are logged at the end of the compilation.
     """
+    from amora import compilation, manifest
+    from amora.hashing import file_hasher
+    from amora.logger import logger
+    from amora.models import get_models_index
+    from amora.utils import target_path_for_model_path
 
     current_manifest = manifest.Manifest.from_project()
     previous_manifest = manifest.Manifest.load()
+    models_index = get_models_index()
 
     if force or not previous_manifest:
         compilation.remove_compiled_files()
-        models_to_compile = list_models()
+        entries_to_compile = list(models_index.entries.values())
     else:
         removed = previous_manifest.models.keys() - current_manifest.models.keys()
         compilation.remove_compiled_files(removed)
-        models_to_compile = current_manifest.get_models_to_compile(previous_manifest)
+        names_to_compile = current_manifest.get_model_names_to_compile(
+            previous_manifest
+        )
+        entries_to_compile = models_index.select(
+            lambda entry: entry.unique_name in names_to_compile
+        )
 
-    for model, model_file_path in models_to_compile:
+    model_file_paths: List[Path] = []
+    for entry in entries_to_compile:
+        model_file_path = Path(entry.path)
         if models and not force and model_file_path.stem not in models:
             continue
 
-        source_sql_statement = model.source()
-        if source_sql_statement is None:
+        if not entry.has_source:
             typer.echo(f"⏭ Skipping compilation of model `{model_file_path}`")
             continue
 
-        target_file_path = model.target_path()
+        model_file_paths.append(model_file_path)
+
+    for model_file_path, content in compilation.compile_model_files(model_file_paths):
+        target_file_path = target_path_for_model_path(model_file_path)
         typer.echo(f"🏗 Compiling model `{model_file_path}` -> `{target_file_path}`")
 
-        content = compilation.compile_statement(source_sql_statement)
         target_file_path.parent.mkdir(parents=True, exist_ok=True)
         target_file_path.write_text(content)
 
     current_manifest.save()
+    logger.info("Model files hashing stats", extra=file_hasher.stats.dict())
 
 
 @app.command()
@@ -73,63 +96,255 @@ def materialize(
         "--no-compile",
         help="Don't run `amora compile` before the materialization",
     ),
+    plan: bool = typer.Option(
+        False,
+        "--plan",
+        help="Forecast the bytes processed and the cost of the materialization, "
+        "without materializing",
+    ),
+    max_bytes: Optional[int] = typer.Option(
+        None,
+        "--max-bytes",
+        help="Byte budget of each model. Models whose query would process more bytes, "
+        "or can't be dry run, are over budget",
+    ),
+    over_budget: OverBudgetActions = typer.Option(
+        OverBudgetActions.abort,
+        "--over-budget",
+        help="With models over the `--max-bytes` budget, abort the whole "
+        "materialization or skip those models",
+    ),
+    skip_unchanged: bool = typer.Option(
+        False,
+        "--skip-unchanged",
+        help="Skip the models whose compiled SQL and upstream tables didn't change "
+        "since their last materialization",
+    ),
 ) -> None:
     """
     Executes the compiled SQL against the current target database.
+
+    Each model is materialized as soon as all of its dependencies are materialized,
+    running at most `AMORA_MATERIALIZE_NUM_THREADS` models concurrently. Models with
+    the longest chain of dependents are started first. The DAG of the compiled models
+    is read from the manifest, and only the models which are dry run or materialized
+    are imported.
+
+    Materializations are I/O bound, waiting on BigQuery jobs, so they run on threads
+    sharing a single BigQuery client. `AMORA_MATERIALIZE_NUM_THREADS` can be set well
+    above the number of CPUs.
+
+    With `--plan`, every model is dry run concurrently, and the bytes it would process
+    and their estimated cost are shown per model and per DAG branch, i.e. the model
+    and the models upstream of it, without materializing anything:
+
+    ```shell
+    amora materialize --plan
+    ```
+
+    With `--max-bytes`, the plan is checked before materializing. If a model's query
+    would process more than `--max-bytes`, or can't be dry run, nothing is materialized,
+    or, with `--over-budget skip`, only the models over budget are skipped:
+
+    ```shell
+    amora materialize --max-bytes 100000000000 --over-budget skip
+    ```
+
+    With `--skip-unchanged`, the state of each materialization is stored next to the
+    manifest, at `AMORA_MATERIALIZATION_STATE_PATH`: the hash of the compiled SQL
+    and the last modified time and row count of the tables upstream of the model.
+    Models whose SQL, table and upstream tables are unchanged since their last
+    materialization are skipped, and only the stale models and the models downstream
+    of them are materialized:
+
+    ```shell
+    amora materialize --skip-unchanged
+    ```
     """
+    from amora import materialization
+    from amora.dag import DependencyDAG
+
     if not no_compile:
         force = depends and models != []
         compile(models=models, target=target, force=force)
 
-    model_to_task: Dict[str, materialization.Task] = {}
+    project_dag = DependencyDAG.from_target()
+    target_file_paths: Dict[str, Path] = {
+        model_name: target_file_path
+        for model_name, target_file_path in project_dag.nodes(data="target_file_path")
+        if target_file_path is not None
+    }
 
-    for target_file_path in utils.list_target_files():
-        task = materialization.Task.for_target(target_file_path)
-
-        if models and target_file_path.stem not in models:
-            continue
+    model_names = {
+        model_name
+        for model_name, target_file_path in target_file_paths.items()
+        if not models or target_file_path.stem in models
+    }
+    if depends:
+        reachability = project_dag.reachability()
+        for model_name in list(model_names):
+            model_names.update(
+                ancestor
+                for ancestor in reachability.ancestors(model_name)
+                if ancestor in target_file_paths
+            )
 
-        model_to_task[task.model.unique_name()] = task
+    dag_nodes = set(model_names)
+    for model_name in model_names:
+        dag_nodes.update(project_dag.predecessors(model_name))
+    dag = project_dag.subgraph(dag_nodes).copy()
 
-        if depends:
-            for dependency_target_path in utils.recursive_dependencies_targets(
-                task.model
-            ):
-                dependency_task = materialization.Task.for_target(
-                    dependency_target_path
-                )
-                model_to_task[dependency_task.model.unique_name()] = dependency_task
+    model_to_task: Dict[str, materialization.Task] = {}
 
-    dag = DependencyDAG.from_tasks(tasks=model_to_task.values())
+    def task_for(model_name: str) -> materialization.Task:
+        if model_name not in model_to_task:
+            model_to_task[model_name] = materialization.Task.for_target(
+                target_file_paths[model_name]
+            )
+        return model_to_task[model_name]
 
     if draw_dag:
         dag.draw()
 
-    with futures.ProcessPoolExecutor(
-        max_workers=settings.MATERIALIZE_NUM_THREADS
-    ) as executor:
-        for models_to_materialize in dag.topological_generations():
-            current_tasks: List[materialization.Task] = []
-            for model_name in models_to_materialize:
-                if model_name in model_to_task:
-                    current_tasks.append(model_to_task[model_name])
-                else:
+    skipped_models: Set[str] = set()
+    up_to_date_models: Set[str] = set()
+    state = materialization.MaterializationState()
+    if skip_unchanged:
+        state = materialization.MaterializationState.load()
+        up_to_date_models = model_names - materialization.stale_models(
+            {
+                model_name: target_file_paths[model_name].read_text()
+                for model_name in dag
+                if model_name in model_names
+            },
+            dag,
+            state,
+        )
+
+    if plan or max_bytes is not None:
+        materialization_plan = materialization.plan(
+            [
+                task_for(model_name)
+                for model_name in dag
+                if model_name in model_names and model_name not in up_to_date_models
+            ],
+            dag,
+            max_bytes=max_bytes,
+        )
+        _print_plan(materialization_plan)
+        if plan:
+            return
+
+        if materialization_plan.over_budget:
+            unknown_bytes_models = materialization_plan.unknown_bytes
+            over_budget_models = [
+                model_name
+                for model_name in materialization_plan.over_budget
+                if model_name not in unknown_bytes_models
+            ]
+            if over_budget == OverBudgetActions.abort:
+                if over_budget_models:
+                    typer.echo(
+                        f"🛑 Models over the budget of {max_bytes} bytes: "
+                        f"{', '.join(over_budget_models)}.",
+                        err=True,
+                    )
+                if unknown_bytes_models:
+                    typer.echo(
+                        f"🛑 Models whose bytes couldn't be forecast: "
+                        f"{', '.join(unknown_bytes_models)}.",
+                        err=True,
+                    )
+                typer.echo("Nothing was materialized.", err=True)
+                raise typer.Exit(1)
+
+            skipped_models.update(materialization_plan.over_budget)
+
+    try:
+        with futures.ThreadPoolExecutor(
+            max_workers=settings.MATERIALIZE_NUM_THREADS
+        ) as executor:
+
+            def submit(model_name: str) -> Optional[futures.Future]:
+                if model_name not in model_names:
                     typer.echo(f"⚠️  Skipping `{model_name}`")
-                    continue
+                    return None
 
-            if not current_tasks:
-                continue
+                if model_name in skipped_models:
+                    typer.echo(f"⚠️  Skipping `{model_name}`, over the byte budget")
+                    return None
 
-            results = executor.map(
-                materialization.materialize,
-                [current_task.sql_stmt for current_task in current_tasks],
-                [current_task.model.unique_name() for current_task in current_tasks],
-                [current_task.model.__model_config__ for current_task in current_tasks],
-            )
+                if model_name in up_to_date_models:
+                    typer.echo(f"⏭ Skipping `{model_name}`, up to date")
+                    return None
 
-            for result in results:
+                task = task_for(model_name)
+                if skip_unchanged:
+                    return executor.submit(
+                        materialization.materialize_task, task, state
+                    )
+
+                return executor.submit(
+                    materialization.materialize,
+                    task.sql_stmt,
+                    task.model.unique_name(),
+                    task.model.__model_config__,
+                )
+
+            for _model_name, future in dag.schedule(
+                submit, max_concurrency=settings.MATERIALIZE_NUM_THREADS
+            ):
+                result = future.result()
                 if result:
                     typer.echo(result)
+    finally:
+        # Records the models materialized so far, even if one of them failed
+        if skip_unchanged:
+            state.save()
+
+
+def _print_plan(materialization_plan: "Plan") -> None:
+    import humanize
+    from rich.console import Console
+    from rich.table import Table
+
+    def cost(value: Optional[float]) -> str:
+        if value is None:
+            return "-"
+        return f"{value:.{settings.MONEY_DECIMAL_PLACES}f}"
+
+    table = Table(
+        show_header=True,
+        header_style="bold",
+        show_lines=True,
+        width=settings.CLI_CONSOLE_MAX_WIDTH,
+        row_styles=["none", "dim"],
+    )
+    table.add_column("Model name", style="green bold", no_wrap=True)
+    table.add_column("Bytes", no_wrap=True)
+    table.add_column("Estimated cost", no_wrap=True)
+    table.add_column("Branch bytes", no_wrap=True)
+    table.add_column("Branch estimated cost", no_wrap=True)
+    table.add_column("Over budget?", no_wrap=True, justify="center")
+
+    for item in materialization_plan.items.values():
+        table.add_row(
+            item.model_name,
+            "-" if item.total_bytes is None else humanize.naturalsize(item.total_bytes),
+            cost(item.estimated_cost),
+            humanize.naturalsize(item.branch_bytes),
+            cost(item.branch_estimated_cost),
+            "🔴" if item.over_budget else "🟢",
+        )
+    table.add_row(
+        "Total",
+        humanize.naturalsize(materialization_plan.total_bytes),
+        cost(materialization_plan.estimated_cost),
+        style="bold",
+    )
+
+    console = Console(width=settings.CLI_CONSOLE_MAX_WIDTH)
+    console.print(table)
 
 
 @app.command(
@@ -141,6 +356,7 @@ def test(ctx: typer.Context) -> None:
     to ensure that the data state is up-to-date. Optional arguments are passed
     to pytest.
     """
+    import pytest
 
     pytest_args = settings.DEFAULT_PYTEST_ARGS + ctx.args
     return_code = pytest.main(pytest_args)
@@ -151,3 +367,4 @@ def test(ctx: typer.Context) -> None:
 app.add_typer(dash.app, name="dash")
 app.add_typer(models.app, name="models")
 app.add_typer(feature_store.app, name="feature-store")
+app.add_typer(storage.app, name="storage")
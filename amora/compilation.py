@@ -1,12 +1,23 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent import futures
 from pathlib import Path
-from typing import Iterable, Optional, Union
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple, Union, cast
 
+import sqlalchemy
+import sqlalchemy_bigquery
 import sqlparse
+from sqlalchemy.sql.traversals import HasCacheKey
 from sqlalchemy_bigquery import STRUCT, BigQueryDialect
 from sqlalchemy_bigquery.base import BigQueryCompiler
 
+from amora.config import settings
+from amora.models import ModelIndex, amora_model_for_path, get_models_index, metadata
 from amora.protocols import Compilable
 from amora.utils import list_target_files
+from amora.version import VERSION
 
 
 class AmoraBigQueryCompiler(BigQueryCompiler):
@@ -47,12 +58,62 @@ dialect = BigQueryDialect()
 dialect.statement_compiler = AmoraBigQueryCompiler
 
 
-def compile_statement(statement: Compilable) -> str:
-    raw_sql = str(
+_compiled_statements: "OrderedDict[Hashable, str]" = OrderedDict()
+_compiled_statements_lock = threading.Lock()
+
+
+def _statement_cache_key(statement: Compilable, pretty: bool) -> Optional[Hashable]:
+    if not isinstance(statement, HasCacheKey):
+        return None
+
+    # The sqlalchemy stubs don't declare `HasCacheKey._generate_cache_key`
+    cache_key = cast(Any, statement)._generate_cache_key()
+    if cache_key is None:
+        return None
+
+    key = (
+        cache_key.key,
+        tuple(bind.effective_value for bind in cache_key.bindparams),
+        pretty,
+    )
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def compile_statement(statement: Compilable, pretty: bool = False) -> str:
+    """
+    Compiles the statement into BigQuery SQL, with literal values rendered inline.
+
+    By default, the raw dialect SQL is returned. With `pretty=True`, the SQL is
+    reindented with `sqlparse`, which is considerably slower and only worth it
+    for SQL that is meant to be read, like the compiled files written to `./target`.
+
+    Compiled statements are memoized on a LRU keyed by the statement structure
+    and its bound values, of up to `settings.COMPILE_STATEMENT_CACHE_SIZE` entries.
+    """
+    key = _statement_cache_key(statement, pretty)
+    if key is not None:
+        with _compiled_statements_lock:
+            if key in _compiled_statements:
+                _compiled_statements.move_to_end(key)
+                return _compiled_statements[key]
+
+    sql = str(
         statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True})
     )
-    formatted_sql = sqlparse.format(raw_sql, reindent=True, indent_columns=True)
-    return formatted_sql
+    if pretty:
+        sql = sqlparse.format(sql, reindent=True, indent_columns=True)
+
+    if key is not None:
+        with _compiled_statements_lock:
+            _compiled_statements[key] = sql
+            while len(_compiled_statements) > settings.COMPILE_STATEMENT_CACHE_SIZE:
+                _compiled_statements.popitem(last=False)
+
+    return sql
 
 
 def remove_compiled_files(files: Optional[Iterable[Union[str, Path]]] = None) -> None:
@@ -61,3 +122,118 @@ def remove_compiled_files(files: Optional[Iterable[Union[str, Path]]] = None) ->
 
     for model_file in files:
         Path(model_file).unlink(missing_ok=True)
+
+
+class CompilationCache:
+    """
+    A content-addressed store of compiled SQL, located at `settings.COMPILATION_CACHE_PATH`.
+
+    A model compilation key is derived from the checksum of the model file, the keys of
+    its dependencies and the versions of amora, SQLAlchemy and the BigQuery dialect. Any
+    change to one of those results in a new key, so entries never need to be invalidated.
+    """
+
+    def __init__(self, index: ModelIndex, path: Optional[Path] = None):
+        self.index = index
+        self.path = path or settings.compilation_cache_path
+        self._keys: Dict[str, str] = {}
+        self._entries_by_name = {
+            entry.unique_name: entry for entry in index.entries.values()
+        }
+
+    def key_for_path(self, model_file_path: Path) -> Optional[str]:
+        entry = self.index.entries.get(model_file_path.as_posix())
+        if entry is None:
+            return None
+        return self._key_for_name(entry.unique_name)
+
+    def _key_for_name(self, unique_name: str) -> str:
+        if unique_name in self._keys:
+            return self._keys[unique_name]
+
+        hash = hashlib.sha256(
+            f"{VERSION}:{sqlalchemy.__version__}:{sqlalchemy_bigquery.__version__}:"
+            f"{metadata.schema}:{unique_name}".encode("utf-8")
+        )
+        entry = self._entries_by_name.get(unique_name)
+        if entry is not None:
+            hash.update(entry.checksum.encode("utf-8"))
+            for dependency in sorted(entry.dependencies):
+                hash.update(self._key_for_name(dependency).encode("utf-8"))
+
+        self._keys[unique_name] = hash.hexdigest()
+        return self._keys[unique_name]
+
+    def _path_for_key(self, key: str) -> Path:
+        return self.path.joinpath(key[:2], key)
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            return self._path_for_key(key).read_text()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, sql: str) -> None:
+        path = self._path_for_key(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{key}.{os.getpid()}")
+        tmp_path.write_text(sql)
+        os.replace(tmp_path, path)
+
+
+def _compile_model_file(model_file_path: Path) -> str:
+    model = amora_model_for_path(model_file_path)
+    source = model.source()
+    if source is None:
+        raise ValueError(f"Model `{model_file_path}` has no source to compile")
+
+    return compile_statement(source, pretty=True)
+
+
+def compile_model_files(
+    model_file_paths: Iterable[Path], num_workers: Optional[int] = None
+) -> Iterable[Tuple[Path, str]]:
+    """
+    Compiles the models defined at `model_file_paths`, yielding `(model_file_path, sql)`
+    tuples. Compiled SQL is reused from the `CompilationCache` whenever possible, and
+    cache misses are compiled concurrently on a process pool of
+    `settings.COMPILE_NUM_WORKERS` workers.
+    """
+    if num_workers is None:
+        num_workers = settings.COMPILE_NUM_WORKERS
+
+    cache = CompilationCache(index=get_models_index())
+    misses: List[Tuple[Path, Optional[str]]] = []
+
+    for model_file_path in model_file_paths:
+        key = cache.key_for_path(model_file_path)
+        sql = cache.get(key) if key else None
+
+        if sql is None:
+            misses.append((model_file_path, key))
+        else:
+            yield model_file_path, sql
+
+    if not misses:
+        return
+
+    paths = [model_file_path for model_file_path, _key in misses]
+    executor = None
+    if num_workers > 1 and len(misses) > 1:
+        executor = futures.ProcessPoolExecutor(
+            max_workers=min(num_workers, len(misses))
+        )
+
+    try:
+        results = (
+            executor.map(_compile_model_file, paths)
+            if executor
+            else map(_compile_model_file, paths)
+        )
+        for (model_file_path, key), sql in zip(misses, results):
+            if key:
+                cache.put(key, sql)
+            yield model_file_path, sql
+    finally:
+        if executor:
+            executor.shutdown()
@@ -21,6 +21,17 @@ class StorageCacheProviders(str, Enum):
     gcs = "gcs"
 
 
+class StorageCacheKeyModes(str, Enum):
+    ttl = "ttl"
+    content = "content"
+
+
+class SummaryModes(str, Enum):
+    exact = "exact"
+    approximate = "approximate"
+    sampled = "sampled"
+
+
 class Settings(BaseSettings):
     TARGET_PROJECT: str
     TARGET_SCHEMA: str
@@ -30,6 +41,10 @@ class Settings(BaseSettings):
     MODELS_PATH: Optional[Path]
     TARGET_PATH: Optional[Path]
     MANIFEST_PATH: Optional[Path]
+    MODELS_INDEX_PATH: Optional[Path]
+    COMPILATION_CACHE_PATH: Optional[Path]
+    DRY_RUN_CACHE_PATH: Optional[Path]
+    MATERIALIZATION_STATE_PATH: Optional[Path]
 
     CLI_CONSOLE_MAX_WIDTH: int = 160
     CLI_MATERIALIZATION_DAG_FIGURE_SIZE: Tuple[_Width, _Height] = (32, 32)
@@ -40,7 +55,14 @@ class Settings(BaseSettings):
     GCP_BIGQUERY_ACTIVE_STORAGE_COST_PER_GIGABYTE_IN_USD: float = 0.020
 
     GCP_BIGQUERY_DEFAULT_LIMIT_SIZE: int = 1000
-
+    # https://cloud.google.com/bigquery/docs/reference/storage
+    GCP_BIGQUERY_STORAGE_READ_API_ENABLED: bool = False
+    GCP_BIGQUERY_DRY_RUN_NUM_THREADS: int = 8
+    GCP_BIGQUERY_DRY_RUN_RETRY_DEADLINE_SECONDS: float = 60.0
+    GCP_BIGQUERY_DRY_RUN_CACHE_MAX_AGE_SECONDS: float = 3600.0
+
+    COMPILE_NUM_WORKERS: int = multiprocessing.cpu_count()
+    COMPILE_STATEMENT_CACHE_SIZE: int = 1024
     MATERIALIZE_NUM_THREADS: int = multiprocessing.cpu_count()
 
     LOCAL_ENGINE_ECHO: bool = False
@@ -52,6 +74,15 @@ class Settings(BaseSettings):
     STORAGE_GCS_BUCKET_NAME: str = "amora-storage"
     STORAGE_LOCAL_CACHE_PATH: Path = Path(mkdtemp())
     STORAGE_PARQUET_ENGINE: Literal["auto", "pyarrow", "fastparquet"] = "pyarrow"
+    STORAGE_CACHE_MAX_BYTES: Optional[int] = None
+    STORAGE_CACHE_INDEX_FLUSH_INTERVAL_SECONDS: float = 5.0
+    STORAGE_CACHE_KEY_MODE: StorageCacheKeyModes = StorageCacheKeyModes.ttl
+    STORAGE_CACHE_CONTENT_VERSION_MAX_AGE_SECONDS: float = 60.0
+    STORAGE_MEMORY_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    STORAGE_MEMORY_CACHE_MAX_AGE_SECONDS: Optional[float] = None
+    STORAGE_MEMORY_CACHE_STALE_WHILE_REVALIDATE: bool = False
+    SUMMARY_SAMPLE_PERCENTAGE: int = 10
+    SUMMARY_SAMPLE_PARTITION_DAYS: Optional[int] = 30
 
     LOGGER_LOG_LEVEL: int = logging.DEBUG
 
@@ -103,6 +134,46 @@ class Settings(BaseSettings):
         )
         return values
 
+    @root_validator
+    def compute_MODELS_INDEX_PATH(cls, values: dict) -> dict:
+        if values["MODELS_INDEX_PATH"] is not None:
+            return values
+
+        values["MODELS_INDEX_PATH"] = Path(
+            os.path.join(values["TARGET_PATH"], "models_index.json")
+        )
+        return values
+
+    @root_validator
+    def compute_COMPILATION_CACHE_PATH(cls, values: dict) -> dict:
+        if values["COMPILATION_CACHE_PATH"] is not None:
+            return values
+
+        values["COMPILATION_CACHE_PATH"] = Path(
+            os.path.join(values["TARGET_PATH"], ".compilation-cache")
+        )
+        return values
+
+    @root_validator
+    def compute_DRY_RUN_CACHE_PATH(cls, values: dict) -> dict:
+        if values["DRY_RUN_CACHE_PATH"] is not None:
+            return values
+
+        values["DRY_RUN_CACHE_PATH"] = Path(
+            os.path.join(values["TARGET_PATH"], ".dry-run-cache")
+        )
+        return values
+
+    @root_validator
+    def compute_MATERIALIZATION_STATE_PATH(cls, values: dict) -> dict:
+        if values["MATERIALIZATION_STATE_PATH"] is not None:
+            return values
+
+        values["MATERIALIZATION_STATE_PATH"] = Path(
+            os.path.join(values["TARGET_PATH"], "materialization_state.json")
+        )
+        return values
+
     @validator("PROJECT_PATH")
     def project_path_is_a_valid_path(cls, v: Path) -> Path:
         if not v.is_dir():
@@ -124,6 +195,26 @@ class Settings(BaseSettings):
         assert isinstance(self.MANIFEST_PATH, Path)
         return self.MANIFEST_PATH
 
+    @property
+    def models_index_path(self) -> Path:
+        assert isinstance(self.MODELS_INDEX_PATH, Path)
+        return self.MODELS_INDEX_PATH
+
+    @property
+    def compilation_cache_path(self) -> Path:
+        assert isinstance(self.COMPILATION_CACHE_PATH, Path)
+        return self.COMPILATION_CACHE_PATH
+
+    @property
+    def dry_run_cache_path(self) -> Path:
+        assert isinstance(self.DRY_RUN_CACHE_PATH, Path)
+        return self.DRY_RUN_CACHE_PATH
+
+    @property
+    def materialization_state_path(self) -> Path:
+        assert isinstance(self.MATERIALIZATION_STATE_PATH, Path)
+        return self.MATERIALIZATION_STATE_PATH
+
     @property
     def dashboards_path(self) -> Path:
         assert isinstance(self.DASHBOARDS_PATH, Path)
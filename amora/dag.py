@@ -1,16 +1,66 @@
-from typing import Any, Dict, Generator, Iterable, List, Tuple
+import heapq
+from concurrent import futures
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, Iterable, List, Optional, Tuple
 
 import networkx as nx
 from matplotlib import pyplot as plt
 
 from amora.config import settings
 from amora.materialization import Task
-from amora.models import Column, Model, list_models
-from amora.utils import list_target_files
+from amora.models import Column, Model, get_models_index
+from amora.utils import list_target_files, target_path_for_model_path
 
 CytoscapeElements = List[Dict]
 
 
+class ReachabilityIndex:
+    """
+    The transitive closure of a DAG, stored as two bitsets per node: the positions
+    of its ancestors and of its descendants on a topological order of the DAG.
+
+    The bitsets are computed once, in a single pass over the DAG in each direction.
+    After that, ancestor and descendant queries are bitwise operations, instead
+    of a traversal of the graph per query.
+    """
+
+    def __init__(self, dag: nx.DiGraph) -> None:
+        self.nodes: List[Any] = list(nx.topological_sort(dag))
+        self._positions = {node: position for position, node in enumerate(self.nodes)}
+        self._ancestors = [0] * len(self.nodes)
+        self._descendants = [0] * len(self.nodes)
+
+        for position, node in enumerate(self.nodes):
+            for predecessor in dag.predecessors(node):
+                other = self._positions[predecessor]
+                self._ancestors[position] |= self._ancestors[other] | (1 << other)
+
+        for position in reversed(range(len(self.nodes))):
+            for successor in dag.successors(self.nodes[position]):
+                other = self._positions[successor]
+                self._descendants[position] |= self._descendants[other] | (1 << other)
+
+    def _nodes(self, bitset: int) -> List[Any]:
+        nodes = []
+        while bitset:
+            lowest_bit = bitset & -bitset
+            nodes.append(self.nodes[lowest_bit.bit_length() - 1])
+            bitset ^= lowest_bit
+        return nodes
+
+    def ancestors(self, node: Any) -> List[Any]:
+        """
+        Returns the nodes upstream of `node`, in topological order
+        """
+        return self._nodes(self._ancestors[self._positions[node]])
+
+    def descendants(self, node: Any) -> List[Any]:
+        """
+        Returns the nodes downstream of `node`, in topological order
+        """
+        return self._nodes(self._descendants[self._positions[node]])
+
+
 class DependencyDAG(nx.DiGraph):
     def __iter__(self):
         return nx.topological_sort(self)
@@ -18,15 +68,20 @@ class DependencyDAG(nx.DiGraph):
     @classmethod
     def from_model(cls, model: Model) -> "DependencyDAG":
         """
-        Builds the DependencyDAG for a given data model
+        Builds the DependencyDAG for a given data model. Each model is visited once,
+        even if it's upstream of many models of the DAG.
         """
         dag = cls()
         dag.add_node(model.unique_name())
 
+        visited = {model.unique_name()}
+
         def fetch_edges(node: Model):
             for dependency in getattr(node, "__depends_on__", []):
                 dag.add_edge(dependency.unique_name(), node.unique_name())
-                fetch_edges(dependency)
+                if dependency.unique_name() not in visited:
+                    visited.add(dependency.unique_name())
+                    fetch_edges(dependency)
 
         fetch_edges(model)
         return dag
@@ -34,18 +89,15 @@ class DependencyDAG(nx.DiGraph):
     @classmethod
     def from_project(cls) -> "DependencyDAG":
         """
-        Builds the DependencyDAG for all models.
+        Builds the DependencyDAG for all models, using the `amora.models.ModelIndex`
+        so that model files are only imported if they changed.
         """
         dag = cls()
 
-        def fetch_edges(node: Model):
-            for dependency in getattr(node, "__depends_on__", []):
-                dag.add_edge(dependency.unique_name(), node.unique_name())
-                fetch_edges(dependency)
-
-        for model, _ in list_models():
-            dag.add_node(model.unique_name())
-            fetch_edges(model)
+        for entry in get_models_index().entries.values():
+            dag.add_node(entry.unique_name)
+            for dependency in entry.dependencies:
+                dag.add_edge(dependency, entry.unique_name)
 
         return dag
 
@@ -63,15 +115,46 @@ class DependencyDAG(nx.DiGraph):
     @classmethod
     def from_target(cls) -> "DependencyDAG":
         """
-        Builds a DependencyDAG from the files compiled at `settings.AMORA_TARGET_PATH`
+        Builds a DependencyDAG from the files compiled at `settings.AMORA_TARGET_PATH`.
+
+        The dependencies of the compiled models are read from the manifest saved by
+        `amora compile`, so the models aren't imported. Only the compiled models
+        missing from the manifest, or from a manifest without their dependencies,
+        are imported.
+
+        The node of each compiled model has its compiled file as the
+        `target_file_path` attribute, unlike the nodes of its uncompiled dependencies.
         """
-        model_to_task = {}
+        from amora.manifest import Manifest
 
+        manifest = Manifest.load()
+        models_by_target_path: Dict[str, Tuple[str, Optional[list]]] = {}
+        if manifest is not None:
+            for model_name, metadata in manifest.models.items():
+                target_file_path = target_path_for_model_path(Path(metadata.path))
+                models_by_target_path[target_file_path.as_posix()] = (
+                    model_name,
+                    metadata.dependencies,
+                )
+
+        dag = cls()
         for target_file_path in list_target_files():
-            task = Task.for_target(target_file_path)
-            model_to_task[task.model.unique_name()] = task
+            entry = models_by_target_path.get(target_file_path.as_posix())
+            if entry is None or entry[1] is None:
+                model = Task.for_target(target_file_path).model
+                model_name = model.unique_name()
+                dependencies = [
+                    dependency.fullname for dependency in model.dependencies()
+                ]
+            else:
+                model_name = entry[0]
+                dependencies = entry[1]
 
-        return cls.from_tasks(tasks=model_to_task.values())
+            dag.add_node(model_name, target_file_path=target_file_path)
+            for dependency in dependencies:
+                dag.add_edge(dependency, model_name)
+
+        return dag
 
     @classmethod
     def from_columns(cls, columns: List[Tuple[Model, Column]]) -> "DependencyDAG":
@@ -90,6 +173,80 @@ class DependencyDAG(nx.DiGraph):
         for generation in nx.topological_generations(self):
             yield sorted(generation)
 
+    def critical_path_lengths(self) -> Dict[Any, int]:
+        """
+        Returns, for each node, the number of nodes on the longest path from it
+        to a node without successors, i.e. the minimum number of sequential steps
+        needed to finish it and everything downstream of it
+        """
+        lengths: Dict[Any, int] = {}
+        for node in reversed(list(nx.topological_sort(self))):
+            lengths[node] = 1 + max(
+                (lengths[successor] for successor in self.successors(node)),
+                default=0,
+            )
+        return lengths
+
+    def schedule(
+        self,
+        submit: Callable[[Any], Optional[futures.Future]],
+        max_concurrency: int,
+    ) -> Generator[Tuple[Any, futures.Future], None, None]:
+        """
+        Runs the nodes of the DAG respecting their dependencies, yielding each
+        `(node, future)` as soon as it is done.
+
+        A node is submitted as soon as all of its predecessors are done, instead of
+        waiting for its whole topological generation, with at most `max_concurrency`
+        nodes running at a time. Ready nodes with the longest critical path are
+        submitted first, so the total duration approaches the DAG's critical path.
+
+        `submit` may return `None` for a node that shouldn't run, which is then
+        considered done and doesn't block its successors.
+        """
+        priorities = self.critical_path_lengths()
+        pending_predecessors = {node: self.in_degree(node) for node in self.nodes}
+        ready: List[Tuple[int, Any]] = [
+            (-priorities[node], node)
+            for node, degree in pending_predecessors.items()
+            if degree == 0
+        ]
+        heapq.heapify(ready)
+        running: Dict[futures.Future, Any] = {}
+
+        def done(node: Any) -> None:
+            for successor in self.successors(node):
+                pending_predecessors[successor] -= 1
+                if pending_predecessors[successor] == 0:
+                    heapq.heappush(ready, (-priorities[successor], successor))
+
+        while ready or running:
+            while ready and len(running) < max_concurrency:
+                _priority, node = heapq.heappop(ready)
+                future = submit(node)
+                if future is None:
+                    done(node)
+                else:
+                    running[future] = node
+
+            if not running:
+                continue
+
+            finished, _pending = futures.wait(
+                running, return_when=futures.FIRST_COMPLETED
+            )
+            for future in finished:
+                node = running.pop(future)
+                yield node, future
+                done(node)
+
+    def reachability(self) -> ReachabilityIndex:
+        """
+        Builds the `ReachabilityIndex` of the DAG, for answering many ancestor and
+        descendant queries. The index isn't updated if the DAG changes.
+        """
+        return ReachabilityIndex(self)
+
     def get_all_dependencies(self, source: Any) -> Generator[Any, None, None]:
         for dep in nx.predecessor(self, source=source):
             if dep != source:
@@ -0,0 +1,94 @@
+import time
+from concurrent import futures
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, List, Tuple
+
+from amora.config import settings as amora_settings
+from amora.dash.config import settings
+from amora.logger import logger
+
+Task = Tuple[str, Callable[..., Any], Tuple[Any, ...]]
+
+
+@dataclass
+class WarmResult:
+    """
+    Attributes:
+        succeeded (int): Cache entries computed or already cached
+        failed (int): Cache entries that failed to compute
+        seconds (float): Time spent warming the cache
+    """
+
+    succeeded: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+
+
+def warm_tasks() -> List[Task]:
+    """
+    The cached computations behind the UI pages: the summary and data sample
+    of each model, and the answer of each question, including the questions
+    of the dashboards.
+    """
+    from amora.dashboards import list_dashboards
+    from amora.meta_queries import summarize
+    from amora.models import list_models
+    from amora.providers.bigquery import sample
+    from amora.questions import QUESTIONS
+
+    # Dashboards are loaded first, so the questions they define are registered
+    dashboards = list_dashboards()
+    models = [model for model, _path in list_models()]
+    tasks: List[Task] = [
+        *(
+            (
+                f"summary:{model.unique_name()}",
+                summarize,
+                (model, settings.MODEL_SUMMARY_MODE),
+            )
+            for model in models
+        ),
+        *((f"sample:{model.unique_name()}", sample, (model,)) for model in models),
+    ]
+
+    questions = list(QUESTIONS)
+    for dashboard in dashboards.values():
+        for row in dashboard.questions:
+            questions.extend(q for q in row if q not in questions)
+    tasks.extend((f"question:{q.name}", q.answer_df, ()) for q in questions)
+    return tasks
+
+
+def warm_cache() -> WarmResult:
+    """
+    Computes the cached data of the UI pages into `amora.storage.CACHE`, on
+    `settings.THREAD_POOL_EXECUTOR_WORKERS` threads, so page loads don't wait on
+    the warehouse. A no-op if the storage cache is disabled.
+    """
+    result = WarmResult()
+    if not amora_settings.STORAGE_CACHE_ENABLED:
+        logger.debug("Cache disabled. Skipping cache generation.")
+        return result
+
+    start = time.perf_counter()
+    with futures.ThreadPoolExecutor(
+        max_workers=settings.THREAD_POOL_EXECUTOR_WORKERS
+    ) as executor:
+        submitted = [
+            (name, executor.submit(func, *args)) for name, func, args in warm_tasks()
+        ]
+        for name, future in submitted:
+            try:
+                future.result()
+            except ValueError:
+                # E.g. models that can't be sampled or summarized
+                logger.debug(f"Skipping cache warming of `{name}`", exc_info=True)
+            except Exception:
+                result.failed += 1
+                logger.exception(f"Unable to warm the cache of `{name}`")
+            else:
+                result.succeeded += 1
+
+    result.seconds = time.perf_counter() - start
+    logger.info("Cache warmed", extra=asdict(result))
+    return result
@@ -19,6 +19,7 @@ def _style_elements(elements: CytoscapeElements) -> CytoscapeElements:
     def background_color_for_model(model: Model) -> str:
         return {
             MaterializationTypes.table: "black",
+            MaterializationTypes.incremental: "black",
             MaterializationTypes.view: "grey",
             MaterializationTypes.ephemeral: "white",
         }[model.__model_config__.materialized]
@@ -1,12 +1,67 @@
-from dash import dash_table
+import dash_bootstrap_components as dbc
+from dash import MATCH, Input, Output, State, callback, dash_table, dcc, html
 from dash.development.base_component import Component
 
-from amora.meta_queries import summarize
-from amora.models import Model
+from amora.config import SummaryModes
+from amora.config import settings as amora_settings
+from amora.dash.config import settings
+from amora.meta_queries import is_sampled, summarize
+from amora.models import Model, amora_model_for_name
 
 
 def component(model: Model) -> Component:
-    summary = summarize(model)
+    """
+    The summary of the model, computed as `settings.MODEL_SUMMARY_MODE`. Approximate
+    summaries can be replaced by an exact one, on demand.
+    """
+    if settings.MODEL_SUMMARY_MODE is SummaryModes.exact:
+        return datatable(model, SummaryModes.exact)
+
+    if is_sampled(model, settings.MODEL_SUMMARY_MODE):
+        note = (
+            f"Approximate summary of a {amora_settings.SUMMARY_SAMPLE_PERCENTAGE}% "
+            "sample of the table, with 95% confidence error bounds."
+        )
+    else:
+        note = "Approximate summary, with estimated unique counts."
+
+    model_name = model.unique_name()
+    return html.Div(
+        [
+            dbc.Alert(
+                [
+                    note,
+                    dbc.Button(
+                        "Compute the exact summary",
+                        id={"type": "model-summary-exact-button", "model": model_name},
+                        color="link",
+                        size="sm",
+                    ),
+                ],
+                color="info",
+            ),
+            dcc.Loading(
+                html.Div(
+                    datatable(model, settings.MODEL_SUMMARY_MODE),
+                    id={"type": "model-summary-content", "model": model_name},
+                )
+            ),
+        ]
+    )
+
+
+@callback(
+    Output({"type": "model-summary-content", "model": MATCH}, "children"),
+    Input({"type": "model-summary-exact-button", "model": MATCH}, "n_clicks"),
+    State({"type": "model-summary-exact-button", "model": MATCH}, "id"),
+    prevent_initial_call=True,
+)
+def refresh_exact_summary(n_clicks: int, button_id: dict) -> Component:
+    return datatable(amora_model_for_name(button_id["model"]), SummaryModes.exact)
+
+
+def datatable(model: Model, mode: SummaryModes) -> Component:
+    summary = summarize(model, mode)
 
     first_column = "column_name"
     return dash_table.DataTable(
@@ -5,6 +5,8 @@ from uuid import uuid4
 import dash_bootstrap_components as dbc
 from pydantic import BaseSettings, SecretStr, validator
 
+from amora.config import SummaryModes
+
 
 class DashSettings(BaseSettings):
     HTTP_HOST: str = "127.0.0.1"
@@ -39,6 +41,8 @@ class DashSettings(BaseSettings):
     GUNICORN_WORKER_TIMEOUT: int = 30
 
     THREAD_POOL_EXECUTOR_WORKERS: int = 5
+    CACHE_WARMER_INTERVAL_SECONDS: Optional[int] = None
+    MODEL_SUMMARY_MODE: SummaryModes = SummaryModes.sampled
 
     class Config:
         env_prefix = "AMORA_DASH_"
@@ -1,11 +1,51 @@
+import subprocess
+import sys
+from typing import Optional
+
 from prometheus_flask_exporter.multiprocess import GunicornPrometheusMetrics
 
 from amora.dash.config import settings
 
+_cache_warmer: Optional[subprocess.Popen] = None
+
 
 def when_ready(server):
-    GunicornPrometheusMetrics.start_http_server_when_ready(settings.METRICS_PORT)
+    if settings.METRICS_ENABLED:
+        GunicornPrometheusMetrics.start_http_server_when_ready(settings.METRICS_PORT)
+    if settings.CACHE_WARMER_INTERVAL_SECONDS is not None:
+        start_cache_warmer()
 
 
 def child_exit(server, worker):
     GunicornPrometheusMetrics.mark_process_dead_on_child_exit(worker.pid)
+
+
+def on_exit(server):
+    stop_cache_warmer()
+
+
+def start_cache_warmer() -> None:
+    """
+    Runs `amora dash warm` on a separate process, instead of a thread of the
+    arbiter, which would be inherited mid-flight by every forked worker
+    """
+    global _cache_warmer
+    _cache_warmer = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "amora.cli",
+            "dash",
+            "warm",
+            "--interval",
+            str(settings.CACHE_WARMER_INTERVAL_SECONDS),
+        ]
+    )
+
+
+def stop_cache_warmer() -> None:
+    global _cache_warmer
+    if _cache_warmer is not None:
+        _cache_warmer.terminate()
+        _cache_warmer.wait()
+        _cache_warmer = None
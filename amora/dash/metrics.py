@@ -1,16 +1,18 @@
+from dataclasses import asdict
 from pathlib import Path
 from timeit import default_timer
 from typing import Optional
 
 from dash import Dash
 from flask import Response, g, request
-from prometheus_client import CollectorRegistry, Histogram
+from prometheus_client import CollectorRegistry, Gauge, Histogram
 from prometheus_client.utils import INF
 from prometheus_flask_exporter import PrometheusMetrics
 from prometheus_flask_exporter.multiprocess import GunicornPrometheusMetrics
 
 from amora.dash.config import settings
 from amora.logger import logger
+from amora.storage import CACHE
 from amora.version import VERSION
 
 
@@ -70,6 +72,14 @@ def add_prometheus_metrics(dash: Dash) -> None:
         registry=metrics.registry,
     )
 
+    storage_memory_cache_metric = Gauge(
+        name="amora_storage_memory_cache",
+        documentation="Storage in-memory cache statistics, such as hits, misses and evictions.",
+        labelnames=("stat",),
+        multiprocess_mode="livesum",
+        registry=metrics.registry,
+    )
+
     def before_request():
         g.metrics_start_time = default_timer()
 
@@ -80,6 +90,9 @@ def add_prometheus_metrics(dash: Dash) -> None:
 
         total_time = max(default_timer() - start_time, 0)
 
+        for stat, value in asdict(CACHE.memory.stats).items():
+            storage_memory_cache_metric.labels(stat=stat).set(value)
+
         if request.path != "/_dash-update-component":
             return response
 
@@ -1,3 +1,6 @@
+from concurrent import futures
+from typing import Dict
+
 import dash
 import dash_bootstrap_components as dbc
 from dash import Input, Output, dcc, html
@@ -7,7 +10,9 @@ from dash_extensions import Lottie
 from amora.dash.components import question_details
 from amora.dash.components.animation import Lotties
 from amora.dash.components.filters import filter
+from amora.dash.config import settings
 from amora.dashboards import DASHBOARDS, Dashboard, list_dashboards
+from amora.questions import Question
 
 dash.register_page(
     __name__,
@@ -20,14 +25,31 @@ dash.register_page(
 list_dashboards()
 
 
+def question_components(dashboard: Dashboard) -> Dict[Question, Component]:
+    """
+    Answers the dashboard questions concurrently, on at most
+    `settings.THREAD_POOL_EXECUTOR_WORKERS` threads, so a dashboard renders in
+    about the time of its slowest question instead of the sum of all of them.
+    A question repeated on the dashboard is answered once.
+    """
+    questions = list(dict.fromkeys(q for row in dashboard.questions for q in row))
+    if len(questions) <= 1:
+        return {q: question_details.component(q) for q in questions}
+
+    with futures.ThreadPoolExecutor(
+        max_workers=min(settings.THREAD_POOL_EXECUTOR_WORKERS, len(questions))
+    ) as executor:
+        components = {
+            question: executor.submit(question_details.component, question)
+            for question in questions
+        }
+    return {question: future.result() for question, future in components.items()}
+
+
 def render(dashboard: Dashboard) -> Component:
+    components = question_components(dashboard)
     questions = [
-        dbc.Row(
-            children=[
-                dbc.Col(question_details.component(question_col))
-                for question_col in row
-            ]
-        )
+        dbc.Row(children=[dbc.Col(components[question_col]) for question_col in row])
         for row in dashboard.questions
     ]
     filters = [filter.layout(f) for f in dashboard.filters]
@@ -7,7 +7,7 @@ from dash_extensions import Lottie
 from amora.dag import DependencyDAG
 from amora.dash.components import dependency_dag, model_details
 from amora.dash.components.animation import Lotties
-from amora.models import amora_model_for_name, list_models
+from amora.models import amora_model_for_name, get_models_index
 
 dash.register_page(
     __name__,
@@ -20,7 +20,7 @@ dash.register_page(
 
 
 def models_selector() -> dcc.Dropdown:
-    options = [model.unique_name() for (model, _path) in list_models()]
+    options = [entry.unique_name for entry in get_models_index().entries.values()]
 
     return dcc.Dropdown(
         options=options,
@@ -0,0 +1,111 @@
+import hashlib
+import mmap
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+HASH_ALGORITHM = "blake2b-128"
+
+
+class FileSignature(NamedTuple):
+    """
+    The `stat` fields that identify a version of a file. A file with an
+    unchanged signature is assumed to have unchanged contents.
+    """
+
+    inode: int
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def from_stat(cls, stat: os.stat_result) -> "FileSignature":
+        return cls(inode=stat.st_ino, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+
+@dataclass
+class HashingStats:
+    """
+    Attributes:
+        hits (int): Files whose digest was reused because their signature was unchanged
+        misses (int): Files which were read and hashed
+        bytes_hashed (int): Total size of the hashed files, in bytes
+        seconds (float): Time spent reading and hashing files
+    """
+
+    hits: int = 0
+    misses: int = 0
+    bytes_hashed: int = 0
+    seconds: float = 0.0
+
+    def dict(self) -> dict:
+        return asdict(self)
+
+
+def hash_file(file_path: Path) -> str:
+    """
+    Returns the hex digest of the file contents, hashed over a memory map of the file
+    """
+    hash = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        # Empty files can't be memory mapped
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                hash.update(data)
+    return hash.hexdigest()
+
+
+def hash_text(text: str) -> str:
+    """
+    Returns the hex digest of the text, hashed with the same algorithm as `hash_file`
+    """
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+class FileHasher:
+    """
+    Hashes files, skipping the ones whose `FileSignature` didn't change since
+    their digest was last computed or `remember`ed.
+    """
+
+    def __init__(self) -> None:
+        self._digests: Dict[str, Tuple[FileSignature, str]] = {}
+        self._lock = threading.Lock()
+        self.stats = HashingStats()
+
+    def remember(self, file_path: Path, signature: FileSignature, digest: str) -> None:
+        """
+        Records a digest computed previously, e.g. loaded from a persisted index
+        """
+        with self._lock:
+            self._digests[file_path.as_posix()] = (signature, digest)
+
+    def hash_file(self, file_path: Path, stat: Optional[os.stat_result] = None) -> str:
+        key = file_path.as_posix()
+        signature = FileSignature.from_stat(stat or file_path.stat())
+
+        with self._lock:
+            known = self._digests.get(key)
+            if known is not None and known[0] == signature:
+                self.stats.hits += 1
+                return known[1]
+
+        start = time.perf_counter()
+        digest = hash_file(file_path)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self._digests[key] = (signature, digest)
+            self.stats.misses += 1
+            self.stats.bytes_hashed += signature.size
+            self.stats.seconds += elapsed
+        return digest
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = HashingStats()
+
+
+file_hasher = FileHasher()
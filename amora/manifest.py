@@ -1,48 +1,70 @@
-import hashlib
 import json
+import os
 from os.path import exists
 from pathlib import Path
-from typing import Dict, Optional, Set, Tuple
+from typing import Dict, Iterable, Optional, Set, Tuple
 
-from _hashlib import HASH
 from pydantic import BaseModel
 
 from amora.config import settings
 from amora.dag import DependencyDAG
-from amora.models import Model, amora_model_from_name_list, list_models
+from amora.models import Model, amora_model_for_path, get_models_index
+from amora.utils import target_path_for_model_path
 
-BUF_SIZE = 65536
+MANIFEST_VERSION = 2
 
 
 class ModelMetadata(BaseModel):
+    """
+    Attributes:
+        stat (float): The model file modification time
+        size (float): The model file size, in bytes
+        hash (str): The model file content hash
+        path (str): The model file path
+        deps (list): The reverse-dependency index of the model: every model downstream of it,
+            which must be recompiled if the model changes
+        dependencies (Optional[list]): The models the compiled model directly depends on,
+            i.e. its edges on the `DependencyDAG`. `None` on manifests saved before the
+            dependencies were recorded
+    """
+
     stat: float
     size: float
     hash: str
     path: str
     deps: list
+    dependencies: Optional[list] = None
 
 
 class Manifest(BaseModel):
+    """
+    The state of the project models at compilation time, saved at `settings.MANIFEST_PATH`.
+
+    Each model records the content hash of its file, the models it depends on and the models
+    downstream of it, so that the models affected by a change, and the `DependencyDAG` of the
+    compiled models, can be found without importing the project models.
+
+    The manifest is saved as JSON Lines: a header line with the manifest version,
+    followed by one line per model.
+    """
+
     models: Dict[str, ModelMetadata]
 
     @classmethod
     def from_project(cls) -> "Manifest":
-        dag = DependencyDAG.from_project()
+        reachability = DependencyDAG.from_project().reachability()
 
         models_manifest: Dict[str, ModelMetadata] = {}
 
-        for model, model_file_path in list_models():
-            file_stats = model_file_path.stat()
-            model_unique_name = model.unique_name()
-
-            models_manifest[model_unique_name] = ModelMetadata(
-                stat=file_stats.st_mtime,
-                size=file_stats.st_size,
-                hash=hash_file(model_file_path).hexdigest(),
-                path=str(model_file_path),
-                deps=[
-                    dep for dep in dag.get_all_dependencies(source=model_unique_name)
-                ],
+        for entry in get_models_index().entries.values():
+            models_manifest[entry.unique_name] = ModelMetadata(
+                stat=entry.mtime_ns / 1e9,
+                size=entry.size,
+                hash=entry.checksum,
+                path=entry.path,
+                deps=sorted(reachability.descendants(entry.unique_name)),
+                # Like `Model.dependencies`, models without a source don't depend on others
+                dependencies=entry.dependencies if entry.has_source else [],
             )
 
         return Manifest(models=models_manifest)
@@ -51,58 +73,91 @@ class Manifest(BaseModel):
     def load(cls) -> Optional["Manifest"]:
         try:
             with open(settings.manifest_path) as f:
-                return Manifest(**(json.load(f)))
+                header = f.readline()
+                try:
+                    version = json.loads(header).get("version")
+                except json.JSONDecodeError:
+                    version = None
+
+                if version != MANIFEST_VERSION:
+                    # Legacy manifests are a single indented JSON document
+                    f.seek(0)
+                    return Manifest(**(json.load(f)))
+
+                models = {}
+                for line in f:
+                    item = json.loads(line)
+                    models[item.pop("name")] = ModelMetadata(**item)
+                return Manifest(models=models)
         except FileNotFoundError:
             return None
 
     def save(self) -> None:
-        with open(settings.manifest_path, "w+") as f:
-            json.dump(self.dict(), f, indent=2)
-
-    def get_models_to_compile(
-        self: "Manifest", previous_manifest: "Manifest"
-    ) -> Set[Tuple[Model, Path]]:
-        models_to_compile = set()
-        deps_names_to_compile: Set = set()
-
-        for model, model_file_path in list_models():
-            model_unique_name = model.unique_name()
-
-            model_current_manifest = self.models[model_unique_name]
-            model_previous_manifest = previous_manifest.models.get(
-                model_unique_name
-            )  # model could not exist in previous
-
-            compile_model = not model_previous_manifest or (
-                model_current_manifest.size != model_previous_manifest.size
-                or model_current_manifest.deps != model_previous_manifest.deps
-                or (
-                    model_current_manifest.stat > model_previous_manifest.stat
-                    and (
-                        not exists(model.target_path())
-                        or model_current_manifest.hash != model_previous_manifest.hash
-                    )
+        tmp_path = settings.manifest_path.with_name(
+            f".{settings.manifest_path.name}.{os.getpid()}"
+        )
+        with open(tmp_path, "w+") as f:
+            f.write(json.dumps({"version": MANIFEST_VERSION}) + "\n")
+            for name, metadata in self.models.items():
+                line = json.dumps(
+                    {"name": name, **metadata.dict()}, separators=(",", ":")
                 )
-            )
+                f.write(line + "\n")
 
-            if compile_model:
-                models_to_compile.add((model, model_file_path))
-                deps_names_to_compile = deps_names_to_compile.union(
-                    model_current_manifest.deps
-                )
+        os.replace(tmp_path, settings.manifest_path)
 
-        deps_to_compile = amora_model_from_name_list(deps_names_to_compile)
-        models_to_compile = models_to_compile.union(deps_to_compile)
+    def _has_changed(
+        self, model_unique_name: str, previous_manifest: "Manifest"
+    ) -> bool:
+        current = self.models[model_unique_name]
+        previous = previous_manifest.models.get(model_unique_name)
 
-        return models_to_compile
+        # model could not exist in previous
+        if previous is None:
+            return True
 
+        # Manifests saved before `deps` was sorted list them in traversal order
+        if current.size != previous.size or set(current.deps) != set(previous.deps):
+            return True
 
-def hash_file(file_path: Path) -> HASH:
-    hash = hashlib.md5()
-    with open(file_path, "rb") as f:
-        while True:
-            data = f.read(BUF_SIZE)
-            if not data:
-                break
-            hash.update(data)
-    return hash
+        if current.stat > previous.stat:
+            target_file_path = target_path_for_model_path(Path(current.path))
+            return not exists(target_file_path) or current.hash != previous.hash
+
+        return False
+
+    def get_model_names_to_compile(
+        self: "Manifest", previous_manifest: "Manifest"
+    ) -> Set[str]:
+        """
+        Returns the names of the models that changed since the `previous_manifest`,
+        together with the names of the models downstream of them, without importing
+        any model.
+        """
+        names_to_compile: Set[str] = set()
+
+        for model_unique_name, metadata in self.models.items():
+            if self._has_changed(model_unique_name, previous_manifest):
+                names_to_compile.add(model_unique_name)
+                names_to_compile.update(metadata.deps)
+
+        return names_to_compile
+
+    def get_models_to_compile(
+        self: "Manifest", previous_manifest: "Manifest"
+    ) -> Set[Tuple[Model, Path]]:
+        """
+        Returns the models that changed since the `previous_manifest`, together with
+        the models downstream of them. Only the returned models are imported.
+        """
+        names_to_compile = self.get_model_names_to_compile(previous_manifest)
+        return set(self._models_for_names(names_to_compile))
+
+    def _models_for_names(self, names: Iterable[str]) -> Iterable[Tuple[Model, Path]]:
+        for name in names:
+            metadata = self.models.get(name)
+            if metadata is None:
+                continue
+
+            model_file_path = Path(metadata.path)
+            yield amora_model_for_path(model_file_path), model_file_path
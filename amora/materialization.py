@@ -1,27 +1,46 @@
-from dataclasses import dataclass
+import os
+from concurrent import futures
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 import humanize
-from google.api_core.exceptions import ClientError
+import networkx as nx
+from google.api_core.exceptions import ClientError, NotFound
 from google.cloud.bigquery import (
     Client,
+    CopyJobConfig,
+    CreateDisposition,
     PartitionRange,
+    QueryJob,
     QueryJobConfig,
     RangePartitioning,
     Table,
     TimePartitioning,
+    WriteDisposition,
 )
+from pydantic import BaseModel, ValidationError
 
+from amora.config import settings
+from amora.hashing import hash_text
 from amora.models import (
+    IncrementalConfig,
     MaterializationTypes,
     Model,
     ModelConfig,
     amora_model_for_name,
     amora_model_for_target_path,
 )
-from amora.providers.bigquery import schema_for_model
+from amora.providers.bigquery import (
+    dry_run_queries,
+    estimated_query_cost_in_usd,
+    get_client,
+    schema_for_model,
+)
+
+STAGING_TABLE_SUFFIX = "__amora_staging"
+STAGING_TABLE_HOURS_TO_EXPIRE = 6
 
 
 @dataclass
@@ -50,30 +69,62 @@ class Result:
     total_bytes_billed: int = 0
     total_bytes_processed: int = 0
     duration: Optional[timedelta] = None
+    incremental: bool = False
 
     def __str__(self):
-        if self.model_config.materialized == MaterializationTypes.table:
+        if self.model_config.materialized in (
+            MaterializationTypes.table,
+            MaterializationTypes.incremental,
+        ):
             rows = humanize.intcomma(self.destination_table.num_rows)
             processed_bytes_ = humanize.naturalsize(self.total_bytes_processed)
             duration = humanize.naturaldelta(self.duration)
             table_bytes_ = humanize.naturalsize(self.destination_table.num_bytes)
+            written = (
+                "write the new rows into" if self.incremental else "materialize it into"
+            )
 
-            return f"[{self.model_name}] Took {duration} to process {processed_bytes_} of data and materialize it into a `Table` with {rows} rows and {table_bytes_}."
+            return f"[{self.model_name}] Took {duration} to process {processed_bytes_} of data and {written} a `Table` with {rows} rows and {table_bytes_}."
         elif self.model_config.materialized == MaterializationTypes.view:
             return f"[{self.model_name}] Materialized as `View`"
         else:
             raise ValueError
 
 
-def materialize(sql: str, model_name: str, config: ModelConfig) -> Optional[Result]:
+TABLE_METADATA_FIELDS = ["schema", "description", "labels", "expires"]
+
+
+def materialize(
+    sql: str, model_name: str, config: ModelConfig, client: Optional[Client] = None
+) -> Optional[Result]:
+    """
+    Materializes the model `model_name` as the result of `sql`, according to its `config`.
+
+    The BigQuery jobs are submitted with `client`, which defaults to the client shared
+    by the process, `amora.providers.bigquery.get_client`.
+
+    Existing views and tables are replaced in place, so they remain readable while the
+    model is materialized. The query results are written to a staging table created
+    with the model schema, so results that don't fit the schema fail before the table
+    is changed. The staging table then replaces the table in a single job: a
+    `WRITE_TRUNCATE` copy job or, when the partitioning of the table changes,
+    a `CREATE OR REPLACE TABLE` statement. The table metadata is updated afterwards.
+
+    Incremental models are materialized as tables when their table doesn't exist yet,
+    or when its partitioning or columns changed. Otherwise, only the rows newer than the
+    table's `watermark` are inserted, or merged by `unique_key`, into the table.
+    """
     materialization = config.materialized
 
     if materialization == MaterializationTypes.ephemeral:
         return None
 
-    client = Client()
-    client.delete_table(model_name, not_found_ok=True)
-    model = amora_model_for_name(model_name)
+    if materialization == MaterializationTypes.incremental and not config.incremental:
+        raise ValueError(
+            f"Incremental model `{model_name}` requires an `IncrementalConfig`"
+        )
+
+    client = client or get_client()
 
     if materialization == MaterializationTypes.view:
         view = Table(model_name)
@@ -81,12 +132,24 @@ def materialize(sql: str, model_name: str, config: ModelConfig) -> Optional[Resu
         view.labels = config.labels_dict
         view.view_query = sql
 
-        table = client.create_table(view)
+        existing = _get_table(client, model_name)
+        if existing is None:
+            table = client.create_table(view)
+        elif existing.table_type == "VIEW":
+            table = client.update_table(view, ["view_query", "description", "labels"])
+        else:
+            client.delete_table(model_name, not_found_ok=True)
+            table = client.create_table(view)
+
         return Result(
             model_name=model_name, model_config=config, destination_table=table
         )
 
-    if materialization == MaterializationTypes.table:
+    if materialization in (
+        MaterializationTypes.table,
+        MaterializationTypes.incremental,
+    ):
+        model = amora_model_for_name(model_name)
         table = Table(model_name, schema=schema_for_model(model))
         table.description = config.description
         table.labels = config.labels_dict
@@ -111,29 +174,455 @@ def materialize(sql: str, model_name: str, config: ModelConfig) -> Optional[Resu
         if config.hours_to_expire:
             table.expires = datetime.utcnow() + timedelta(hours=config.hours_to_expire)
 
-        client.create_table(table)
+        existing = _get_table(client, model_name)
+        if existing is not None and existing.table_type != "TABLE":
+            client.delete_table(model_name, not_found_ok=True)
+            existing = None
+
+        incremental_config = config.incremental
+        incremental = (
+            incremental_config is not None
+            and existing is not None
+            and _partitioning(existing) == _partitioning(table)
+            and [field.name for field in existing.schema]
+            == [field.name for field in table.schema]
+        )
+
         try:
-            query_job = client.query(
-                sql,
-                job_config=QueryJobConfig(destination=table),
-            )
-            _result = query_job.result()
+            if incremental and incremental_config is not None:
+                query_job = _run_query(
+                    client, _incremental_sql(sql, table, incremental_config)
+                )
+            else:
+                if (
+                    existing is not None
+                    and _partitioning(existing) == _partitioning(table)
+                    and existing.clustering_fields != table.clustering_fields
+                ):
+                    client.update_table(table, ["clustering_fields"])
+                query_job = _query_into_staging_and_swap(client, sql, table, existing)
+            destination_table = client.update_table(table, TABLE_METADATA_FIELDS)
         except ClientError as e:
             raise ValueError(
                 f"Materialization failed for model `{model_name}` to destination `{table}`"
             ) from e
-        else:
-            return Result(
-                model_name=model_name,
-                model_config=config,
-                destination_table=client.get_table(table),
-                total_bytes_billed=query_job.total_bytes_billed,
-                total_bytes_processed=query_job.total_bytes_processed,
-                duration=query_job.ended - query_job.created,
-            )
+
+        return Result(
+            model_name=model_name,
+            model_config=config,
+            destination_table=destination_table,
+            total_bytes_billed=query_job.total_bytes_billed,
+            total_bytes_processed=query_job.total_bytes_processed,
+            duration=query_job.ended - query_job.created,
+            incremental=incremental,
+        )
 
     raise ValueError(
         f"Invalid model materialization configuration. "
         f"Valid types are: `{', '.join((m.name for m in MaterializationTypes))}`. "
         f"Got: `{materialization}`"
     )
+
+
+@dataclass
+class PlanItem:
+    """
+    The forecast of a model materialization
+
+    Attributes:
+        model_name (str): The model unique name
+        total_bytes (Optional[int]): Bytes the model query would process, according to
+            its dry run. `None` if the query can't be dry run, e.g. because it reads
+            models that aren't materialized yet
+        branch_bytes (int): Bytes processed by the model and by the planned models
+            upstream of it, i.e. the cost of rebuilding its branch of the DAG
+        over_budget (bool): Whether `total_bytes` is above the plan `max_bytes`, or
+            unknown while the plan has a `max_bytes`
+    """
+
+    model_name: str
+    total_bytes: Optional[int]
+    branch_bytes: int
+    over_budget: bool = False
+
+    @property
+    def estimated_cost(self) -> Optional[float]:
+        if self.total_bytes is None:
+            return None
+        return estimated_query_cost_in_usd(self.total_bytes)
+
+    @property
+    def branch_estimated_cost(self) -> float:
+        return estimated_query_cost_in_usd(self.branch_bytes)
+
+
+@dataclass
+class Plan:
+    items: Dict[str, PlanItem] = field(default_factory=dict)
+    max_bytes: Optional[int] = None
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(item.total_bytes or 0 for item in self.items.values())
+
+    @property
+    def estimated_cost(self) -> float:
+        return estimated_query_cost_in_usd(self.total_bytes)
+
+    @property
+    def over_budget(self) -> List[str]:
+        return [name for name, item in self.items.items() if item.over_budget]
+
+    @property
+    def unknown_bytes(self) -> List[str]:
+        return [name for name, item in self.items.items() if item.total_bytes is None]
+
+
+def plan(
+    tasks: Iterable[Task], dag: nx.DiGraph, max_bytes: Optional[int] = None
+) -> Plan:
+    """
+    Forecasts the bytes processed by the materialization of the `tasks`, by dry running
+    their compiled SQL concurrently, and aggregates them by model and by the model's
+    branch of the `dag`. Models whose query would process more than `max_bytes` are
+    flagged as over budget, and so are the models whose query couldn't be dry run,
+    so that a budget is never exceeded by a model of unknown cost.
+
+    Views are free to create and ephemeral models aren't materialized, so they are
+    forecast to process no bytes. Incremental models are dry run as a full rebuild,
+    which is an upper bound of an incremental run.
+    """
+    tasks = list(tasks)
+    queries = {
+        task.model: task.sql_stmt
+        for task in tasks
+        if task.model.__model_config__.materialized
+        in (MaterializationTypes.table, MaterializationTypes.incremental)
+    }
+    dry_run_results = dry_run_queries(queries)
+
+    bytes_by_model: Dict[str, Optional[int]] = {}
+    for task in tasks:
+        if task.model in dry_run_results:
+            dry_run_result = dry_run_results[task.model]
+            total_bytes = dry_run_result.total_bytes if dry_run_result else None
+        else:
+            total_bytes = 0
+        bytes_by_model[task.model.unique_name()] = total_bytes
+
+    materialization_plan = Plan(max_bytes=max_bytes)
+    for model_name, total_bytes in bytes_by_model.items():
+        upstream = nx.ancestors(dag, model_name) if model_name in dag else set()
+        materialization_plan.items[model_name] = PlanItem(
+            model_name=model_name,
+            total_bytes=total_bytes,
+            branch_bytes=sum(
+                bytes_by_model.get(name) or 0 for name in upstream | {model_name}
+            ),
+            over_budget=(
+                max_bytes is not None
+                and (total_bytes is None or total_bytes > max_bytes)
+            ),
+        )
+    return materialization_plan
+
+
+class TableFingerprint(BaseModel):
+    """
+    Identifies a version of the data of a table
+
+    Attributes:
+        last_modified_time (Optional[float]): The table last modification, as a POSIX
+            timestamp
+        num_rows (Optional[int]): The table row count. `None` for views
+    """
+
+    last_modified_time: Optional[float]
+    num_rows: Optional[int]
+
+    @classmethod
+    def from_table(cls, table: Table) -> "TableFingerprint":
+        return cls(
+            last_modified_time=table.modified.timestamp() if table.modified else None,
+            num_rows=table.num_rows,
+        )
+
+
+class ModelState(BaseModel):
+    """
+    The inputs and the output of the last materialization of a model
+
+    Attributes:
+        sql_hash (str): The hash of the compiled SQL of the model
+        destination (Optional[TableFingerprint]): The materialized table or view.
+            `None` for ephemeral models
+        upstream (dict): The tables the model reads from, as they were before the
+            materialization. `None` for the ones which didn't exist
+    """
+
+    sql_hash: str
+    destination: Optional[TableFingerprint]
+    upstream: Dict[str, Optional[TableFingerprint]]
+
+
+class MaterializationState(BaseModel):
+    """
+    The state of the last materialization of each model, saved next to the manifest,
+    at `settings.MATERIALIZATION_STATE_PATH`.
+
+    A model whose compiled SQL, table and upstream tables match its state is up to date,
+    and doesn't have to be materialized again. See `stale_models`.
+    """
+
+    models: Dict[str, ModelState] = {}
+
+    @classmethod
+    def load(cls) -> "MaterializationState":
+        try:
+            return cls.parse_file(settings.materialization_state_path)
+        except (FileNotFoundError, ValidationError):
+            return cls()
+
+    def save(self) -> None:
+        tmp_path = settings.materialization_state_path.with_name(
+            f".{settings.materialization_state_path.name}.{os.getpid()}"
+        )
+        tmp_path.write_text(self.json())
+        os.replace(tmp_path, settings.materialization_state_path)
+
+
+def _upstream_table_ids(task: Task) -> List[str]:
+    return [dependency.fullname for dependency in task.model.dependencies()]
+
+
+def table_fingerprints(
+    table_ids: Iterable[str], client: Optional[Client] = None
+) -> Dict[str, Optional[TableFingerprint]]:
+    """
+    Fetches the `TableFingerprint` of each table concurrently. Tables that don't
+    exist have a `None` fingerprint.
+    """
+    client = client or get_client()
+    table_ids = list(dict.fromkeys(table_ids))
+    if not table_ids:
+        return {}
+
+    def fingerprint(table_id: str) -> Optional[TableFingerprint]:
+        table = _get_table(client, table_id)
+        return None if table is None else TableFingerprint.from_table(table)
+
+    with futures.ThreadPoolExecutor(
+        max_workers=min(settings.MATERIALIZE_NUM_THREADS, len(table_ids))
+    ) as executor:
+        return dict(zip(table_ids, executor.map(fingerprint, table_ids)))
+
+
+def stale_models(
+    sql_stmts: Dict[str, str],
+    dag: nx.DiGraph,
+    state: MaterializationState,
+    client: Optional[Client] = None,
+) -> Set[str]:
+    """
+    Returns the names of the models of `sql_stmts`, the compiled SQL of each model
+    by name, which must be materialized.
+
+    A model is up to date when the hash of its compiled SQL, the fingerprint of its
+    table and the fingerprints of the tables upstream of it, its predecessors in the
+    `dag`, are the same as in the `state` of its last materialization, and none of
+    its upstream models are stale. Only the stale subgraph of the `dag` has to be
+    materialized again. The models aren't imported.
+    """
+    table_ids: Set[str] = set()
+    for model_name in sql_stmts:
+        if model_name in state.models:
+            table_ids.add(model_name)
+            table_ids.update(dag.predecessors(model_name))
+    current = table_fingerprints(table_ids, client)
+
+    stale: Set[str] = set()
+    for model_name in nx.topological_sort(dag):
+        if model_name not in sql_stmts:
+            continue
+
+        previous = state.models.get(model_name)
+        if (
+            previous is None
+            or previous.sql_hash != hash_text(sql_stmts[model_name])
+            or previous.destination != current[model_name]
+            or previous.upstream
+            != {
+                table_id: current[table_id] for table_id in dag.predecessors(model_name)
+            }
+            or any(upstream in stale for upstream in dag.predecessors(model_name))
+        ):
+            stale.add(model_name)
+    return stale
+
+
+def materialize_task(
+    task: Task, state: MaterializationState, client: Optional[Client] = None
+) -> Optional[Result]:
+    """
+    Materializes the `task` model, and records the `ModelState` of the
+    materialization into `state`. The upstream tables are fingerprinted before
+    the model is materialized, so any change to them while it runs makes it stale.
+    """
+    client = client or get_client()
+    upstream = table_fingerprints(_upstream_table_ids(task), client)
+
+    model_name = task.model.unique_name()
+    result = materialize(
+        task.sql_stmt, model_name, task.model.__model_config__, client=client
+    )
+
+    state.models[model_name] = ModelState(
+        sql_hash=hash_text(task.sql_stmt),
+        destination=(
+            TableFingerprint.from_table(result.destination_table) if result else None
+        ),
+        upstream=upstream,
+    )
+    return result
+
+
+def _get_table(client: Client, table_id: str) -> Optional[Table]:
+    try:
+        return client.get_table(table_id)
+    except NotFound:
+        return None
+
+
+def _partitioning(table: Table) -> Tuple:
+    if table.range_partitioning:
+        range_ = table.range_partitioning.range_
+        return (
+            table.range_partitioning.field,
+            range_.start,
+            range_.end,
+            range_.interval,
+        )
+    if table.time_partitioning:
+        return table.time_partitioning.field, table.time_partitioning.type_
+    return ()
+
+
+def _quote(identifier: str) -> str:
+    return f"`{identifier}`"
+
+
+def _incremental_sql(sql: str, table: Table, config: IncrementalConfig) -> str:
+    """
+    Builds the BigQuery script which writes the rows of `sql` newer than the
+    `watermark` of `table` into it
+    """
+    table_id = _quote(str(table.reference))
+    watermark = _quote(config.watermark)
+    columns = [_quote(field.name) for field in table.schema]
+    partitioning = _partitioning(table)
+
+    statements = [
+        f"DECLARE amora_watermark DEFAULT (SELECT MAX({watermark}) FROM {table_id})",
+    ]
+    source = (
+        f"SELECT * FROM (\n{sql}\n) "
+        f"WHERE amora_watermark IS NULL OR {watermark} > amora_watermark"
+    )
+
+    if not config.unique_key:
+        statements.append(
+            f"INSERT INTO {table_id} ({', '.join(columns)})\n"
+            f"SELECT {', '.join(columns)} FROM ({source})"
+        )
+        return ";\n".join(statements)
+
+    on = [f"target.{_quote(key)} = source.{_quote(key)}" for key in config.unique_key]
+    if config.prune_partitions and partitioning:
+        partition = _quote(partitioning[0])
+        # A typed NULL, so the bound can be set after the source rows are computed.
+        # Script variables, unlike subqueries, prune the partitions of the merge target
+        statements.append(
+            f"DECLARE amora_partition_lower_bound DEFAULT "
+            f"(SELECT MIN({partition}) FROM {table_id} WHERE FALSE)"
+        )
+        statements.append(f"CREATE TEMP TABLE amora_incremental_source AS {source}")
+        statements.append(
+            f"SET amora_partition_lower_bound = "
+            f"(SELECT MIN({partition}) FROM amora_incremental_source)"
+        )
+        source = "SELECT * FROM amora_incremental_source"
+        on.append(f"target.{partition} >= amora_partition_lower_bound")
+
+    statements.append(
+        f"MERGE {table_id} AS target\n"
+        f"USING ({source}) AS source\n"
+        f"ON {' AND '.join(on)}\n"
+        f"WHEN MATCHED THEN UPDATE SET "
+        f"{', '.join(f'{column} = source.{column}' for column in columns)}\n"
+        f"WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) "
+        f"VALUES ({', '.join(f'source.{column}' for column in columns)})"
+    )
+    return ";\n".join(statements)
+
+
+def _run_query(client: Client, sql: str) -> QueryJob:
+    query_job = client.query(sql)
+    query_job.result()
+    return query_job
+
+
+def _query_into_staging_and_swap(
+    client: Client, sql: str, table: Table, existing: Optional[Table]
+) -> QueryJob:
+    """
+    Writes the results of `sql` to a staging table with the schema of `table`, and
+    replaces `table` with it once the query is done.
+
+    A copy job overwrites `table` atomically, keeping it in place, but can't change its
+    partitioning. Tables whose partitioning changed are replaced, also atomically,
+    by a `CREATE OR REPLACE TABLE ... COPY` statement.
+    """
+    staging = Table(f"{table.reference}{STAGING_TABLE_SUFFIX}", schema=table.schema)
+    staging.time_partitioning = table.time_partitioning
+    staging.range_partitioning = table.range_partitioning
+    staging.clustering_fields = table.clustering_fields
+    staging.expires = datetime.utcnow() + timedelta(hours=STAGING_TABLE_HOURS_TO_EXPIRE)
+
+    # Left behind by a materialization that didn't finish
+    client.delete_table(staging, not_found_ok=True)
+    client.create_table(staging)
+    try:
+        # Appending to the empty staging table, unlike overwriting it,
+        # fails on results that don't match its schema
+        query_job = client.query(
+            sql,
+            job_config=QueryJobConfig(
+                destination=staging,
+                write_disposition=WriteDisposition.WRITE_APPEND,
+                create_disposition=CreateDisposition.CREATE_NEVER,
+            ),
+        )
+        query_job.result()
+
+        if existing is None or _partitioning(existing) == _partitioning(table):
+            client.copy_table(
+                staging,
+                table,
+                job_config=CopyJobConfig(
+                    write_disposition=WriteDisposition.WRITE_TRUNCATE,
+                    create_disposition=CreateDisposition.CREATE_IF_NEEDED,
+                ),
+            ).result()
+        else:
+            # The table expiration is set with the rest of its metadata,
+            # instead of copied from the staging table
+            _run_query(
+                client,
+                f"CREATE OR REPLACE TABLE {_quote(str(table.reference))} "
+                f"COPY {_quote(str(staging.reference))} "
+                f"OPTIONS(expiration_timestamp=NULL)",
+            )
+    finally:
+        client.delete_table(staging, not_found_ok=True)
+
+    return query_job
@@ -1,4 +1,7 @@
-from datetime import date
+import math
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Sequence
 
 import pandas as pd
 from numpy import nan
@@ -11,34 +14,191 @@ from sqlalchemy import (
     cast,
     func,
     literal,
+    literal_column,
     select,
+    tablesample,
+    true,
     union_all,
 )
+from sqlalchemy.sql import ColumnElement, CompoundSelect, FromClause, Select
 from sqlalchemy_bigquery import STRUCT
 
+from amora.compilation import compile_statement
+from amora.config import SummaryModes, settings
 from amora.feature_store.protocols import FeatureViewSourceProtocol
 from amora.logger import logger
-from amora.models import Model
-from amora.providers.bigquery import run
+from amora.models import MaterializationTypes, Model
+from amora.providers.bigquery import content_version, dry_run_queries, run
 from amora.storage import cache
 
+SUMMARY_STATS = ["min", "max", "unique_count", "avg", "stddev", "null_percentage"]
 
-@cache(suffix=lambda model: f"{model.unique_name()}.{date.today()}")
-def summarize(model: Model) -> pd.DataFrame:
-    logger.debug(f"Summarizing model `{model.unique_name()}`")
-    return _summarize_columns(model)
+# z-score of a two-sided 95% confidence interval
+CONFIDENCE_Z_SCORE = 1.96
 
 
-def _summarize_columns(model: Model) -> pd.DataFrame:
-    stmts = []
+@dataclass
+class ModelsSummary:
+    """
+    The summaries of many models, computed by `summarize_models` in a single query
+
+    Attributes:
+        summaries (Dict[str, pd.DataFrame]): The summary of each model, by `unique_name`
+        total_bytes (int): Bytes billed by the batched query
+        bytes_saved (Optional[int]): Bytes the models would process summarized the way
+            they were before the single pass summaries, one `SELECT` per column in one
+            query per model, according to their dry runs, minus the bytes processed
+            by the batched query. `None` if a model can't be dry run
+    """
+
+    summaries: Dict[str, pd.DataFrame]
+    total_bytes: int
+    bytes_saved: Optional[int]
+
+
+def _summary_cache_suffix(model: Model, mode: SummaryModes = SummaryModes.exact) -> str:
+    if mode is SummaryModes.exact:
+        return model.unique_name()
+    return f"{model.unique_name()}.{mode.value}"
+
+
+@cache(
+    suffix=_summary_cache_suffix,
+    ttl=timedelta(days=1),
+    version=lambda model, mode=SummaryModes.exact: content_version(
+        _summary_statement(model, mode)
+    ),
+)
+def summarize(model: Model, mode: SummaryModes = SummaryModes.exact) -> pd.DataFrame:
+    """
+    Returns one row per column of the model, with its min, max, unique count, average,
+    standard deviation and null percentage. All columns are summarized in a single
+    aggregate query, which scans the model once.
+
+    The `mode` trades accuracy for cost:
+
+    - `SummaryModes.exact` aggregates every row of the model.
+    - `SummaryModes.approximate` estimates unique counts with `APPROX_COUNT_DISTINCT`.
+    - `SummaryModes.sampled` also reads only a `TABLESAMPLE SYSTEM` of
+    `settings.SUMMARY_SAMPLE_PERCENTAGE` percent of the table, restricted to the
+    partitions of the last `settings.SUMMARY_SAMPLE_PARTITION_DAYS` days if the model
+    is time partitioned. The summary of the sample gets two more columns, the
+    `avg_error_bound` and `null_percentage_error_bound`: the half widths of the
+    95% confidence intervals of the table average and null percentage. The bounds
+    assume the sampled rows are independent, while `TABLESAMPLE SYSTEM` samples
+    storage blocks, so they are optimistic for columns correlated with the table
+    layout, such as the partitioning and clustering columns. `min`, `max` and
+    `unique_count` are the ones of the sample, which are within the table's.
+    Models that aren't tables can't be sampled, and are summarized as
+    `SummaryModes.approximate`.
+    """
+    logger.debug(f"Summarizing model `{model.unique_name()}`", extra={"mode": mode})
+    return _summarize_columns(model, mode)
+
+
+def summarize_models(
+    models: Sequence[Model], mode: SummaryModes = SummaryModes.exact
+) -> ModelsSummary:
+    """
+    Summarizes many models in a single BigQuery job, instead of one job per model.
+    Each model is scanned once, by an aggregate subquery, and the single row results
+    of the subqueries are joined together. See `summarize`.
+    """
+    if not models:
+        return ModelsSummary(summaries={}, total_bytes=0, bytes_saved=0)
+
+    statements = [_summary_statement(model, mode) for model in models]
+    subqueries = [
+        select(
+            *(
+                column.label(f"m{index}_{column.name}")
+                for column in statement.selected_columns
+            )
+        ).subquery()
+        for index, statement in enumerate(statements)
+    ]
+    joined: FromClause = subqueries[0]
+    for subquery in subqueries[1:]:
+        joined = joined.join(subquery, true())
+    result = run(select(*(c for sq in subqueries for c in sq.c)).select_from(joined))
+    row = result.to_arrow().to_pylist()[0]
+
+    summaries = {}
+    for index, model in enumerate(models):
+        prefix = f"m{index}_"
+        model_row = {
+            name[len(prefix) :]: value
+            for name, value in row.items()
+            if name.startswith(prefix)
+        }
+        summaries[model.unique_name()] = _summary_dataframe(model, model_row, mode)
+
+    baseline_bytes = _per_column_bytes(models)
+    bytes_saved = None
+    if baseline_bytes is not None and result.total_bytes_processed is not None:
+        bytes_saved = baseline_bytes - result.total_bytes_processed
+    logger.info(
+        f"Summarized {len(models)} models in a single query",
+        extra={"total_bytes": result.total_bytes, "bytes_saved": bytes_saved},
+    )
+    return ModelsSummary(
+        summaries=summaries, total_bytes=result.total_bytes, bytes_saved=bytes_saved
+    )
+
+
+def _summarize_columns(
+    model: Model, mode: SummaryModes = SummaryModes.exact
+) -> pd.DataFrame:
+    result = run(_summary_statement(model, mode))
+    row = result.to_arrow().to_pylist()[0]
+
+    return _summary_dataframe(model, row, mode)
+
+
+def _per_column_statement(model: Model) -> CompoundSelect:
+    """
+    The summary statement of the model as it was before `_summary_statement`:
+    one aggregate `SELECT` per column, each scanning the model again, combined with
+    `UNION ALL`. It's only dry run, as the baseline of `ModelsSummary.bytes_saved`.
+    """
+    aggregates = list(_summary_statement(model).selected_columns)
+    stats_count = len(SUMMARY_STATS)
+    return union_all(
+        *(
+            select(*aggregates[start : start + stats_count])
+            for start in range(0, len(aggregates), stats_count)
+        )
+    )
+
+
+def _per_column_bytes(models: Sequence[Model]) -> Optional[int]:
+    """
+    The bytes the models would process summarized by `_per_column_statement`,
+    according to their dry runs, which are memoized by
+    `amora.providers.bigquery.dry_run_queries`. `None` if a model can't be dry run.
+    """
+    dry_run_results = dry_run_queries(
+        {model: compile_statement(_per_column_statement(model)) for model in models}
+    )
+    total_bytes = 0
+    for dry_run_result in dry_run_results.values():
+        if dry_run_result is None or dry_run_result.total_bytes is None:
+            return None
+        total_bytes += dry_run_result.total_bytes
+    return total_bytes
+
+
+def _summary_columns(model: Model) -> List[Dict[str, Any]]:
+    """
+    Returns the summarized columns of the model, and the attributes of each column
+    that are known without querying the model
+    """
     columns = model.columns()
     if columns is None:
         raise ValueError("Unable to summarize model without columns")
 
+    summary_columns = []
     for column in columns:
-        is_supported = not isinstance(column.type, (ARRAY, STRUCT))
-        is_numeric = isinstance(column.type, (Numeric, Integer, Float))
-
         if isinstance(model, FeatureViewSourceProtocol):
             is_fv_feature = column.name in (
                 c.name for c in model.feature_view_features()
@@ -55,37 +215,159 @@ def _summarize_columns(model: Model) -> pd.DataFrame:
             is_fv_entity = False
             is_fv_event_timestamp = False
 
-        _min = cast(func.min(column), String) if is_supported else literal(None)
-        _max = cast(func.max(column), String) if is_supported else literal(None)
-        _unique_count = func.count(column.distinct()) if is_supported else literal(None)
-        _avg = cast(func.avg(column), String) if is_numeric else literal(None)
-        _stddev = func.stddev(column) if is_numeric else literal(None)
-        _null_percentage = (
-            func.safe_divide(
-                (literal(100) * func.countif(column == None)), func.count(0)
-            )
-            if is_supported
-            else literal(None)
+        summary_columns.append(
+            {
+                "column": column,
+                "column_name": column.name,
+                "column_type": str(column.type),
+                "is_fv_feature": is_fv_feature,
+                "is_fv_entity": is_fv_entity,
+                "is_fv_event_timestamp": is_fv_event_timestamp,
+            }
+        )
+    return summary_columns
+
+
+def is_sampled(model: Model, mode: SummaryModes) -> bool:
+    """
+    Whether the `mode` summary of the model reads a sample of it. `TABLESAMPLE SYSTEM`
+    can only be applied directly to tables.
+    """
+    return mode is SummaryModes.sampled and model.__model_config__.materialized in (
+        MaterializationTypes.table,
+        MaterializationTypes.incremental,
+    )
+
+
+def _partition_filter(model: Model, columns) -> Optional[ColumnElement]:
+    """
+    Restricts a time partitioned model to the partitions of the last
+    `settings.SUMMARY_SAMPLE_PARTITION_DAYS` days
+    """
+    partition_by = model.__model_config__.partition_by
+    days = settings.SUMMARY_SAMPLE_PARTITION_DAYS
+    if partition_by is None or days is None:
+        return None
+
+    interval = literal_column(f"INTERVAL {days} DAY")
+    column = columns[partition_by.field]
+    data_type = partition_by.data_type.lower()
+    if data_type == "date":
+        return column >= func.date_sub(func.current_date(), interval)
+    if data_type == "timestamp":
+        return column >= func.timestamp_sub(func.current_timestamp(), interval)
+    if data_type == "datetime":
+        return column >= func.datetime_sub(func.current_datetime(), interval)
+    return None
+
+
+def _summary_statement(model: Model, mode: SummaryModes = SummaryModes.exact) -> Select:
+    """
+    A single aggregate `SELECT` with the `SUMMARY_STATS` of every column of the model.
+    The result has a single row, and the stat `s` of the `i`-th column is labeled `c{i}_{s}`.
+    Sampled summaries also select the number of sampled rows, as `row_count`.
+    """
+    sampled = is_sampled(model, mode)
+    if sampled:
+        sampling = literal_column(f"{settings.SUMMARY_SAMPLE_PERCENTAGE} PERCENT")
+        columns = tablesample(model, sampling).c  # type: ignore
+    else:
+        columns = None
+
+    aggregates: List[ColumnElement] = []
+    for index, summary_column in enumerate(_summary_columns(model)):
+        column = summary_column["column"]
+        if columns is not None:
+            column = columns[column.name]
+        is_supported = not isinstance(column.type, (ARRAY, STRUCT))
+        is_numeric = isinstance(column.type, (Numeric, Integer, Float))
+
+        _unique_count: ColumnElement
+        if not is_supported:
+            _unique_count = literal(None)
+        elif mode is SummaryModes.exact:
+            _unique_count = func.count(column.distinct())
+        else:
+            _unique_count = func.approx_count_distinct(column)
+
+        stats = {
+            "min": cast(func.min(column), String) if is_supported else literal(None),
+            "max": cast(func.max(column), String) if is_supported else literal(None),
+            "unique_count": _unique_count,
+            "avg": cast(func.avg(column), String) if is_numeric else literal(None),
+            "stddev": func.stddev(column) if is_numeric else literal(None),
+            "null_percentage": (
+                func.safe_divide(
+                    (literal(100) * func.countif(column == None)), func.count(0)
+                )
+                if is_supported
+                else literal(None)
+            ),
+        }
+        aggregates.extend(
+            stats[stat].label(f"c{index}_{stat}") for stat in SUMMARY_STATS
         )
 
-        stmt = select(
-            literal(column.name).label("column_name"),
-            literal(str(column.type)).label("column_type"),
-            _min.label("min"),  # type: ignore
-            _max.label("max"),  # type: ignore
-            _unique_count.label("unique_count"),  # type: ignore
-            _avg.label("avg"),  # type: ignore
-            _stddev.label("stddev"),  # type: ignore
-            _null_percentage.label("null_percentage"),  # type: ignore
-            literal(is_fv_feature).label("is_fv_feature"),
-            literal(is_fv_entity).label("is_fv_entity"),
-            literal(is_fv_event_timestamp).label("is_fv_event_timestamp"),
+    if not sampled:
+        return select(*aggregates)
+
+    stmt = select(*aggregates, func.count(0).label("row_count"))
+    partition_filter = _partition_filter(model, columns)
+    if partition_filter is not None:
+        stmt = stmt.where(partition_filter)
+    return stmt
+
+
+def _error_bounds(row: Dict[str, Any], index: int) -> Dict[str, Optional[float]]:
+    """
+    The half widths of the 95% confidence intervals of the average and of the null
+    percentage of the `index`-th column of a table, given the summary of a sample of it
+    """
+    row_count = row.get("row_count") or 0
+    stddev = row.get(f"c{index}_stddev")
+    null_percentage = row.get(f"c{index}_null_percentage")
+    if not row_count:
+        return {"avg_error_bound": None, "null_percentage_error_bound": None}
+
+    avg_error_bound = None
+    if stddev is not None:
+        avg_error_bound = CONFIDENCE_Z_SCORE * stddev / math.sqrt(row_count)
+
+    null_percentage_error_bound = None
+    if null_percentage is not None:
+        null_ratio = null_percentage / 100
+        null_percentage_error_bound = (
+            100
+            * CONFIDENCE_Z_SCORE
+            * math.sqrt(null_ratio * (1 - null_ratio) / row_count)
         )
-        stmts.append(stmt)
 
-    all_stmts = union_all(*stmts)
+    return {
+        "avg_error_bound": avg_error_bound,
+        "null_percentage_error_bound": null_percentage_error_bound,
+    }
+
 
-    result = run(all_stmts)
-    df = result.to_dataframe()
+def _summary_dataframe(
+    model: Model, row: Dict[str, Any], mode: SummaryModes = SummaryModes.exact
+) -> pd.DataFrame:
+    """
+    Unpivots the single row result of `_summary_statement` into one row per column
+    """
+    sampled = is_sampled(model, mode)
+    records = []
+    for index, summary_column in enumerate(_summary_columns(model)):
+        record = {
+            "column_name": summary_column["column_name"],
+            "column_type": summary_column["column_type"],
+        }
+        for stat in SUMMARY_STATS:
+            record[stat] = row.get(f"c{index}_{stat}")
+        if sampled:
+            record.update(_error_bounds(row, index))
+        record["is_fv_feature"] = summary_column["is_fv_feature"]
+        record["is_fv_entity"] = summary_column["is_fv_entity"]
+        record["is_fv_event_timestamp"] = summary_column["is_fv_event_timestamp"]
+        records.append(record)
 
-    return df.replace({nan: None})
+    return pd.DataFrame.from_records(records).replace({nan: None})
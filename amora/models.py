@@ -1,7 +1,10 @@
 import dataclasses
 import importlib
 import inspect
+import os
 import re
+import sys
+import threading
 from collections import defaultdict
 from enum import Enum, auto
 from inspect import getfile
@@ -9,6 +12,7 @@ from pathlib import Path
 from types import ModuleType
 from typing import (
     Any,
+    Callable,
     Dict,
     Iterable,
     List,
@@ -20,12 +24,13 @@ from typing import (
     Union,
 )
 
-from pydantic import NameEmail
+from pydantic import BaseModel, NameEmail
 from sqlalchemy import Column, MetaData, Table
 from sqlalchemy.orm import declared_attr, registry
 from sqlalchemy.sql import ColumnCollection
 
 from amora.config import settings
+from amora.hashing import HASH_ALGORITHM, FileSignature, file_hasher
 from amora.logger import logger
 from amora.protocols import Compilable, CompilableProtocol
 from amora.utils import ensure_path, list_files, model_path_for_target_path
@@ -104,6 +109,32 @@ class MaterializationTypes(AutoName):
     ephemeral = auto()
     view = auto()
     table = auto()
+    incremental = auto()
+
+
+@dataclasses.dataclass
+class IncrementalConfig:
+    """
+    Configuration of `incremental` models, which are built as a table on their first
+    materialization, and then only process the rows added or changed since the
+    previous materialization.
+
+    Attributes:
+        watermark (str): A column that increases as rows are added or changed, such as an
+            `updated_at` timestamp. Only source rows with a `watermark` greater than the
+            table's maximum `watermark` are processed.
+        unique_key (Optional[List[str]]): Columns that identify a row. If set, new rows are
+            merged into the table, updating the rows with the same key. Otherwise, new rows
+            are appended.
+        prune_partitions (bool): Restricts the rows of the table which are merged to the partitions
+            of the new rows, as defined by the model `partition_by`, so the merge doesn't scan
+            the whole table. Only valid if a row partition never changes, e.g. when the
+            table is partitioned by a creation date.
+    """
+
+    watermark: str
+    unique_key: Optional[List[str]] = None
+    prune_partitions: bool = False
 
 
 Owner = NameEmail
@@ -118,9 +149,10 @@ class ModelConfig:
         cluster_by (List[str]): BigQuery tables can be [clustered](https://cloud.google.com/bigquery/docs/clustered-tables) to colocate related data. Expects a list of columns, as strings.
         description (Optional[str]): A string description of the model, used for documentation
         labels (Labels): Labels that can be used for data catalog and resource selection
-        materialized (amora.models.MaterializationTypes): The materialization configuration: `view`, `table`, `ephemeral`. Default: `view`
+        materialized (amora.models.MaterializationTypes): The materialization configuration: `view`, `table`, `incremental`, `ephemeral`. Default: `view`
         partition_by (Optional[PartitionConfig]): BigQuery supports the use of a [partition by](https://cloud.google.com/bigquery/docs/partitioned-tables) clause to easily partition a table by a column or expression. This option can help decrease latency and cost when querying large tables.
         hours_to_expire (Optional[int]): Bigquery supports setting an expiration time for a table. (https://cloud.google.com/bigquery/docs/managing-tables?hl=pt-br#updating_a_tables_expiration_time). Having this option can help us free up more space.
+        incremental (Optional[IncrementalConfig]): How new rows are identified and written by `incremental` models. Required by the `incremental` materialization.
     """
 
     description: str = "Undocumented! Generated by Amora Data Build Tool 💚"
@@ -130,6 +162,7 @@ class ModelConfig:
     labels: Labels = dataclasses.field(default_factory=set)
     owner: Optional[Owner] = None
     hours_to_expire: Optional[int] = None
+    incremental: Optional[IncrementalConfig] = None
 
     @property
     def labels_dict(self) -> Dict[str, str]:
@@ -251,18 +284,20 @@ def _is_amora_model(candidate: ModuleType) -> bool:
     )
 
 
+def _module_name_for_path(path: Path) -> str:
+    return (
+        path.relative_to(settings.models_path)
+        .as_posix()
+        .replace("/", ".")
+        .replace(".py", "")
+    )
+
+
 @ensure_path
 def amora_model_for_path(path: Path) -> Model:
     try:
-        relative_module_name = (
-            path.relative_to(settings.models_path)
-            .as_posix()
-            .replace("/", ".")
-            .replace(".py", "")
-        )
-
         module = importlib.import_module(
-            relative_module_name, settings.models_path.name
+            _module_name_for_path(path), settings.models_path.name
         )
     except ModuleNotFoundError as e:
         raise ValueError(f"Invalid path `{path}`") from e
@@ -295,9 +330,9 @@ def amora_model_for_name(model_name: str) -> Model:
 def amora_model_from_name_list(
     model_name_list: Iterable[str],
 ) -> Iterable[Tuple[Model, Path]]:
-    for model, _path in list_models():
-        if model.unique_name() in model_name_list:
-            yield model, _path
+    names = set(model_name_list)
+    entries = get_models_index().select(lambda entry: entry.unique_name in names)
+    yield from models_for_index_entries(entries)
 
 
 def list_models(
@@ -322,38 +357,34 @@ def list_models_with_owner(owner: Union[str, Owner]) -> Iterable[Tuple[Model, Pa
     if isinstance(owner, str):
         owner = Owner.validate(owner)
 
-    for model, file_path in list_models():
-        if owner == model.__model_config__.owner:
-            yield model, file_path
+    entries = get_models_index().select(lambda entry: entry.owner == str(owner))
+    yield from models_for_index_entries(entries)
 
 
 def owners_to_models_dict() -> Dict[str, List[Model]]:
     owners_dict = defaultdict(list)
-    for model, _ in list_models():
-        owner = model.owner()
-        if owner:
-            owners_dict[owner].append(model)
+    entries = get_models_index().select(lambda entry: bool(entry.owner))
+    for model, _ in models_for_index_entries(entries):
+        owners_dict[model.owner()].append(model)
     return owners_dict
 
 
 def select_models_with_labels(labels: Labels) -> Iterable[Tuple[Model, Path]]:
-    def matches_labels(item: Tuple[Model, Path]) -> bool:
-        model, _model_path = item
-        return match_labels(model, labels)
-
-    return filter(matches_labels, list_models())
+    labels_repr = {str(label) for label in labels}
+    entries = get_models_index().select(
+        lambda entry: not labels_repr.isdisjoint(entry.labels)
+    )
+    return models_for_index_entries(entries)
 
 
 def select_models_with_label_keys(
     label_keys: LabelKeys,
 ) -> Iterable[Tuple[Model, Path]]:
     keys = set(label_keys)
-
-    def matches_labels(item: Tuple[Model, Path]) -> bool:
-        model, _model_path = item
-        return match_label_keys(model, keys)
-
-    return filter(matches_labels, list_models())
+    entries = get_models_index().select(
+        lambda entry: any(label.partition(":")[0] in keys for label in entry.labels)
+    )
+    return models_for_index_entries(entries)
 
 
 def match_label_keys(model: Model, label_keys: Iterable[LabelKey]) -> bool:
@@ -369,3 +400,229 @@ def match_labels(model: Model, labels: Labels) -> bool:
         if label in model.__model_config__.labels:
             return True
     return False
+
+
+class ModelIndexEntry(BaseModel):
+    """
+    The metadata of a model file, as recorded on the `amora.models.ModelIndex`
+    """
+
+    path: str
+    inode: int
+    mtime_ns: int
+    size: int
+    checksum: str
+    unique_name: str
+    tablename: str
+    dependencies: List[str]
+    has_source: bool
+    materialized: str
+    description: str
+    owner: Optional[str]
+    labels: List[str]
+
+    @classmethod
+    def for_model(
+        cls, model: Model, path: Path, stat: os.stat_result, checksum: str
+    ) -> "ModelIndexEntry":
+        config = model.__model_config__
+        return cls(
+            path=path.as_posix(),
+            inode=stat.st_ino,
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            checksum=checksum,
+            unique_name=model.unique_name(),
+            tablename=model.__tablename__,
+            dependencies=[
+                dependency.unique_name()
+                for dependency in getattr(model, "__depends_on__", [])
+            ],
+            has_source=model.source() is not None,
+            materialized=config.materialized.value,
+            description=config.description,
+            owner=model.owner() or None,
+            labels=sorted(str(label) for label in config.labels),
+        )
+
+    @property
+    def signature(self) -> FileSignature:
+        return FileSignature(inode=self.inode, size=self.size, mtime_ns=self.mtime_ns)
+
+    def touch(self, stat: os.stat_result) -> None:
+        self.inode = stat.st_ino
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+
+
+class ModelIndex(BaseModel):
+    """
+    A persistent index of the project models, keyed by model file path.
+
+    Answering questions about the project models, such as their names, owners,
+    labels or dependencies, would otherwise require importing every model file.
+    The index records that metadata alongside each file signature and content
+    checksum, so only the files that changed since the last `refresh` are hashed,
+    and only the ones with different contents are imported again.
+
+    The index is persisted at `settings.MODELS_INDEX_PATH`.
+    """
+
+    models_path: str
+    metadata_schema: str
+    hash_algorithm: str
+    entries: Dict[str, ModelIndexEntry] = {}
+
+    @classmethod
+    def empty(cls) -> "ModelIndex":
+        return cls(
+            models_path=settings.models_path.as_posix(),
+            metadata_schema=metadata.schema,
+            hash_algorithm=HASH_ALGORITHM,
+        )
+
+    @classmethod
+    def load(cls) -> "ModelIndex":
+        try:
+            index = cls.parse_file(settings.models_index_path)
+        except (FileNotFoundError, ValueError):
+            return cls.empty()
+
+        if (
+            index.models_path != settings.models_path.as_posix()
+            or index.metadata_schema != metadata.schema
+            or index.hash_algorithm != HASH_ALGORITHM
+        ):
+            return cls.empty()
+        return index
+
+    def save(self) -> None:
+        path = settings.models_index_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}")
+        tmp_path.write_text(self.json())
+        os.replace(tmp_path, path)
+
+    def refresh(self) -> bool:
+        """
+        Syncs the index with the model files, importing only the files
+        which changed since they were indexed. Returns `True` if the index
+        was modified.
+        """
+        changed = False
+        stale: Dict[str, Tuple[os.stat_result, str]] = {}
+        current_paths = set()
+
+        for model_file_path in list_files(settings.models_path, suffix=".py"):
+            if model_file_path.stem.startswith("_"):
+                continue
+
+            key = model_file_path.as_posix()
+            current_paths.add(key)
+            stat = model_file_path.stat()
+            entry = self.entries.get(key)
+
+            if entry is not None:
+                file_hasher.remember(model_file_path, entry.signature, entry.checksum)
+            checksum = file_hasher.hash_file(model_file_path, stat)
+
+            if entry is None or entry.checksum != checksum:
+                stale[key] = (stat, checksum)
+            elif entry.signature != FileSignature.from_stat(stat):
+                entry.touch(stat)
+                changed = True
+
+        renamed: Set[str] = set()
+        for key in self.entries.keys() - current_paths:
+            renamed.add(self.entries.pop(key).unique_name)
+            changed = True
+
+        for key, (stat, checksum) in stale.items():
+            if self._reindex(Path(key), stat, checksum, renamed):
+                changed = True
+
+        # A dependency was renamed or removed, so its dependents
+        # must be reimported to pick up the new references
+        for key, entry in list(self.entries.items()):
+            if key not in stale and renamed.intersection(entry.dependencies):
+                self._reindex(Path(key), Path(key).stat(), entry.checksum, set())
+                changed = True
+
+        return changed
+
+    def _reindex(
+        self, path: Path, stat: os.stat_result, checksum: str, renamed: Set[str]
+    ) -> bool:
+        key = path.as_posix()
+        previous = self.entries.get(key)
+
+        try:
+            # A long-lived process may have imported the file before it changed,
+            # and importing it again would return the stale module
+            module = sys.modules.get(_module_name_for_path(path))
+            if module is not None:
+                importlib.reload(module)
+            model = amora_model_for_path(path)
+        except ValueError:
+            logger.exception(
+                "Unable to load amora model for path",
+                extra={"model_file_path": path},
+            )
+            if previous is not None:
+                renamed.add(self.entries.pop(key).unique_name)
+            return previous is not None
+
+        entry = ModelIndexEntry.for_model(model, path, stat, checksum)
+        if previous is not None and previous.unique_name != entry.unique_name:
+            renamed.add(previous.unique_name)
+
+        self.entries[key] = entry
+        return True
+
+    def select(
+        self, predicate: Callable[[ModelIndexEntry], bool]
+    ) -> List[ModelIndexEntry]:
+        return [entry for entry in self.entries.values() if predicate(entry)]
+
+    def entry_for_name(self, unique_name: str) -> Optional[ModelIndexEntry]:
+        for entry in self.entries.values():
+            if entry.unique_name == unique_name:
+                return entry
+        return None
+
+
+_models_index: Optional[ModelIndex] = None
+_models_index_lock = threading.Lock()
+
+
+def get_models_index() -> ModelIndex:
+    """
+    Returns the project `ModelIndex`, refreshed against the current state
+    of the model files.
+    """
+    global _models_index
+
+    with _models_index_lock:
+        if _models_index is None or (
+            _models_index.models_path != settings.models_path.as_posix()
+        ):
+            _models_index = ModelIndex.load()
+
+        if _models_index.refresh():
+            _models_index.save()
+
+        return _models_index
+
+
+def models_for_index_entries(
+    entries: Iterable[ModelIndexEntry],
+) -> Iterable[Tuple[Model, Path]]:
+    for entry in entries:
+        model_file_path = Path(entry.path)
+        try:
+            yield amora_model_for_path(model_file_path), model_file_path
+        except ValueError:
+            logger.exception(
+                "Unable to load amora model for path",
+                extra={"model_file_path": model_file_path},
+            )
@@ -1,13 +1,33 @@
 import dataclasses
 import decimal
-from datetime import date, datetime, time
+import hashlib
+import json
+import os
+import threading
+from concurrent import futures
+from datetime import date, datetime, time, timedelta
 from enum import Enum
-from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Union
+from functools import partial
+from pathlib import Path
+from time import monotonic
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import pandas as pd
+import pyarrow as pa
 import sqlalchemy
 from google.api_core.client_info import ClientInfo
-from google.api_core.exceptions import NotFound
+from google.api_core.exceptions import GoogleAPICallError, NotFound
 from google.cloud.bigquery import (
     Client,
     QueryJobConfig,
@@ -15,6 +35,7 @@ from google.cloud.bigquery import (
     Table,
     TableReference,
 )
+from google.cloud.bigquery.retry import DEFAULT_RETRY
 from google.cloud.bigquery.schema import _DEFAULT_VALUE
 from google.cloud.bigquery.table import RowIterator, _EmptyRowIterator
 from sqlalchemy import (
@@ -144,33 +165,149 @@ class DryRunResult(BaseResult):
         return estimated_query_cost_in_usd(self.total_bytes)
 
 
+class DryRunCache:
+    """
+    Dry run results, stored at `settings.DRY_RUN_CACHE_PATH` by the hash of the compiled
+    SQL, or of the table name for models without a source, so they're reused by later
+    dry runs of the same SQL, including the ones of other processes.
+
+    The bytes processed by a query change with the data it reads, so results expire
+    after `settings.GCP_BIGQUERY_DRY_RUN_CACHE_MAX_AGE_SECONDS`.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_age: Optional[float] = None):
+        self.path = path or settings.dry_run_cache_path
+        self.max_age = (
+            settings.GCP_BIGQUERY_DRY_RUN_CACHE_MAX_AGE_SECONDS
+            if max_age is None
+            else max_age
+        )
+
+    @staticmethod
+    def key(sql: str) -> str:
+        return hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+    def _path_for_key(self, key: str) -> Path:
+        return self.path.joinpath(key[:2], f"{key}.json")
+
+    def get(self, key: str, model: Model) -> Optional[DryRunResult]:
+        path = self._path_for_key(key)
+        try:
+            if datetime.now().timestamp() - path.stat().st_mtime > self.max_age:
+                return None
+            entry = json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+        schema = entry.pop("schema")
+        return DryRunResult(
+            model=model,
+            schema=(
+                [SchemaField.from_api_repr(field) for field in schema]
+                if schema is not None
+                else None
+            ),
+            **entry,
+        )
+
+    def put(self, key: str, result: DryRunResult) -> None:
+        entry = {
+            "total_bytes": result.total_bytes,
+            "query": result.query,
+            "job_id": result.job_id,
+            "referenced_tables": result.referenced_tables,
+            "user_email": result.user_email,
+            "schema": (
+                [field.to_api_repr() for field in result.schema]
+                if result.schema is not None
+                else None
+            ),
+        }
+        path = self._path_for_key(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{key}.{os.getpid()}.{threading.get_ident()}")
+        tmp_path.write_text(json.dumps(entry))
+        os.replace(tmp_path, path)
+
+
 @dataclasses.dataclass
 class RunResult(BaseResult):
     rows: Union[RowIterator, _EmptyRowIterator]
     execution_time_in_ms: int
     to_dataframe: Callable[..., pd.DataFrame]
     schema: Optional[Schema] = None
+    total_bytes_processed: Optional[int] = None
 
     @property
     def estimated_cost(self):
         return estimated_query_cost_in_usd(self.total_bytes)
 
+    def to_arrow(self) -> pa.Table:
+        """
+        Downloads the result rows as a `pyarrow.Table`, without a pandas conversion.
+        With `settings.GCP_BIGQUERY_STORAGE_READ_API_ENABLED`, rows are downloaded
+        through the BigQuery Storage Read API, which is faster for large results.
+        """
+        return self.rows.to_arrow(
+            create_bqstorage_client=settings.GCP_BIGQUERY_STORAGE_READ_API_ENABLED
+        )
+
+    def iter_batches(self) -> Iterator[pa.RecordBatch]:
+        """
+        Streams the result rows as `pyarrow.RecordBatch`es, one result page, or
+        Storage Read API message, at a time. Memory usage is bounded by the page
+        size instead of the result size, which is suitable for large results.
+        """
+        bqstorage_client = None
+        if settings.GCP_BIGQUERY_STORAGE_READ_API_ENABLED:
+            bqstorage_client = get_bqstorage_client()
+        return self.rows.to_arrow_iterable(bqstorage_client=bqstorage_client)
+
+    def iter_dataframes(self) -> Iterator[pd.DataFrame]:
+        """
+        Streams the result rows as `pandas.DataFrame` chunks. See `iter_batches`.
+        """
+        for batch in self.iter_batches():
+            yield batch.to_pandas()
+
 
 _client = None
+_bqstorage_client = None
+_client_lock = threading.Lock()
 
 
 def get_client() -> Client:
+    """
+    Returns the BigQuery `Client` shared by the process. The client is thread safe,
+    so threads reuse its credentials and HTTP session instead of creating their own.
+    """
     global _client
     if _client is None:
-        _client = Client(
-            client_info=ClientInfo(
-                client_library_version=VERSION,
-                user_agent=f"amora-data-build-tool/{VERSION}",
-            )
-        )
+        with _client_lock:
+            if _client is None:
+                _client = Client(
+                    client_info=ClientInfo(
+                        client_library_version=VERSION,
+                        user_agent=f"amora-data-build-tool/{VERSION}",
+                    )
+                )
     return _client
 
 
+def get_bqstorage_client():
+    """
+    Returns the BigQuery Storage Read API client shared by the process,
+    or `None` if `google-cloud-bigquery-storage` isn't installed.
+    """
+    global _bqstorage_client
+    if _bqstorage_client is None:
+        client = get_client()
+        with _client_lock:
+            if _bqstorage_client is None:
+                _bqstorage_client = client._ensure_bqstorage_client()
+    return _bqstorage_client
+
+
 def get_schema(table_id: str) -> Schema:
     """
     Given a `table_id`, returns the `Schema` of the table by querying BigQueries API
@@ -284,11 +421,53 @@ def run(statement: Compilable) -> RunResult:
         rows=rows,
         schema=query_job.schema,
         total_bytes=query_job.total_bytes_billed,
+        total_bytes_processed=query_job.total_bytes_processed,
         user_email=query_job.user_email,
         to_dataframe=query_job.to_dataframe,
     )
 
 
+_content_versions: Dict[str, Tuple[float, str]] = {}
+_content_versions_lock = threading.Lock()
+
+
+def content_version(statement: Compilable) -> str:
+    """
+    Returns a digest of the compiled statement and of the current version of the
+    tables it references, i.e. their last modified time and number of rows. The digest
+    only changes when the statement or the data it reads change, which makes it
+    suitable as a cache key. E.g: `amora.storage.cache(version=...)`
+
+    The referenced tables are resolved with a dry run, which is free of charge and
+    includes the tables behind views. Versions are memoized for
+    `settings.STORAGE_CACHE_CONTENT_VERSION_MAX_AGE_SECONDS`.
+    """
+    sql = compile_statement(statement)
+    with _content_versions_lock:
+        memoized = _content_versions.get(sql)
+    if (
+        memoized is not None
+        and monotonic() - memoized[0]
+        < settings.STORAGE_CACHE_CONTENT_VERSION_MAX_AGE_SECONDS
+    ):
+        return memoized[1]
+
+    client = get_client()
+    query_job = client.query(
+        sql, job_config=QueryJobConfig(dry_run=True, use_query_cache=False)
+    )
+    digest = hashlib.blake2b(sql.encode("utf-8"), digest_size=16)
+    for table_ref in sorted(query_job.referenced_tables, key=str):
+        table = client.get_table(table_ref)
+        modified = table.modified.isoformat() if table.modified else ""
+        digest.update(f"{table_ref}:{modified}:{table.num_rows}".encode("utf-8"))
+
+    version = digest.hexdigest()
+    with _content_versions_lock:
+        _content_versions[sql] = (monotonic(), version)
+    return version
+
+
 @log_execution()
 def dry_run(model: Model) -> Optional[DryRunResult]:
     """
@@ -323,18 +502,114 @@ def dry_run(model: Model) -> Optional[DryRunResult]:
         ],
     )
     ```
+
+    Results are memoized by the hash of the compiled SQL, see `DryRunCache`, and
+    transient API errors are retried with exponential backoff, for up to
+    `settings.GCP_BIGQUERY_DRY_RUN_RETRY_DEADLINE_SECONDS`.
     """
-    client = get_client()
     source = model.source()
-    if source is None:
-        table = client.get_table(model.fully_qualified_name())
+    query = compile_statement(source) if source is not None else None
+    return _dry_run(model, query)
+
+
+def dry_run_models(
+    models: Iterable[Model], num_workers: Optional[int] = None
+) -> Dict[Model, Optional[DryRunResult]]:
+    """
+    Dry runs many models concurrently, on up to `num_workers` threads, which
+    defaults to `settings.GCP_BIGQUERY_DRY_RUN_NUM_THREADS`. The models are compiled
+    before any dry run is issued. See `dry_run`. The result of a model whose dry run
+    BigQuery refuses, e.g. with `Forbidden` or `BadRequest`, is `None`.
+    """
+    models = list(models)
+    for model in models:
+        # Compiled statements are memoized, so `dry_run` doesn't compile them again
+        source = model.source()
+        if source is not None:
+            compile_statement(source)
+
+    return _dry_run_concurrently(
+        {model: partial(dry_run, model) for model in models}, num_workers
+    )
+
+
+def dry_run_queries(
+    queries: Dict[Model, str], num_workers: Optional[int] = None
+) -> Dict[Model, Optional[DryRunResult]]:
+    """
+    Dry runs the compiled SQL `queries` of the models concurrently, like
+    `dry_run_models`. E.g. the compiled SQL of an `amora.materialization.Task`.
+    """
+    return _dry_run_concurrently(
+        {model: partial(_dry_run, model, query) for model, query in queries.items()},
+        num_workers,
+    )
+
+
+def _dry_run_concurrently(
+    dry_runs: Dict[Model, Callable[[], Optional[DryRunResult]]],
+    num_workers: Optional[int],
+) -> Dict[Model, Optional[DryRunResult]]:
+    with futures.ThreadPoolExecutor(
+        max_workers=num_workers or settings.GCP_BIGQUERY_DRY_RUN_NUM_THREADS
+    ) as executor:
+        results = {model: executor.submit(fn) for model, fn in dry_runs.items()}
+        try:
+            return {
+                model: _dry_run_result(model, future)
+                for model, future in results.items()
+            }
+        except Exception:
+            for future in results.values():
+                future.cancel()
+            raise
+
+
+def _dry_run_result(
+    model: Model, future: "futures.Future[Optional[DryRunResult]]"
+) -> Optional[DryRunResult]:
+    """
+    The result of the dry run of a model, or `None` if BigQuery refused it,
+    so that one model can't fail the dry runs of the others
+    """
+    try:
+        return future.result()
+    except GoogleAPICallError:
+        logger.exception(
+            "Unable to dry run the model", extra={"model": model.unique_name()}
+        )
+        return None
+
+
+def _dry_run_retry():
+    return DEFAULT_RETRY.with_delay(
+        initial=0.5, multiplier=2.0, maximum=8.0
+    ).with_deadline(settings.GCP_BIGQUERY_DRY_RUN_RETRY_DEADLINE_SECONDS)
+
+
+def _dry_run(model: Model, query: Optional[str]) -> Optional[DryRunResult]:
+    if query is None:
+        key = DryRunCache.key(f"table:{model.fully_qualified_name()}")
+    else:
+        key = DryRunCache.key(query)
+
+    cache = DryRunCache()
+    result = cache.get(key, model)
+    if result is not None:
+        return result
+
+    client = get_client()
+    retry = _dry_run_retry()
+    if query is None:
+        table = client.get_table(model.fully_qualified_name(), retry=retry)
 
         if table.table_type == "VIEW":
             query_job = client.query(
                 query=table.view_query,
                 job_config=QueryJobConfig(dry_run=True, use_query_cache=False),
+                retry=retry,
             )
-            return DryRunResult(
+            result = DryRunResult(
                 job_id=query_job.job_id,
                 model=model,
                 query=table.view_query,
@@ -346,22 +621,24 @@ def dry_run(model: Model) -> Optional[DryRunResult]:
                 total_bytes=query_job.total_bytes_processed,
                 user_email=query_job.user_email,
             )
+        else:
+            result = DryRunResult(
+                job_id=None,
+                model=model,
+                query=None,
+                referenced_tables=[str(table.reference)],
+                schema=table.schema,
+                total_bytes=table.num_bytes,
+                user_email=None,
+            )
+        cache.put(key, result)
+        return result
 
-        return DryRunResult(
-            job_id=None,
-            model=model,
-            query=None,
-            referenced_tables=[str(table.reference)],
-            schema=table.schema,
-            total_bytes=table.num_bytes,
-            user_email=None,
-        )
-
-    query = compile_statement(source)
     try:
         query_job = client.query(
             query=query,
             job_config=QueryJobConfig(dry_run=True, use_query_cache=False),
+            retry=retry,
         )
     except NotFound:
         logger.exception(
@@ -370,7 +647,7 @@ def dry_run(model: Model) -> Optional[DryRunResult]:
         )
         return None
     else:
-        return DryRunResult(
+        result = DryRunResult(
             job_id=query_job.job_id,
             total_bytes=query_job.total_bytes_processed,
             referenced_tables=[
@@ -382,10 +659,13 @@ def dry_run(model: Model) -> Optional[DryRunResult]:
             schema=query_job.schema,
             user_email=query_job.user_email,
         )
+        cache.put(key, result)
+        return result
 
 
 class fixed_unnest(sqlalchemy.sql.roles.InElementRole, unnest):
     _with_offset = None
+    inherit_cache = False
 
     def __init__(self, *args, **kwargs):
         self.name = "unnest"
@@ -571,6 +851,7 @@ class struct(expression.ClauseList, expression.ColumnElement):  # type: ignore
     """
 
     __visit_name__ = "struct"
+    inherit_cache = False
 
     def __init__(self, model: AmoraModel, **kw):
         self._model = model
@@ -640,6 +921,7 @@ class array(expression.ClauseList, expression.ColumnElement):  # type: ignore
     """
 
     __visit_name__ = "array"
+    inherit_cache = False
 
     def __init__(self, clauses, **kw):
         if clauses and isinstance(clauses[0], AmoraModel):
@@ -774,10 +1056,31 @@ def zip_arrays(
 def _sample_cache_key(
     model, percentage=1, limit=settings.GCP_BIGQUERY_DEFAULT_LIMIT_SIZE
 ) -> str:
-    return f"{model.unique_name()}.{percentage}.{limit}.{date.today()}"
+    return f"{model.unique_name()}.{percentage}.{limit}"
+
+
+def _sample_statement(model: Model, percentage: int, limit: int) -> Compilable:
+    if model.__model_config__.materialized not in (
+        MaterializationTypes.table,
+        MaterializationTypes.incremental,
+    ):
+        raise ValueError(
+            "TABLESAMPLE SYSTEM can only be applied directly to tables. "
+            "More on: https://cloud.google.com/bigquery/docs/table-sampling#limitations"
+        )
+
+    sampling = literal_column(f"{percentage} PERCENT")
+    model_sample = tablesample(model, sampling)  # type: ignore
+    return select(model_sample).limit(limit)
+
+
+def _sample_content_version(
+    model, percentage=1, limit=settings.GCP_BIGQUERY_DEFAULT_LIMIT_SIZE
+) -> str:
+    return content_version(_sample_statement(model, percentage, limit))
 
 
-@cache(_sample_cache_key)
+@cache(_sample_cache_key, ttl=timedelta(days=1), version=_sample_content_version)
 def sample(
     model: Model,
     percentage: int = 1,
@@ -799,15 +1102,7 @@ def sample(
     Raises:
         ValueError: TABLESAMPLE SYSTEM can only be applied directly to tables.
     """
-    if model.__model_config__.materialized is not MaterializationTypes.table:
-        raise ValueError(
-            "TABLESAMPLE SYSTEM can only be applied directly to tables. "
-            "More on: https://cloud.google.com/bigquery/docs/table-sampling#limitations"
-        )
-
-    sampling = literal_column(f"{percentage} PERCENT")
-    model_sample = tablesample(model, sampling)  # type: ignore
-    stmt = select(model_sample).limit(limit)
+    stmt = _sample_statement(model, percentage, limit)
 
     logger.debug(f"Sampling model `{model.unique_name()}`")
-    return run(stmt).to_dataframe()
+    return run(stmt).to_arrow().to_pandas()
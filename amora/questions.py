@@ -1,11 +1,12 @@
-from datetime import date
-from typing import Callable, Optional, Set
+from datetime import timedelta
+from typing import Callable, Iterator, Optional, Set
 
 import pandas as pd
+import pyarrow as pa
 
 from amora.compilation import compile_statement
 from amora.protocols import Compilable
-from amora.providers.bigquery import run
+from amora.providers.bigquery import content_version, run
 from amora.storage import cache
 from amora.visualization import Table, Visualization, VisualizationConfig
 
@@ -139,9 +140,32 @@ class Question:
         ```
         """
         stmt = self.question_func()
-        return compile_statement(stmt)
+        return compile_statement(stmt, pretty=True)
+
+    @cache(
+        suffix=lambda self: self.question_func.__name__,
+        ttl=timedelta(days=1),
+        version=lambda self: content_version(self.question_func()),
+    )
+    def answer_arrow(self) -> pa.Table:
+        """
+        Executes the question against the target database,
+        returning a `pyarrow.Table` as the answer, without a pandas conversion.
+        """
+        return run(self.question_func()).to_arrow()
+
+    @cache(
+        suffix=lambda self: self.question_func.__name__,
+        ttl=timedelta(days=1),
+        version=lambda self: content_version(self.question_func()),
+    )
+    def answer_batches(self) -> Iterator[pa.RecordBatch]:
+        """
+        Executes the question against the target database, streaming the answer
+        as `pyarrow.RecordBatch`es. Suitable for answers too large to fit in memory.
+        """
+        return run(self.question_func()).iter_batches()
 
-    @cache(suffix=lambda self: f"{self.question_func.__name__}.{date.today()}")
     def answer_df(self) -> pd.DataFrame:
         """
         Executes the question against the target database,
@@ -158,8 +182,7 @@ class Question:
         2            11644600.0        116446.00            116.44600        iPhone
         ```
         """
-        result = run(self.question_func())
-        return result.rows.to_dataframe(create_bqstorage_client=False)
+        return self.answer_arrow().to_pandas()
 
     @property
     def uid(self) -> str:
@@ -1,14 +1,41 @@
+import atexit
+import fcntl
 import hashlib
 import inspect
-from collections import UserDict
+import os
+import posixpath
+import threading
+import time
+from collections import OrderedDict, UserDict
+from concurrent import futures
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
 from functools import wraps
-from typing import Callable, NamedTuple, Union
+from typing import (
+    IO,
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
+import fsspec
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pydantic import BaseModel
 from sqlalchemy import MetaData, create_engine
 
 from amora import logger
-from amora.config import StorageCacheProviders, settings
+from amora.config import StorageCacheKeyModes, StorageCacheProviders, settings
 
 local_engine = create_engine(
     f"sqlite:///{settings.LOCAL_ENGINE_SQLITE_FILE_PATH}",
@@ -32,65 +59,817 @@ class CacheKey(NamedTuple):
     "amora.questions.answer_df.e6ccc38abffd7081822da108971e9d9c.how_many_data_points_where_acquired"
     ```
 
+    The `ttl` isn't part of the key name: entries older than the `ttl`
+    are treated as missing, and are replaced on the next write.
     """
 
     func_module: str
     func_name: str
     func_checksum: str
     suffix: str
+    ttl: Optional[timedelta] = None
 
     def __repr__(self):
         return str(self)
 
     def __str__(self):
-        return ".".join(value for value in self if value)
+        return ".".join(
+            value
+            for value in (
+                self.func_module,
+                self.func_name,
+                self.func_checksum,
+                self.suffix,
+            )
+            if value
+        )
+
+    def expires_at(self, created_at: float) -> Optional[float]:
+        if self.ttl is None:
+            return None
+        return created_at + self.ttl.total_seconds()
+
+
+class CacheIndexEntry(BaseModel):
+    """
+    The bookkeeping of a cache entry, as recorded on the `amora.storage.CacheIndex`.
+    Timestamps are seconds since the epoch.
+    """
+
+    size: int
+    created_at: float
+    accessed_at: float
+    expires_at: Optional[float] = None
+
+    def is_expired(self, now: float) -> bool:
+        return self.expires_at is not None and self.expires_at <= now
+
+
+class CacheIndex(BaseModel):
+    """
+    The size, expiration and last access of the cache entries, keyed by `str(CacheKey)`.
+
+    The index is persisted next to the cache entries, and is used by `Cache.gc`
+    to remove expired entries and to evict the least recently used ones.
+    It's a hint, reconciled with the listed cache files on every `Cache.gc`.
+    """
+
+    entries: Dict[str, CacheIndexEntry] = {}
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(entry.size for entry in self.entries.values())
+
+    def merge(self, other: "CacheIndex") -> None:
+        """
+        Merges the entries recorded by another process, keeping the most
+        recently written version of each entry and its latest access.
+        """
+        for key, entry in other.entries.items():
+            current = self.entries.get(key)
+            if current is None or current.created_at < entry.created_at:
+                self.entries[key] = entry
+            elif current.created_at == entry.created_at:
+                current.accessed_at = max(current.accessed_at, entry.accessed_at)
+
+
+@dataclass
+class CacheGCResult:
+    """
+    Attributes:
+        removed_entries (int): Entries removed, either expired or evicted
+        removed_bytes (int): Total size of the removed entries, in bytes
+        entries (int): Remaining number of entries
+        size_bytes (int): Remaining size of the entries, in bytes
+    """
+
+    removed_entries: int = 0
+    removed_bytes: int = 0
+    entries: int = 0
+    size_bytes: int = 0
+
+
+def _tmp_path(path: str) -> str:
+    directory, name = posixpath.split(path)
+    return posixpath.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}")
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _modified_at(info: dict) -> float:
+    """
+    The modification time of a file, in seconds since the epoch,
+    from a `fsspec` file info of either the local File System or GCS
+    """
+    if "mtime" in info:
+        return float(info["mtime"])
+    return datetime.fromisoformat(info["updated"].replace("Z", "+00:00")).timestamp()
+
+
+@dataclass
+class MemoryCacheStats:
+    """
+    Attributes:
+        hits (int): Lookups answered from memory
+        stale_hits (int): Lookups answered from memory with an entry older than the max age
+        misses (int): Lookups that weren't in memory, or whose entry had expired
+        evictions (int): Entries evicted to keep the cache under its byte budget
+        evicted_bytes (int): Total size of the evicted entries, in bytes
+        size_bytes (int): Current size of the cached entries, in bytes
+        entries (int): Current number of cached entries
+    """
+
+    hits: int = 0
+    stale_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    evicted_bytes: int = 0
+    size_bytes: int = 0
+    entries: int = 0
+
+
+class MemoryCache:
+    """
+    An in-process LRU of `pyarrow.Table`s, bounded by their total size in bytes.
+
+    Entries older than `max_age` seconds are returned flagged as stale,
+    and entries past their `expires_at` timestamp are dropped.
+    A `max_bytes` of 0 disables the cache.
+    """
+
+    def __init__(
+        self, max_bytes: Optional[int] = None, max_age: Optional[float] = None
+    ) -> None:
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._entries: "OrderedDict[str, Tuple[pa.Table, float, Optional[float]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self.stats = MemoryCacheStats()
+
+    @property
+    def max_bytes(self) -> int:
+        if self._max_bytes is None:
+            return settings.STORAGE_MEMORY_CACHE_MAX_BYTES
+        return self._max_bytes
+
+    @property
+    def max_age(self) -> Optional[float]:
+        if self._max_age is None:
+            return settings.STORAGE_MEMORY_CACHE_MAX_AGE_SECONDS
+        return self._max_age
+
+    def get(self, key: str) -> Tuple[Optional[pa.Table], bool]:
+        """
+        Returns the cached table for `key`, or `None`, and whether it is stale
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None, False
+
+            table, stored_at, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._pop(key)
+                self.stats.misses += 1
+                return None, False
+
+            self._entries.move_to_end(key)
+            stale = self.max_age is not None and (
+                time.monotonic() - stored_at > self.max_age
+            )
+            if stale:
+                self.stats.stale_hits += 1
+            else:
+                self.stats.hits += 1
+            return table, stale
+
+    def put(
+        self, key: str, table: pa.Table, expires_at: Optional[float] = None
+    ) -> None:
+        with self._lock:
+            self._pop(key)
+            if table.nbytes > self.max_bytes:
+                return
+
+            self._entries[key] = (table, time.monotonic(), expires_at)
+            self.stats.size_bytes += table.nbytes
+            self.stats.entries += 1
+
+            while self.stats.size_bytes > self.max_bytes:
+                _key, (evicted, *_) = self._entries.popitem(last=False)
+                self.stats.size_bytes -= evicted.nbytes
+                self.stats.entries -= 1
+                self.stats.evictions += 1
+                self.stats.evicted_bytes += evicted.nbytes
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.stats.size_bytes -= entry[0].nbytes
+            self.stats.entries -= 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.stats.size_bytes = 0
+            self.stats.entries = 0
 
 
 class Cache(UserDict):
     """
-    A `pandas.DataFrame` cache provider that uses the local File System or GCS
+    A `pandas.DataFrame` and `pyarrow.Table` cache provider that uses the local File System or GCS
+
+    Entries are also kept in a `MemoryCache`, as Arrow tables, in front of the
+    parquet files, bounded by `settings.STORAGE_MEMORY_CACHE_MAX_BYTES`.
+    Memory entries older than `settings.STORAGE_MEMORY_CACHE_MAX_AGE_SECONDS` are stale,
+    and are read again from the parquet file. With
+    `settings.STORAGE_MEMORY_CACHE_STALE_WHILE_REVALIDATE`, a stale entry is returned
+    right away while it's read again in the background.
+
+    Writes and reads are recorded on an in-memory `CacheIndex`, which is persisted
+    in the background at most once every `settings.STORAGE_CACHE_INDEX_FLUSH_INTERVAL_SECONDS`,
+    or on `flush`. If, by then, the cached files add up to more than
+    `settings.STORAGE_CACHE_MAX_BYTES`, the cache is also garbage collected with `gc`,
+    outside of the request path.
+
+    `get_or_compute` coalesces the concurrent misses of a key into a single computation.
     """
 
     file_suffix: str = ".parquet"
+    index_filename: str = "amora-cache-index.json"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.memory = MemoryCache()
+        self._revalidating: Set[CacheKey] = set()
+        self._revalidating_lock = threading.Lock()
+        self._revalidation_executor: Optional[futures.ThreadPoolExecutor] = None
+        self._indexes: Dict[str, CacheIndex] = {}
+        self._index_lock = threading.RLock()
+        # Serializes the flushes and garbage collections of the index
+        self._flush_lock = threading.Lock()
+        self._dirty_indexes: Set[str] = set()
+        self._flush_timer: Optional[threading.Timer] = None
+        self._inflight: Dict[str, futures.Future] = {}
+        self._inflight_lock = threading.Lock()
 
     @property
     def type_(self) -> StorageCacheProviders:
         return settings.STORAGE_CACHE_PROVIDER
 
-    def filepath_for_key(self, key: CacheKey) -> str:
+    @property
+    def root(self) -> str:
         if self.type_ is StorageCacheProviders.gcs:
-            blob_name = f"{key}{self.file_suffix}"
-            gs_url = f"gs://{settings.STORAGE_GCS_BUCKET_NAME}/{blob_name}"
-            return gs_url
+            return f"gs://{settings.STORAGE_GCS_BUCKET_NAME}"
 
         if self.type_ is StorageCacheProviders.local:
-            blob_name = f"{key}{self.file_suffix}"
-            return settings.STORAGE_LOCAL_CACHE_PATH.joinpath(blob_name).as_posix()
+            return settings.STORAGE_LOCAL_CACHE_PATH.as_posix()
 
         raise NotImplementedError  # pragma: nocover
 
+    @property
+    def fs(self) -> fsspec.AbstractFileSystem:
+        fs, _path = fsspec.core.url_to_fs(self.root)
+        return fs
+
+    def filepath_for_key(self, key: Union[CacheKey, str]) -> str:
+        blob_name = f"{key}{self.file_suffix}"
+        return posixpath.join(self.root, blob_name)
+
     @logger.log_execution()
-    def __setitem__(self, key: CacheKey, value: pd.DataFrame):
-        value.to_parquet(
-            self.filepath_for_key(key), engine=settings.STORAGE_PARQUET_ENGINE
-        )
+    def __setitem__(self, key: CacheKey, value: Union[pd.DataFrame, pa.Table]):
+        if (
+            isinstance(value, pd.DataFrame)
+            and settings.STORAGE_PARQUET_ENGINE == "fastparquet"
+        ):
+            data = value.to_parquet(engine=settings.STORAGE_PARQUET_ENGINE)
+        else:
+            if isinstance(value, pd.DataFrame):
+                value = pa.Table.from_pandas(value)
+            buffer = pa.BufferOutputStream()
+            pq.write_table(value, buffer)
+            data = buffer.getvalue().to_pybytes()
+        self._write_file(self.filepath_for_key(key), data)
+
+        now = time.time()
+        self._memoize(key, value, key.expires_at(created_at=now))
+        self._record_write(key, size=len(data), created_at=now)
 
     @logger.log_execution()
+    def put_batches(self, key: CacheKey, batches: Iterable[pa.RecordBatch]) -> None:
+        """
+        Streams the record batches into the cache entry parquet file, one at
+        a time, so values larger than the available memory can be cached.
+        Streamed entries aren't kept in the `MemoryCache`.
+        """
+        with self._atomic_writer(self.filepath_for_key(key)) as f:
+            batches = iter(batches)
+            first = next(batches, None)
+            schema = first.schema if first is not None else pa.schema([])
+            with pq.ParquetWriter(f, schema) as writer:
+                if first is not None:
+                    writer.write_batch(first)
+                for batch in batches:
+                    writer.write_batch(batch)
+            size = f.tell()
+
+        self.memory.pop(str(key))
+        self._record_write(key, size=size, created_at=time.time())
+
+    def _record_write(self, key: CacheKey, size: int, created_at: float) -> None:
+        with self._index_lock:
+            self._index().entries[str(key)] = CacheIndexEntry(
+                size=size,
+                created_at=created_at,
+                accessed_at=created_at,
+                expires_at=key.expires_at(created_at=created_at),
+            )
+            self._index_changed()
+
+    def _index_changed(self) -> None:
+        """
+        Marks the index of the current provider as changed, and schedules its flush
+        """
+        with self._index_lock:
+            self._dirty_indexes.add(self.root)
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(
+                    settings.STORAGE_CACHE_INDEX_FLUSH_INTERVAL_SECONDS,
+                    self._flush_in_background,
+                )
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _flush_in_background(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            logger.logger.exception("Storage cache index flush failed")
+
+    def flush(self) -> None:
+        """
+        Persists the changes to the index of the current provider, merged with the
+        changes persisted by other processes. Then, if the cached files add up to
+        more than `settings.STORAGE_CACHE_MAX_BYTES`, garbage collects the cache.
+        """
+        with self._index_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+        with self._flush_lock:
+            # The index is saved from a copy, so it isn't locked while it's written
+            with self._index_lock:
+                if self.root not in self._dirty_indexes:
+                    return
+                self._dirty_indexes.discard(self.root)
+                index = self._index().copy(deep=True)
+
+            try:
+                with self._index_file_lock():
+                    self._save_index(index, merge=True)
+            except BaseException:
+                self._index_changed()
+                raise
+
+            # Brings in the entries persisted by other processes
+            with self._index_lock:
+                self._index().merge(index)
+
+        max_bytes = settings.STORAGE_CACHE_MAX_BYTES
+        if max_bytes is not None and index.size_bytes > max_bytes:
+            self.gc()
+
     def __getitem__(self, item: CacheKey) -> pd.DataFrame:
+        return self.get_arrow(item).to_pandas()
+
+    @logger.log_execution()
+    def get_arrow(self, item: CacheKey) -> pa.Table:
+        """
+        Returns the cached value as a `pyarrow.Table`, without a pandas conversion
+        """
+        table, stale = self.memory.get(str(item))
+        if table is not None and (
+            not stale or settings.STORAGE_MEMORY_CACHE_STALE_WHILE_REVALIDATE
+        ):
+            if stale:
+                self._revalidate(item)
+            self._touch(item)
+            return table
+
+        table, expires_at = self._read(item)
+        self._memoize(item, table, expires_at)
+        self._touch(item)
+        return table
+
+    def iter_batches(
+        self, item: CacheKey, batch_size: int = 64 * 1024
+    ) -> Iterator[pa.RecordBatch]:
+        """
+        Returns an iterator over the cached value record batches, read from
+        the parquet file one at a time. Raises `KeyError` if the entry is
+        missing or expired.
+        """
+        path = self.filepath_for_key(item)
+        self._expires_at(item, path)
         try:
-            return pd.read_parquet(self.filepath_for_key(item))
+            f = self.fs.open(path, "rb")
         except FileNotFoundError as e:
             raise KeyError from e
+        self._touch(item)
+
+        def batches() -> Iterator[pa.RecordBatch]:
+            with f:
+                yield from pq.ParquetFile(f).iter_batches(batch_size=batch_size)
+
+        return batches()
+
+    def _read(self, item: CacheKey) -> Tuple[pa.Table, Optional[float]]:
+        """
+        Reads the parquet file of a cache entry, returning it along with its
+        expiration. Raises `KeyError` if the entry is missing or expired.
+        """
+        path = self.filepath_for_key(item)
+        expires_at = self._expires_at(item, path)
+        try:
+            with self.fs.open(path, "rb") as f:
+                return pq.read_table(f), expires_at
+        except FileNotFoundError as e:
+            raise KeyError from e
+
+    def _expires_at(self, item: CacheKey, path: str) -> Optional[float]:
+        """
+        The expiration of a cache entry, from its file modification time.
+        Raises `KeyError` if the entry is missing or expired.
+        """
+        if item.ttl is None:
+            return None
+        try:
+            expires_at = item.expires_at(created_at=_modified_at(self.fs.info(path)))
+        except FileNotFoundError as e:
+            raise KeyError from e
+        if expires_at is None:
+            return None
+        if expires_at <= time.time():
+            raise KeyError(item)
+        return expires_at
+
+    def _memoize(
+        self,
+        key: CacheKey,
+        value: Union[pd.DataFrame, pa.Table],
+        expires_at: Optional[float] = None,
+    ) -> None:
+        if not self.memory.max_bytes:
+            return
+        if isinstance(value, pa.Table):
+            self.memory.put(str(key), value, expires_at)
+            return
+        try:
+            table = pa.Table.from_pandas(value)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            logger.logger.debug(
+                "Unable to keep cache entry in memory", extra={"cache_key": str(key)}
+            )
+            self.memory.pop(str(key))
+        else:
+            self.memory.put(str(key), table, expires_at)
+
+    def _revalidate(self, key: CacheKey) -> None:
+        with self._revalidating_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+            if self._revalidation_executor is None:
+                self._revalidation_executor = futures.ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="amora-cache-revalidation"
+                )
+
+        def revalidate():
+            try:
+                self._memoize(key, *self._read(key))
+            except KeyError:
+                self.memory.pop(str(key))
+            finally:
+                with self._revalidating_lock:
+                    self._revalidating.discard(key)
+
+        self._revalidation_executor.submit(revalidate)
+
+    def _index(self) -> CacheIndex:
+        """
+        The `CacheIndex` of the current provider, loaded on first use
+        """
+        with self._index_lock:
+            index = self._indexes.get(self.root)
+            if index is None:
+                index = self._indexes[self.root] = self._load_index()
+            return index
+
+    def _load_index(self) -> CacheIndex:
+        try:
+            return CacheIndex.parse_raw(
+                self.fs.cat_file(posixpath.join(self.root, self.index_filename))
+            )
+        except (FileNotFoundError, ValueError):
+            return CacheIndex()
+
+    def _index_file_lock(self) -> ContextManager:
+        """
+        An exclusive lock on the persisted index, shared by the processes using
+        the local File System provider, so that their read-merge-writes of the index
+        don't lose each other's entries. A no-op on the other providers, whose
+        lost entries are indexed again from the listed cache files by `gc`.
+        """
+        if self.type_ is StorageCacheProviders.local:
+            return _file_lock(posixpath.join(self.root, f".{self.index_filename}.lock"))
+        return nullcontext()
+
+    def _save_index(self, index: CacheIndex, merge: bool = False) -> None:
+        """
+        Persists the index. With `merge`, the entries persisted by other
+        processes since the index was loaded are merged into it first.
+        """
+        if merge:
+            index.merge(self._load_index())
+
+        self._write_file(
+            posixpath.join(self.root, self.index_filename), index.json().encode()
+        )
+
+    def _write_file(self, path: str, data: bytes) -> None:
+        """
+        Writes the file atomically, so readers never see a partial write
+        """
+        if self.type_ is StorageCacheProviders.local:
+            tmp_path = _tmp_path(path)
+            self.fs.pipe_file(tmp_path, data)
+            os.replace(tmp_path, path)
+        else:
+            # GCS object writes are atomic
+            self.fs.pipe_file(path, data)
+
+    @contextmanager
+    def _atomic_writer(self, path: str) -> Iterator[IO[bytes]]:
+        """
+        Opens a temporary file for writing, which is moved to `path` once
+        written, so readers never see a partial write
+        """
+        tmp_path = _tmp_path(path)
+        try:
+            with self.fs.open(tmp_path, "wb") as f:
+                yield f
+        except BaseException:
+            try:
+                self.fs.rm_file(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        if self.type_ is StorageCacheProviders.local:
+            os.replace(tmp_path, path)
+        else:
+            self.fs.mv(tmp_path, path)
+
+    def _lockpath_for_key(self, key: Union[CacheKey, str]) -> str:
+        return posixpath.join(self.root, f".{key}{self.file_suffix}.lock")
+
+    def _lock(self, key: CacheKey) -> ContextManager:
+        """
+        An exclusive lock on the key, shared by the processes using the
+        local File System provider. A no-op on the other providers.
+        """
+        if self.type_ is StorageCacheProviders.local:
+            return _file_lock(self._lockpath_for_key(key))
+        return nullcontext()
+
+    def get_or_compute(
+        self,
+        key: CacheKey,
+        compute: Callable[[], Union[pd.DataFrame, pa.Table]],
+        arrow: bool = False,
+    ) -> Union[pd.DataFrame, pa.Table]:
+        """
+        Returns the cached value of the key, or caches the value returned by `compute`.
+        With `arrow`, cached values are returned as `pyarrow.Table`s.
+
+        Concurrent misses of the same key are coalesced: within a process, the first
+        caller computes the value while the others wait on it, and then read it from
+        the cache, or get its exception. Across processes using the local File System
+        provider, callers serialize on a file lock, and the value is read from the cache
+        by the ones that didn't compute it.
+        """
+
+        def compute_and_cache():
+            value = compute()
+            self[key] = value
+            return value
+
+        return self._single_flight(
+            key, self.get_arrow if arrow else self.__getitem__, compute_and_cache
+        )
+
+    def get_or_compute_batches(
+        self, key: CacheKey, compute: Callable[[], Iterable[pa.RecordBatch]]
+    ) -> Iterator[pa.RecordBatch]:
+        """
+        Like `get_or_compute`, but the record batches returned by `compute` are
+        streamed into the cache with `put_batches`, and read back with `iter_batches`,
+        so the whole value is never held in memory.
+        """
+
+        def compute_and_cache():
+            self.put_batches(key, compute())
+            return self.iter_batches(key)
+
+        return self._single_flight(key, self.iter_batches, compute_and_cache)
+
+    def _single_flight(
+        self, key: CacheKey, get: Callable[[CacheKey], Any], compute: Callable[[], Any]
+    ) -> Any:
+        try:
+            return get(key)
+        except KeyError:
+            pass
+
+        with self._inflight_lock:
+            inflight = self._inflight.get(str(key))
+            if inflight is None:
+                future: futures.Future = futures.Future()
+                self._inflight[str(key)] = future
+
+        if inflight is not None:
+            inflight.result()
+            try:
+                return get(key)
+            except KeyError:
+                # E.g. the entry already expired
+                return compute()
+
+        try:
+            with self._lock(key):
+                try:
+                    value = get(key)
+                except KeyError:
+                    value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(None)
+            return value
+        finally:
+            with self._inflight_lock:
+                del self._inflight[str(key)]
+
+    def _touch(self, key: CacheKey) -> None:
+        """
+        Records an access to the entry, persisted with the next index flush
+        """
+        with self._index_lock:
+            entry = self._index().entries.get(str(key))
+            if entry is not None:
+                entry.accessed_at = time.time()
+                self._index_changed()
+
+    def gc(
+        self,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[timedelta] = None,
+        dry_run: bool = False,
+    ) -> CacheGCResult:
+        """
+        Removes the expired cache entries and the ones older than `max_age`.
+        Then, while the remaining entries add up to more than `max_bytes`,
+        removes the least recently used ones.
+
+        Args:
+            max_bytes: Size budget of the cache, in bytes. Defaults to `settings.STORAGE_CACHE_MAX_BYTES`
+            max_age: Maximum age of an entry, since it was written
+            dry_run: Computes the result without removing any entry
+        """
+        if max_bytes is None:
+            max_bytes = settings.STORAGE_CACHE_MAX_BYTES
+
+        now = time.time()
+        with self._flush_lock, self._index_file_lock():
+            # The cache files are listed and removed from a copy of the index,
+            # so the index isn't locked while they are, e.g. by the reads recording
+            # their accesses. The changes made meanwhile are merged back afterwards
+            with self._index_lock:
+                known = self._index().copy(deep=True)
+            known.merge(self._load_index())
+
+            index = CacheIndex()
+            for info in self.fs.ls(self.root, detail=True):
+                name = posixpath.basename(info["name"])
+                if info["type"] != "file" or not name.endswith(self.file_suffix):
+                    continue
+
+                key = name[: -len(self.file_suffix)]
+                entry = known.entries.get(key)
+                if entry is None:
+                    modified_at = _modified_at(info)
+                    entry = CacheIndexEntry(
+                        size=info["size"],
+                        created_at=modified_at,
+                        accessed_at=modified_at,
+                    )
+                entry.size = info["size"]
+                index.entries[key] = entry
+
+            removed = {
+                key: entry
+                for key, entry in index.entries.items()
+                if entry.is_expired(now)
+                or (
+                    max_age is not None
+                    and now - entry.created_at > max_age.total_seconds()
+                )
+            }
+            size_bytes = index.size_bytes - sum(
+                entry.size for entry in removed.values()
+            )
+            if max_bytes is not None:
+                by_last_access = sorted(
+                    (item for item in index.entries.items() if item[0] not in removed),
+                    key=lambda item: item[1].accessed_at,
+                )
+                for key, entry in by_last_access:
+                    if size_bytes <= max_bytes:
+                        break
+                    removed[key] = entry
+                    size_bytes -= entry.size
+
+            result = CacheGCResult(
+                removed_entries=len(removed),
+                removed_bytes=index.size_bytes - size_bytes,
+                entries=len(index.entries) - len(removed),
+                size_bytes=size_bytes,
+            )
+            if dry_run:
+                return result
+
+            for key in removed:
+                for path in (self.filepath_for_key(key), self._lockpath_for_key(key)):
+                    try:
+                        self.fs.rm_file(path)
+                    except FileNotFoundError:
+                        pass
+                self.memory.pop(key)
+                del index.entries[key]
+
+            self._save_index(index)
+
+            with self._index_lock:
+                changed = False
+                for key, entry in self._index().entries.items():
+                    collected = known.entries.get(key)
+                    if collected is None or collected.created_at < entry.created_at:
+                        # Written while the cache was garbage collected
+                        index.entries[key] = entry
+                        changed = True
+                    elif key in index.entries and (
+                        index.entries[key].accessed_at < entry.accessed_at
+                    ):
+                        index.entries[key].accessed_at = entry.accessed_at
+                        changed = True
+                self._indexes[self.root] = index
+                if not changed:
+                    self._dirty_indexes.discard(self.root)
+
+        logger.logger.info("Storage cache garbage collected", extra=asdict(result))
+        return result
 
 
 CACHE = Cache()
-Cacheable = Callable[..., pd.DataFrame]
+atexit.register(CACHE.flush)
+Cacheable = Callable[..., Union[pd.DataFrame, pa.Table, Iterator[pa.RecordBatch]]]
 
 
-def cache(suffix: Union[Callable[..., str], None] = None):
+def cache(
+    suffix: Union[Callable[..., str], None] = None,
+    ttl: Optional[timedelta] = None,
+    version: Union[Callable[..., str], None] = None,
+):
     """
     Caches a `amora.storage.Cacheable` into the provider selected
-    at `setting.STORAGE_CACHE_PROVIDER`.
+    at `setting.STORAGE_CACHE_PROVIDER`, for up to `ttl`, if given.
 
     To disable the cache, set the env var `AMORA_STORAGE_CACHE_ENABLED` to false.
 
@@ -145,40 +924,97 @@ def cache(suffix: Union[Callable[..., str], None] = None):
     # CacheKey -> foo_module.cacheable_func.e6ccc38abffd7081822da108971e9d9c.5_3
     ```
 
-    The key function can also be used to implement a cache TTL:
+    Cached results older than the `ttl` are computed again:
 
     ```python
-    from datetime import date
+    from datetime import timedelta
 
 
-    @cache(suffix=lambda: date.today().isoformat())
+    @cache(ttl=timedelta(days=1))
     def im_cached_for_one_day():
         sleep(3)
         return pd.DataFrame([[1, 2, 3], [4, 5, 6]])
     ```
+
+    Expired entries are replaced on the next call. To remove them from the storage,
+    and to keep it under a size budget, see `amora storage gc`.
+
+    A `version` function, called with the same arguments as the cached function, may
+    return a digest of the data the result is computed from, such as
+    `amora.providers.bigquery.content_version`. With `AMORA_STORAGE_CACHE_KEY_MODE=content`,
+    the version is added to the cache key and the `ttl` is ignored, so results are
+    reused until their data changes:
+
+    ```python
+    @cache(
+        suffix=lambda model: model.unique_name(),
+        ttl=timedelta(days=1),
+        version=lambda model: content_version(select(model)),
+    )
+    def count_rows(model) -> pd.DataFrame:
+        return run(select(func.count()).select_from(model)).to_arrow().to_pandas()
+    ```
+
+    Concurrent calls that miss the same cache key wait on a single execution of the
+    cached function. See `amora.storage.Cache.get_or_compute`.
+
+    Functions annotated to return a `pyarrow.Table` are cached and returned as
+    Arrow tables, without a pandas conversion:
+
+    ```python
+    @cache()
+    def a_large_table() -> pa.Table:
+        return run(select(LargeModel)).to_arrow()
+    ```
+
+    Functions annotated to return an `Iterator[pyarrow.RecordBatch]` are streamed into
+    the cache and read back batch by batch, so results larger than the available memory
+    can be cached:
+
+    ```python
+    @cache()
+    def a_huge_table() -> Iterator[pa.RecordBatch]:
+        return run(select(HugeModel)).iter_batches()
+    ```
     """
 
     def wrapper(fn: Cacheable):
         func_checksum = hashlib.md5(inspect.getsource(fn).encode("utf-8")).hexdigest()
+        return_annotation = inspect.signature(fn).return_annotation
 
         @wraps(fn)
         def decorator(*args, **kwargs):
             if not settings.STORAGE_CACHE_ENABLED:
                 return fn(*args, **kwargs)
 
+            key_suffix = suffix(*args, **kwargs) if suffix else ""
+            key_ttl = ttl
+            if (
+                version is not None
+                and settings.STORAGE_CACHE_KEY_MODE is StorageCacheKeyModes.content
+            ):
+                key_suffix = ".".join(
+                    value for value in (key_suffix, version(*args, **kwargs)) if value
+                )
+                key_ttl = None
+
             cache_key = CacheKey(
                 func_module=fn.__module__,
                 func_name=fn.__name__,
                 func_checksum=func_checksum,
-                suffix=suffix(*args, **kwargs) if suffix else "",
+                suffix=key_suffix,
+                ttl=key_ttl,
             )
 
-            try:
-                return CACHE[cache_key]
-            except KeyError:
-                result = fn(*args, **kwargs)
-                CACHE[cache_key] = result
-                return result
+            if return_annotation == Iterator[pa.RecordBatch]:
+                return CACHE.get_or_compute_batches(
+                    cache_key, lambda: fn(*args, **kwargs)
+                )
+            return CACHE.get_or_compute(
+                cache_key,
+                lambda: fn(*args, **kwargs),
+                arrow=return_annotation is pa.Table,
+            )
 
         return decorator
 
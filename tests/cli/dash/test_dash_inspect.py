@@ -42,6 +42,11 @@ def test_before_startup_with_cache_enabled(ThreadPoolExecutor: MagicMock):
     executor = ThreadPoolExecutor.return_value
     submit = executor.__enter__.return_value.submit
 
-    submit.assert_has_calls([call(summarize, model) for model, _ in list_models()])
+    submit.assert_has_calls(
+        [
+            call(summarize, model, settings.MODEL_SUMMARY_MODE)
+            for model, _ in list_models()
+        ]
+    )
     submit.assert_has_calls([call(sample, model) for model, _ in list_models()])
     submit.assert_has_calls([call(question.answer_df) for question in QUESTIONS])
@@ -4,7 +4,7 @@ from typer.testing import CliRunner
 
 from amora.cli import app
 from amora.dash.config import settings
-from amora.dash.gunicorn.config import child_exit, when_ready
+from amora.dash.gunicorn.config import child_exit, on_exit, when_ready
 
 runner = CliRunner()
 
@@ -68,3 +68,37 @@ def test_dash_serve_without_metrics():
         }
         StandaloneApplication.assert_called_with(app=dash_app.server, options=options)
         StandaloneApplication.return_value.run.assert_called_once()
+
+
+def test_dash_serve_with_cache_warmer():
+    with patch("amora.dash.app.dash_app") as dash_app, patch(
+        "amora.dash.gunicorn.application.StandaloneApplication"
+    ) as StandaloneApplication, patch.multiple(
+        settings, DEBUG=False, METRICS_ENABLED=False, CACHE_WARMER_INTERVAL_SECONDS=60
+    ):
+        result = runner.invoke(
+            app,
+            ["dash", "serve"],
+        )
+
+        assert result.exit_code == 0
+
+        options = {
+            "bind": f"{settings.HTTP_HOST}:{settings.HTTP_PORT}",
+            "workers": settings.GUNICORN_WORKERS,
+            "timeout": settings.GUNICORN_WORKER_TIMEOUT,
+            "when_ready": when_ready,
+            "on_exit": on_exit,
+        }
+        StandaloneApplication.assert_called_with(app=dash_app.server, options=options)
+
+
+def test_cache_warmer_process():
+    with patch.multiple(
+        settings, METRICS_ENABLED=False, CACHE_WARMER_INTERVAL_SECONDS=60
+    ), patch("subprocess.Popen") as Popen:
+        when_ready(server=None)
+        on_exit(server=None)
+
+    assert Popen.call_args.args[0][-4:] == ["dash", "warm", "--interval", "60"]
+    Popen.return_value.terminate.assert_called_once_with()
@@ -0,0 +1,44 @@
+from unittest.mock import MagicMock, patch
+
+from typer.testing import CliRunner
+
+from amora.cli import app
+from amora.config import settings as amora_settings
+from amora.dash.cache_warmer import WarmResult, warm_cache
+
+runner = CliRunner()
+
+
+def test_dash_warm():
+    with patch(
+        "amora.dash.cache_warmer.warm_cache", return_value=WarmResult(3, 1, 2.0)
+    ) as warm_cache_:
+        result = runner.invoke(app, ["dash", "warm"])
+
+    assert result.exit_code == 0, result.output
+    warm_cache_.assert_called_once_with()
+    assert "Warmed 3 cache entries in 2.0s (1 failed)" in result.output
+
+
+def test_warm_cache_counts_failures_and_skips():
+    def fail():
+        raise RuntimeError("BigQuery is down")
+
+    def skip():
+        raise ValueError("Unable to sample a view")
+
+    tasks = [("ok", MagicMock(), ()), ("fail", fail, ()), ("skip", skip, ())]
+    with patch.multiple(amora_settings, STORAGE_CACHE_ENABLED=True), patch(
+        "amora.dash.cache_warmer.warm_tasks", return_value=tasks
+    ):
+        result = warm_cache()
+
+    assert (result.succeeded, result.failed) == (1, 1)
+
+
+@patch("amora.dash.cache_warmer.warm_tasks")
+def test_warm_cache_with_cache_disabled(warm_tasks: MagicMock):
+    with patch.multiple(amora_settings, STORAGE_CACHE_ENABLED=False):
+        assert warm_cache() == WarmResult()
+
+    warm_tasks.assert_not_called()
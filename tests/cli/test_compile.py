@@ -1,4 +1,5 @@
 import itertools
+from pathlib import Path
 from typing import List
 from unittest import mock
 
@@ -61,11 +62,11 @@ def test_compile_call_save_manifest(save: mock.MagicMock):
 
 @mock.patch("amora.manifest.Manifest.load")
 @mock.patch("amora.manifest.Manifest.from_project")
-@mock.patch("amora.manifest.Manifest.get_models_to_compile")
+@mock.patch("amora.manifest.Manifest.get_model_names_to_compile")
 @mock.patch("amora.compilation.remove_compiled_files")
 def test_compile_call_remove_compiled_files(
     remove_compiled_files: mock.MagicMock,
-    get_models_to_compile: mock.MagicMock,
+    get_model_names_to_compile: mock.MagicMock,
     from_project: mock.MagicMock,
     load: mock.MagicMock,
 ):
@@ -93,7 +94,23 @@ def test_compile_call_remove_compiled_files(
     remove_compiled_files.assert_called_once_with(
         previous_manifest.models.keys() - current_manifest.models.keys()
     )
-    get_models_to_compile.assert_called_once_with(previous_manifest)
+    get_model_names_to_compile.assert_called_once_with(previous_manifest)
+
+
+def test_compile_with_force_doesnt_import_cached_models(tmp_path: Path):
+    with mock.patch.object(settings, "COMPILATION_CACHE_PATH", tmp_path):
+        runner.invoke(app, ["compile"])
+        compiled_target_files = sorted(path.name for path in list_target_files())
+
+        with mock.patch(
+            "amora.compilation.amora_model_for_path"
+        ) as model_for_path, mock.patch("amora.models.amora_model_for_path"):
+            result = runner.invoke(app, ["compile", "--force"])
+
+    assert result.exit_code == 0
+    model_for_path.assert_not_called()
+    generated_target_files = sorted(path.name for path in list_target_files())
+    assert generated_target_files == compiled_target_files
 
 
 @pytest.mark.parametrize(
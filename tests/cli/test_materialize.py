@@ -1,9 +1,14 @@
-from unittest.mock import MagicMock, call, patch
+from pathlib import Path
+from unittest.mock import ANY, MagicMock, call, patch
 
 from typer.testing import CliRunner
 
 from amora.cli import app
 from amora.compilation import remove_compiled_files
+from amora.config import settings
+from amora.dag import DependencyDAG
+from amora.manifest import Manifest
+from amora.materialization import MaterializationState, Plan, PlanItem, Task
 
 from tests.models.heart_agg import HeartRateAgg
 from tests.models.heart_rate import HeartRate
@@ -21,59 +26,41 @@ def teardown_function(module):
     remove_compiled_files()
 
 
-@patch("concurrent.futures.ProcessPoolExecutor")
+@patch.object(settings, "MATERIALIZE_NUM_THREADS", 1)
 @patch("amora.cli.typer_app.compile")
-@patch("amora.materialization.materialize")
+@patch("amora.materialization.materialize", return_value=None)
 def test_materialize_without_arguments_and_options(
-    materialize: MagicMock, compile: MagicMock, pool_mock: MagicMock
+    materialize: MagicMock, compile: MagicMock, tmp_path: Path
 ):
-    executor_mock = MagicMock()
-    executor_mock.map = MagicMock()
-    pool_mock.return_value.__enter__.return_value = executor_mock
-
     models = [HeartRate, Steps, StepCountBySource]
 
-    for model in models:
-        target_path = model.target_path()
-        target_path.write_text("SELECT 1")
+    # An isolated target, so that files compiled by other tests aren't materialized
+    with patch.object(settings, "TARGET_PATH", tmp_path):
+        for model in models:
+            target_path = model.target_path()
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+            target_path.write_text("SELECT 1")
 
-    result = runner.invoke(
-        app,
-        ["materialize"],
-    )
+        result = runner.invoke(
+            app,
+            ["materialize"],
+        )
 
     assert result.exit_code == 0
 
     compile.assert_called_once_with(models=[], target=None, force=False)
 
-    assert executor_mock.map.call_count == 2
-
-    assert executor_mock.map.call_args_list == [
-        call(
-            materialize,
-            ["SELECT 1"] * 2,
-            [model.unique_name() for model in [HeartRate, Steps]],
-            [model.__model_config__ for model in [HeartRate, Steps]],
-        ),
-        call(
-            materialize,
-            ["SELECT 1"],
-            [StepCountBySource.unique_name()],
-            [StepCountBySource.__model_config__],
-        ),
+    # `Steps` has the longest critical path, so it's materialized first, and
+    # `StepCountBySource` is ready as soon as `Steps` is materialized
+    assert materialize.call_args_list == [
+        call("SELECT 1", model.unique_name(), model.__model_config__)
+        for model in [Steps, HeartRate, StepCountBySource]
     ]
 
 
-@patch("concurrent.futures.ProcessPoolExecutor")
 @patch("amora.cli.typer_app.compile")
-@patch("amora.materialization.materialize")
-def test_materialize_with_model_options(
-    materialize: MagicMock, compile: MagicMock, pool_mock: MagicMock
-):
-    executor_mock = MagicMock()
-    executor_mock.map = MagicMock()
-    pool_mock.return_value.__enter__.return_value = executor_mock
-
+@patch("amora.materialization.materialize", return_value=None)
+def test_materialize_with_model_options(materialize: MagicMock, compile: MagicMock):
     for model in [HeartRate, Steps]:
         target_path = model.target_path()
         target_path.write_text("SELECT 1")
@@ -85,13 +72,30 @@ def test_materialize_with_model_options(
 
     assert result.exit_code == 0
 
-    executor_mock.map.assert_called_once_with(
-        materialize, ["SELECT 1"], [Steps.unique_name()], [Steps.__model_config__]
+    materialize.assert_called_once_with(
+        "SELECT 1", Steps.unique_name(), Steps.__model_config__
     )
     compile.assert_called_once_with(models=["steps"], target=None, force=False)
 
 
-@patch("concurrent.futures.ProcessPoolExecutor")
+@patch("amora.cli.typer_app.compile")
+@patch("amora.materialization.materialize", return_value=None)
+def test_materialize_with_model_options_only_imports_the_selected_models(
+    materialize: MagicMock, compile: MagicMock, tmp_path: Path
+):
+    for model in [HeartRate, Steps]:
+        model.target_path().write_text("SELECT 1")
+
+    with patch.object(settings, "MANIFEST_PATH", tmp_path / "manifest.json"):
+        Manifest.from_project().save()
+        with patch.object(Task, "for_target", wraps=Task.for_target) as for_target:
+            result = runner.invoke(app, ["materialize", "--model", "steps"])
+
+    assert result.exit_code == 0
+    for_target.assert_called_once_with(Steps.target_path())
+
+
+@patch("concurrent.futures.ThreadPoolExecutor")
 @patch("amora.cli.typer_app.compile")
 @patch("amora.materialization.materialize")
 @patch("amora.dag.DependencyDAG.draw")
@@ -107,7 +111,7 @@ def test_materialize_with_draw_dag_option(
     draw.assert_called_once()
 
 
-@patch("concurrent.futures.ProcessPoolExecutor")
+@patch("concurrent.futures.ThreadPoolExecutor")
 @patch("amora.cli.typer_app.compile")
 @patch("amora.materialization.materialize")
 def test_materialize_with_no_compile_option(
@@ -122,41 +126,148 @@ def test_materialize_with_no_compile_option(
     compile.assert_not_called()
 
 
-@patch("concurrent.futures.ProcessPoolExecutor")
 @patch("amora.cli.typer_app.compile")
-@patch("amora.materialization.materialize")
-def test_materialize_with_depends_options(
-    materialize: MagicMock, compile: MagicMock, pool_mock: MagicMock
-):
-    executor_mock = MagicMock()
-    executor_mock.map = MagicMock()
-    pool_mock.return_value.__enter__.return_value = executor_mock
-
+@patch("amora.materialization.materialize", return_value=None)
+def test_materialize_with_depends_options(materialize: MagicMock, compile: MagicMock):
     for model in [HeartRateAgg] + [m for m in HeartRateAgg.__depends_on__]:
         target_path = model.target_path()
         target_path.write_text("SELECT 1")
 
-    result = runner.invoke(
-        app,
-        ["materialize", "--model", "heart_agg", "--depends"],
-    )
+    with patch.object(
+        DependencyDAG,
+        "reachability",
+        autospec=True,
+        side_effect=DependencyDAG.reachability,
+    ) as reachability:
+        result = runner.invoke(
+            app,
+            ["materialize", "--model", "heart_agg", "--depends"],
+        )
 
     assert result.exit_code == 0
+    reachability.assert_called_once()
 
-    assert executor_mock.map.call_count == 2
-    assert executor_mock.map.call_args_list == [
-        call(
-            materialize,
-            ["SELECT 1"],
-            [HeartRate.unique_name()],
-            [HeartRate.__model_config__],
-        ),
-        call(
-            materialize,
-            ["SELECT 1"],
-            [HeartRateAgg.unique_name()],
-            [HeartRateAgg.__model_config__],
-        ),
+    assert materialize.call_args_list == [
+        call("SELECT 1", model.unique_name(), model.__model_config__)
+        for model in [HeartRate, HeartRateAgg]
     ]
 
     compile.assert_called_once_with(models=["heart_agg"], target=None, force=True)
+
+
+def _plan(max_bytes=None):
+    return Plan(
+        items={
+            model.unique_name(): PlanItem(
+                model_name=model.unique_name(),
+                total_bytes=total_bytes,
+                branch_bytes=total_bytes,
+                over_budget=max_bytes is not None and total_bytes > max_bytes,
+            )
+            for model, total_bytes in [(HeartRate, 300), (Steps, 100)]
+        },
+        max_bytes=max_bytes,
+    )
+
+
+@patch("amora.cli.typer_app.compile")
+@patch("amora.materialization.materialize", return_value=None)
+@patch("amora.materialization.plan", return_value=_plan())
+def test_materialize_with_plan_option(
+    plan: MagicMock, materialize: MagicMock, _compile: MagicMock
+):
+    for model in [HeartRate, Steps]:
+        model.target_path().write_text("SELECT 1")
+
+    result = runner.invoke(app, ["materialize", "--plan"])
+
+    assert result.exit_code == 0, result.stdout
+    plan.assert_called_once_with(ANY, ANY, max_bytes=None)
+    materialize.assert_not_called()
+    assert HeartRate.unique_name() in result.stdout
+
+
+@patch("amora.cli.typer_app.compile")
+@patch("amora.materialization.materialize", return_value=None)
+@patch("amora.materialization.plan", return_value=_plan(max_bytes=200))
+def test_materialize_over_budget_aborts(
+    plan: MagicMock, materialize: MagicMock, _compile: MagicMock
+):
+    for model in [HeartRate, Steps]:
+        model.target_path().write_text("SELECT 1")
+
+    result = runner.invoke(app, ["materialize", "--max-bytes", "200"])
+
+    assert result.exit_code == 1
+    plan.assert_called_once_with(ANY, ANY, max_bytes=200)
+    materialize.assert_not_called()
+
+
+@patch("amora.cli.typer_app.compile")
+@patch("amora.materialization.materialize", return_value=None)
+@patch("amora.materialization.plan")
+def test_materialize_aborts_on_models_of_unknown_cost(
+    plan: MagicMock, materialize: MagicMock, _compile: MagicMock
+):
+    for model in [HeartRate, Steps]:
+        model.target_path().write_text("SELECT 1")
+    plan.return_value = _plan(max_bytes=1000)
+    heart_rate = plan.return_value.items[HeartRate.unique_name()]
+    heart_rate.total_bytes = None
+    heart_rate.over_budget = True
+
+    result = runner.invoke(app, ["materialize", "--max-bytes", "1000"])
+
+    assert result.exit_code == 1
+    assert f"couldn't be forecast: {HeartRate.unique_name()}" in result.output
+    materialize.assert_not_called()
+
+
+@patch("amora.cli.typer_app.compile")
+@patch("amora.materialization.materialize", return_value=None)
+@patch("amora.materialization.plan", return_value=_plan(max_bytes=200))
+def test_materialize_over_budget_skips_models(
+    _plan: MagicMock, materialize: MagicMock, _compile: MagicMock
+):
+    for model in [HeartRate, Steps]:
+        model.target_path().write_text("SELECT 1")
+
+    result = runner.invoke(
+        app, ["materialize", "--max-bytes", "200", "--over-budget", "skip"]
+    )
+
+    assert result.exit_code == 0, result.stdout
+    materialize.assert_called_once_with(
+        "SELECT 1", Steps.unique_name(), Steps.__model_config__
+    )
+
+
+@patch("amora.cli.typer_app.compile")
+@patch("amora.materialization.materialize", return_value=None)
+@patch("amora.materialization.materialize_task", return_value=None)
+@patch("amora.materialization.stale_models", return_value={Steps.unique_name()})
+@patch.object(MaterializationState, "save")
+@patch.object(MaterializationState, "load", return_value=MaterializationState())
+def test_materialize_with_skip_unchanged_option(
+    load: MagicMock,
+    save: MagicMock,
+    stale_models: MagicMock,
+    materialize_task: MagicMock,
+    materialize: MagicMock,
+    _compile: MagicMock,
+):
+    for model in [HeartRate, Steps]:
+        model.target_path().write_text("SELECT 1")
+
+    result = runner.invoke(app, ["materialize", "--skip-unchanged"])
+
+    assert result.exit_code == 0, result.stdout
+    stale_models.assert_called_once_with(ANY, ANY, load.return_value)
+    materialize.assert_not_called()
+
+    (task, state), _kwargs = materialize_task.call_args
+    assert materialize_task.call_count == 1
+    assert task.model.unique_name() == Steps.unique_name()
+    assert state is load.return_value
+    assert f"Skipping `{HeartRate.unique_name()}`, up to date" in result.stdout
+    save.assert_called_once()
@@ -0,0 +1,43 @@
+import re
+import subprocess
+import sys
+
+# Cumulative import time of `amora.cli`, in microseconds. The CLI entrypoint should
+# only import typer and the settings, leaving anything heavier to the invoked command.
+STARTUP_IMPORT_TIME_BUDGET_US = 1_000_000
+
+HEAVY_MODULES = [
+    "feast",
+    "google.cloud.bigquery",
+    "matplotlib",
+    "networkx",
+    "pandas",
+    "pytest",
+    "sqlalchemy",
+    "sqlalchemy_bigquery",
+]
+
+
+def _import_amora_cli(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args, "-c", "import sys, amora.cli; print(*sys.modules)"],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+
+def test_cli_startup_doesnt_import_heavy_modules():
+    imported_modules = set(_import_amora_cli().stdout.split())
+
+    assert not imported_modules.intersection(HEAVY_MODULES)
+
+
+def test_cli_startup_import_time_budget():
+    importtime = _import_amora_cli("-X", "importtime").stderr
+    match = re.search(
+        r"^import time:\s+\d+ \|\s+(\d+) \| amora\.cli$", importtime, re.M
+    )
+
+    assert match is not None
+    assert int(match.group(1)) < STARTUP_IMPORT_TIME_BUDGET_US
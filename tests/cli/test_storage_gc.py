@@ -0,0 +1,17 @@
+from unittest.mock import patch
+
+from typer.testing import CliRunner
+
+from amora.cli import app
+from amora.storage import CacheGCResult
+
+runner = CliRunner()
+
+
+@patch("amora.storage.CACHE.gc", return_value=CacheGCResult(1, 42, 2, 84))
+def test_storage_gc(gc):
+    result = runner.invoke(app, ["storage", "gc", "--max-bytes", "100", "--dry-run"])
+
+    assert result.exit_code == 0, result.output
+    gc.assert_called_once_with(max_bytes=100, max_age=None, dry_run=True)
+    assert "Would remove 1 entries (42 bytes)" in result.output
@@ -1,3 +1,4 @@
+import shutil
 from pathlib import Path
 
 from selenium.webdriver.chrome.options import Options
@@ -15,6 +16,10 @@ def pytest_sessionstart(session):
 
 def pytest_sessionfinish(session, exitstatus):
     remove_compiled_files()
+    settings.models_index_path.unlink(missing_ok=True)
+    shutil.rmtree(settings.compilation_cache_path, ignore_errors=True)
+    shutil.rmtree(settings.dry_run_cache_path, ignore_errors=True)
+    settings.materialization_state_path.unlink(missing_ok=True)
 
 
 def pytest_setup_options():
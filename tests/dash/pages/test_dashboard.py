@@ -0,0 +1,48 @@
+import threading
+from unittest import mock
+
+from sqlalchemy import literal, select
+
+from amora.dash.app import dash_app  # noqa: F401 registers the dash pages
+from amora.dash.pages import dashboard as dashboard_page
+from amora.dashboards import Dashboard
+from amora.protocols import Compilable
+from amora.questions import Question
+
+
+def a_question() -> Compilable:
+    """
+    What is the answer?
+    """
+    return select(literal(42).label("answer"))
+
+
+def another_question() -> Compilable:
+    """
+    What is another answer?
+    """
+    return select(literal(43).label("answer"))
+
+
+def test_question_components_answers_the_questions_concurrently():
+    questions = [Question(a_question), Question(another_question)]
+    dashboard = Dashboard(
+        uid="1",
+        name="Answers",
+        questions=[questions, [Question(a_question)]],
+        filters=[],
+    )
+    barrier = threading.Barrier(len(questions), timeout=5)
+
+    def component(question: Question) -> str:
+        # Raises BrokenBarrierError unless both questions are answered at once
+        barrier.wait()
+        return question.name
+
+    with mock.patch.object(
+        dashboard_page.question_details, "component", side_effect=component
+    ) as question_component:
+        components = dashboard_page.question_components(dashboard)
+
+    assert components == {question: question.name for question in questions}
+    assert question_component.call_count == len(questions)
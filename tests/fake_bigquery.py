@@ -0,0 +1,165 @@
+import re
+from copy import deepcopy
+from datetime import datetime
+from itertools import count
+from typing import Dict, List, Optional, Tuple, Union
+
+from google.api_core.exceptions import BadRequest, Conflict, NotFound
+from google.cloud.bigquery import (
+    CopyJobConfig,
+    CreateDisposition,
+    QueryJobConfig,
+    Table,
+    TableReference,
+    WriteDisposition,
+)
+
+TableLike = Union[Table, TableReference, str]
+
+_CREATE_OR_REPLACE_COPY = re.compile(
+    r"CREATE OR REPLACE TABLE `(?P<destination>[^`]+)` COPY `(?P<source>[^`]+)`"
+)
+
+
+def _table_id(table: TableLike) -> str:
+    if isinstance(table, Table):
+        return str(table.reference)
+    return str(table)
+
+
+class FakeJob:
+    def __init__(self, total_bytes: int = 0) -> None:
+        self.created = datetime(2022, 1, 1, 0, 0, 0)
+        self.ended = datetime(2022, 1, 1, 0, 0, 1)
+        self.total_bytes_billed = total_bytes
+        self.total_bytes_processed = total_bytes
+
+    def result(self) -> None:
+        return None
+
+
+class FakeClient:
+    """
+    A local stand-in for `google.cloud.bigquery.Client`, which keeps the tables
+    in memory and records the calls made to it. Mimics the BigQuery API errors
+    for the operations it doesn't allow, e.g. overwriting a table with a
+    different partitioning.
+    """
+
+    def __init__(self) -> None:
+        self.tables: Dict[str, Table] = {}
+        self.calls: List[str] = []
+        self.deleted: List[str] = []
+        self.queries: List[Tuple[str, QueryJobConfig]] = []
+        # Milliseconds since the epoch, increasing on every table change
+        self._clock = count(int(datetime(2022, 1, 1).timestamp() * 1000))
+
+    def _touch(self, table: Table) -> None:
+        table._properties["lastModifiedTime"] = str(next(self._clock))
+
+    def add_table(self, table: Table) -> Table:
+        table = deepcopy(table)
+        table._properties["type"] = "VIEW" if table.view_query else "TABLE"
+        table._properties.setdefault("numRows", "0")
+        table._properties.setdefault("numBytes", "0")
+        self._touch(table)
+        self.tables[_table_id(table)] = table
+        return table
+
+    def get_table(self, table: TableLike) -> Table:
+        self.calls.append("get_table")
+        try:
+            return deepcopy(self.tables[_table_id(table)])
+        except KeyError:
+            raise NotFound(f"Not found: Table {_table_id(table)}")
+
+    def create_table(self, table: Table) -> Table:
+        self.calls.append("create_table")
+        if _table_id(table) in self.tables:
+            raise Conflict(f"Already Exists: Table {_table_id(table)}")
+        return deepcopy(self.add_table(table))
+
+    def update_table(self, table: Table, fields: List[str]) -> Table:
+        self.calls.append("update_table")
+        existing = self.tables.get(_table_id(table))
+        if existing is None:
+            raise NotFound(f"Not found: Table {_table_id(table)}")
+        if "view_query" in fields and existing.table_type != "VIEW":
+            raise BadRequest(f"{_table_id(table)} is not a view")
+
+        for field in fields:
+            setattr(existing, field, getattr(table, field))
+        self._touch(existing)
+        return deepcopy(existing)
+
+    def delete_table(self, table: TableLike, not_found_ok: bool = False) -> None:
+        self.calls.append("delete_table")
+        self.deleted.append(_table_id(table))
+        if self.tables.pop(_table_id(table), None) is None and not not_found_ok:
+            raise NotFound(f"Not found: Table {_table_id(table)}")
+
+    def query(self, sql: str, job_config: Optional[QueryJobConfig] = None) -> FakeJob:
+        self.calls.append("query")
+        job_config = job_config or QueryJobConfig()
+        self.queries.append((sql, job_config))
+
+        destination = job_config.destination
+        if destination is None:
+            replace = _CREATE_OR_REPLACE_COPY.match(sql)
+            if replace is not None:
+                self._copy(replace["source"], replace["destination"])
+            return FakeJob(total_bytes=42)
+
+        existing = self.tables.get(_table_id(destination))
+        if existing is not None:
+            if job_config.write_disposition == WriteDisposition.WRITE_APPEND:
+                self._touch(existing)
+                return FakeJob(total_bytes=42)
+            if job_config.write_disposition != WriteDisposition.WRITE_TRUNCATE:
+                raise BadRequest(f"Already Exists: Table {_table_id(destination)}")
+            if (existing.time_partitioning, existing.range_partitioning) != (
+                job_config.time_partitioning,
+                job_config.range_partitioning,
+            ):
+                raise BadRequest(
+                    "Cannot replace a table with a different partitioning spec"
+                )
+        elif job_config.create_disposition != CreateDisposition.CREATE_IF_NEEDED:
+            raise NotFound(f"Not found: Table {_table_id(destination)}")
+
+        table = Table(_table_id(destination))
+        if existing is not None:
+            table = deepcopy(existing)
+        table.time_partitioning = job_config.time_partitioning
+        table.range_partitioning = job_config.range_partitioning
+        table.clustering_fields = job_config.clustering_fields
+        self.add_table(table)
+        return FakeJob(total_bytes=42)
+
+    def copy_table(
+        self,
+        source: TableLike,
+        destination: TableLike,
+        job_config: Optional[CopyJobConfig] = None,
+    ) -> FakeJob:
+        self.calls.append("copy_table")
+        existing = self.tables.get(_table_id(destination))
+        if existing is not None:
+            source_table = self.tables[_table_id(source)]
+            if (existing.time_partitioning, existing.range_partitioning) != (
+                source_table.time_partitioning,
+                source_table.range_partitioning,
+            ):
+                raise BadRequest("Incompatible table partitioning specification")
+
+        self._copy(source, destination)
+        return FakeJob()
+
+    def _copy(self, source: TableLike, destination: TableLike) -> None:
+        table = deepcopy(self.tables[_table_id(source)])
+        table._properties["tableReference"] = TableReference.from_string(
+            _table_id(destination)
+        ).to_api_repr()
+        table.expires = None
+        self._touch(table)
+        self.tables[_table_id(destination)] = table
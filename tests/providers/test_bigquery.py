@@ -1,11 +1,14 @@
 import string
 from datetime import date, datetime, time
 from typing import List, Optional
+from unittest.mock import MagicMock, patch
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
 import pytest
-from google.api_core.exceptions import NotFound
+from google.api_core.exceptions import Forbidden, NotFound
+from google.cloud.bigquery import Table
 from google.cloud.bigquery.schema import SchemaField
 from sqlalchemy import (
     ARRAY,
@@ -36,11 +39,14 @@ from amora.models import (
 from amora.protocols import Compilable
 from amora.providers.bigquery import (
     DryRunResult,
+    RunResult,
     array,
     column_for_schema_field,
     cte_from_dataframe,
+    content_version,
     cte_from_rows,
     dry_run,
+    dry_run_models,
     estimated_query_cost_in_usd,
     estimated_storage_cost_in_usd,
     run,
@@ -218,6 +224,87 @@ def test_estimated_storage_cost_in_usd(total_bytes: int, expected_cost: float):
     assert estimated_storage_cost_in_usd(total_bytes) == expected_cost
 
 
+@pytest.mark.parametrize("storage_read_api_enabled", [True, False])
+def test_RunResult_to_arrow(storage_read_api_enabled: bool):
+    rows = MagicMock()
+    result = RunResult(
+        total_bytes=0,
+        query="SELECT 1",
+        job_id="job_id",
+        referenced_tables=[],
+        user_email=None,
+        rows=rows,
+        execution_time_in_ms=0,
+        to_dataframe=MagicMock(),
+    )
+
+    with patch.object(
+        settings, "GCP_BIGQUERY_STORAGE_READ_API_ENABLED", storage_read_api_enabled
+    ):
+        assert result.to_arrow() == rows.to_arrow.return_value
+
+    rows.to_arrow.assert_called_once_with(
+        create_bqstorage_client=storage_read_api_enabled
+    )
+
+
+def test_RunResult_iter_batches():
+    rows = MagicMock()
+    rows.to_arrow_iterable.return_value = iter(
+        [
+            pa.RecordBatch.from_pydict({"value": [1, 2]}),
+            pa.RecordBatch.from_pydict({"value": [3]}),
+        ]
+    )
+    result = RunResult(
+        total_bytes=0,
+        query="SELECT 1",
+        job_id="job_id",
+        referenced_tables=[],
+        user_email=None,
+        rows=rows,
+        execution_time_in_ms=0,
+        to_dataframe=MagicMock(),
+    )
+
+    with patch.object(settings, "GCP_BIGQUERY_STORAGE_READ_API_ENABLED", True), patch(
+        "amora.providers.bigquery.get_bqstorage_client"
+    ) as get_bqstorage_client:
+        chunks = list(result.iter_dataframes())
+
+    rows.to_arrow_iterable.assert_called_once_with(
+        bqstorage_client=get_bqstorage_client.return_value
+    )
+    assert [chunk["value"].tolist() for chunk in chunks] == [[1, 2], [3]]
+
+
+def test_content_version_changes_with_the_referenced_tables_data():
+    table = Table("amora-data-build-tool.amora.health")
+    table._properties.update(lastModifiedTime="1000", numRows="10")
+    client = MagicMock()
+    client.query.return_value.referenced_tables = [table.reference]
+    client.get_table.side_effect = lambda _ref: table
+
+    with patch("amora.providers.bigquery.get_client", return_value=client), patch(
+        "amora.providers.bigquery._content_versions", {}
+    ), patch.object(settings, "STORAGE_CACHE_CONTENT_VERSION_MAX_AGE_SECONDS", 60):
+        version = content_version(select(Health))
+        assert content_version(select(Health)) == version
+        client.query.assert_called_once()
+
+        with patch.object(settings, "STORAGE_CACHE_CONTENT_VERSION_MAX_AGE_SECONDS", 0):
+            assert content_version(select(Health)) == version
+
+            table._properties.update(numRows="11")
+            new_version = content_version(select(Health))
+            assert new_version != version
+
+            table._properties.update(lastModifiedTime="2000")
+            assert content_version(select(Health)) != new_version
+
+        assert content_version(select(HeartRate)) != version
+
+
 def test_dry_run_on_sourceless_table_model():
     result = dry_run(Health)
     assert isinstance(result, DryRunResult)
@@ -662,3 +749,77 @@ def test_table_sample():
     assert set(sample_df.columns) == {
         c.key for c in StepCountBySource.__table__.columns
     }
+
+
+@pytest.fixture()
+def dry_run_client(tmp_path):
+    client = MagicMock()
+    query_job = client.query.return_value
+    query_job.job_id = "a-dry-run-job"
+    query_job.total_bytes_processed = 42
+    query_job.referenced_tables = []
+    query_job.schema = [SchemaField(name="a_string", field_type="STRING")]
+    query_job.user_email = None
+
+    with patch(
+        "amora.providers.bigquery.get_client", return_value=client
+    ), patch.object(settings, "DRY_RUN_CACHE_PATH", tmp_path):
+        yield client
+
+
+class ModelWithSource(AmoraModel):
+    __tablename__override__ = "model_with_source"
+
+    a_string: str = Field(String, primary_key=True)
+
+    @classmethod
+    def source(cls) -> Optional[Compilable]:
+        return cte_from_rows([{"a_string": "Amora"}])
+
+
+def test_dry_run_is_memoized_by_the_compiled_sql(dry_run_client: MagicMock):
+    result = dry_run(ModelWithSource)
+
+    assert dry_run(ModelWithSource) == result
+    assert schema_for_model_source(ModelWithSource) == result.schema
+    dry_run_client.query.assert_called_once()
+    assert result.total_bytes == 42
+    assert result.schema == [SchemaField(name="a_string", field_type="STRING")]
+
+
+def test_dry_run_memoized_results_expire(dry_run_client: MagicMock):
+    with patch.object(settings, "GCP_BIGQUERY_DRY_RUN_CACHE_MAX_AGE_SECONDS", -1):
+        dry_run(ModelWithSource)
+        dry_run(ModelWithSource)
+
+    assert dry_run_client.query.call_count == 2
+
+
+def test_dry_run_models(dry_run_client: MagicMock):
+    table = Table(Health.fully_qualified_name())
+    table._properties.update(type="TABLE", numBytes="100")
+    dry_run_client.get_table.return_value = table
+
+    results = dry_run_models([ModelWithSource, Health], num_workers=2)
+
+    assert list(results) == [ModelWithSource, Health]
+    model_with_source_result = results[ModelWithSource]
+    health_result = results[Health]
+    assert model_with_source_result is not None and health_result is not None
+    assert model_with_source_result.total_bytes == 42
+    assert health_result.total_bytes == 100
+    assert dry_run_client.query.call_count == 1
+    dry_run_client.get_table.assert_called_once()
+
+
+def test_dry_run_models_reports_models_refused_by_bigquery_as_unknown(
+    dry_run_client: MagicMock,
+):
+    dry_run_client.get_table.side_effect = Forbidden("Access Denied")
+
+    results = dry_run_models([ModelWithSource, Health], num_workers=2)
+
+    assert results[Health] is None
+    model_with_source_result = results[ModelWithSource]
+    assert model_with_source_result is not None
+    assert model_with_source_result.total_bytes == 42
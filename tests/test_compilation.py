@@ -1,15 +1,20 @@
 from pathlib import Path
-from tempfile import NamedTemporaryFile
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from unittest import mock
 
 import pytest
-from sqlalchemy import Integer, String, func, select
+from sqlalchemy import Integer, String, func, literal, select
 from sqlalchemy_bigquery.base import BQArray
 
-from amora.compilation import compile_statement
-from amora.models import AmoraModel, amora_model_for_path
+from amora.compilation import CompilationCache, compile_model_files, compile_statement
+from amora.config import settings
+from amora.models import AmoraModel, ModelIndex, amora_model_for_path
 from amora.providers.bigquery import fixed_unnest
 
 from tests.models.deeply.nested.array_repeated_fields import ArrayRepeatedFields
+from tests.models.health import Health
+from tests.models.heart_rate import HeartRate
+from tests.models.steps import Steps
 
 
 def test_amora_model_for_path_with_invalid_file_path_type():
@@ -80,3 +85,85 @@ def test_AmoraBigQueryCompiler_visit_function_without_offset():
     compiled = compile_statement(stmt)
 
     assert compiled == "unnest(`array_repeated_fields`.`int_arr`)"
+
+
+def test_compile_statement_doesnt_pretty_print_by_default():
+    with mock.patch("amora.compilation.sqlparse.format") as format_:
+        compile_statement(Steps.source())
+
+    format_.assert_not_called()
+
+
+def test_compile_statement_with_pretty():
+    raw_sql = compile_statement(Steps.source())
+    pretty_sql = compile_statement(Steps.source(), pretty=True)
+
+    assert pretty_sql != raw_sql
+    assert pretty_sql.split() == raw_sql.split()
+
+
+def test_compile_statement_is_memoized_by_statement_structure():
+    sql = compile_statement(select(literal(42).label("answer")))
+
+    with mock.patch("sqlalchemy.sql.selectable.Select.compile") as compile_:
+        assert compile_statement(select(literal(42).label("answer"))) == sql
+
+    compile_.assert_not_called()
+    assert compile_statement(select(literal(43).label("answer"))) != sql
+
+
+@pytest.fixture()
+def models_index():
+    index = ModelIndex.empty()
+    index.refresh()
+    return index
+
+
+def test_CompilationCache_key_changes_with_dependencies(models_index: ModelIndex):
+    steps_key = CompilationCache(models_index).key_for_path(Steps.path())
+    heart_rate_key = CompilationCache(models_index).key_for_path(HeartRate.path())
+
+    models_index.entries[Health.path().as_posix()].checksum = "a-new-checksum"
+
+    cache = CompilationCache(models_index)
+    assert cache.key_for_path(Steps.path()) != steps_key
+    assert cache.key_for_path(HeartRate.path()) != heart_rate_key
+
+
+def test_CompilationCache_get_and_put(models_index: ModelIndex):
+    with TemporaryDirectory() as cache_dir:
+        cache = CompilationCache(models_index, path=Path(cache_dir))
+        key = cache.key_for_path(Steps.path())
+        assert key is not None
+
+        assert cache.get(key) is None
+        cache.put(key, "SELECT 1")
+        assert cache.get(key) == "SELECT 1"
+
+
+def test_compile_model_files_reuses_cached_sql():
+    with TemporaryDirectory() as cache_dir, mock.patch.object(
+        settings, "COMPILATION_CACHE_PATH", Path(cache_dir)
+    ):
+        compiled = dict(compile_model_files([Steps.path()], num_workers=1))
+        assert compiled == {
+            Steps.path(): compile_statement(Steps.source(), pretty=True)
+        }
+
+        with mock.patch("amora.compilation.compile_statement") as compile_stmt:
+            assert dict(compile_model_files([Steps.path()], num_workers=1)) == compiled
+
+        compile_stmt.assert_not_called()
+
+
+def test_compile_model_files_on_a_process_pool():
+    paths = [Steps.path(), HeartRate.path()]
+    with TemporaryDirectory() as cache_dir, mock.patch.object(
+        settings, "COMPILATION_CACHE_PATH", Path(cache_dir)
+    ):
+        compiled = dict(compile_model_files(paths, num_workers=2))
+
+    assert compiled == {
+        Steps.path(): compile_statement(Steps.source(), pretty=True),
+        HeartRate.path(): compile_statement(HeartRate.source(), pretty=True),
+    }
@@ -1,5 +1,14 @@
+import random
+import threading
+from concurrent import futures
+from unittest.mock import patch
+
+import networkx as nx
+
 from amora.compilation import remove_compiled_files
+from amora.config import settings
 from amora.dag import DependencyDAG
+from amora.manifest import Manifest
 
 from tests.models.health import Health
 from tests.models.heart_agg import HeartRateAgg
@@ -26,6 +35,79 @@ def test_DependencyDAG_root_with_empty_dag():
     assert dag.root() is None
 
 
+def test_DependencyDAG_critical_path_lengths():
+    dag = DependencyDAG()
+    dag.add_edge("a", "b")
+    dag.add_edge("b", "c")
+    dag.add_edge("a", "d")
+    dag.add_node("e")
+
+    assert dag.critical_path_lengths() == {"a": 3, "b": 2, "c": 1, "d": 1, "e": 1}
+
+
+def test_DependencyDAG_schedule_submits_nodes_once_their_predecessors_are_done():
+    dag = DependencyDAG()
+    dag.add_edge("slow", "after_slow")
+    dag.add_edge("fast", "after_fast")
+
+    slow_can_finish = threading.Event()
+    done = []
+
+    def run(node):
+        if node == "slow":
+            assert slow_can_finish.wait(timeout=5)
+        done.append(node)
+        if node == "after_fast":
+            slow_can_finish.set()
+        return node
+
+    with futures.ThreadPoolExecutor(max_workers=2) as executor:
+        completed = [
+            future.result()
+            for _node, future in dag.schedule(
+                lambda node: executor.submit(run, node), max_concurrency=2
+            )
+        ]
+
+    # `after_fast` doesn't wait for `slow`, which is on the same generation as `fast`
+    assert done == ["fast", "after_fast", "slow", "after_slow"]
+    assert sorted(completed) == sorted(done)
+
+
+def test_DependencyDAG_schedule_prioritizes_the_critical_path():
+    dag = DependencyDAG()
+    dag.add_edge("b", "c")
+    dag.add_edge("c", "d")
+    dag.add_node("a")
+
+    with futures.ThreadPoolExecutor(max_workers=1) as executor:
+        scheduled = [
+            node
+            for node, _future in dag.schedule(
+                lambda node: executor.submit(lambda: None), max_concurrency=1
+            )
+        ]
+
+    assert scheduled == ["b", "c", "a", "d"]
+
+
+def test_DependencyDAG_schedule_skips_nodes_without_futures():
+    dag = DependencyDAG()
+    dag.add_edge("a", "b")
+    dag.add_edge("b", "c")
+
+    with futures.ThreadPoolExecutor(max_workers=1) as executor:
+        scheduled = [
+            node
+            for node, _future in dag.schedule(
+                lambda node: None if node == "b" else executor.submit(lambda: None),
+                max_concurrency=1,
+            )
+        ]
+
+    assert scheduled == ["a", "c"]
+
+
 def test_DependencyDAG_to_cytoscape_elements():
     dag = DependencyDAG()
     dag.add_edge("a", "b")
@@ -68,6 +150,80 @@ def test_DependencyDAG_from_model():
     ]
 
 
+def test_DependencyDAG_from_model_visits_each_model_once():
+    visits = []
+
+    class Node:
+        def __init__(self, name: str, depends_on: list):
+            self.name = name
+            self.depends_on = depends_on
+
+        def unique_name(self) -> str:
+            return self.name
+
+        @property
+        def __depends_on__(self) -> list:
+            visits.append(self.name)
+            return self.depends_on
+
+    # 20 stacked diamonds, with 2**20 paths from the top to the bottom model
+    layer = [Node("bottom", [])]
+    for level in range(20):
+        layer = [Node(f"{side}{level}", layer) for side in "ab"]
+    top = Node("top", layer)
+
+    dag = DependencyDAG.from_model(top)
+
+    assert len(dag.nodes) == 42
+    assert len(dag.edges) == 2 + 4 * 19 + 2
+    assert len(visits) == len(set(visits)) == 42
+
+
+def test_DependencyDAG_from_target_reads_dependencies_from_the_manifest(tmp_path):
+    HeartRate.target_path().write_text("SELECT 1")
+
+    with patch.object(settings, "MANIFEST_PATH", tmp_path.joinpath("manifest.json")):
+        Manifest.from_project().save()
+
+        with patch("amora.dag.Task.for_target") as for_target:
+            dag = DependencyDAG.from_target()
+
+    for_target.assert_not_called()
+    assert list(dag.nodes) == [HeartRate.unique_name(), Health.unique_name()]
+    assert list(dag.edges) == [(Health.unique_name(), HeartRate.unique_name())]
+
+
+def test_ReachabilityIndex_on_a_diamond():
+    dag = DependencyDAG()
+    dag.add_edges_from([("a", "b"), ("a", "c"), ("b", "d"), ("c", "d")])
+    dag.add_node("e")
+
+    reachability = dag.reachability()
+
+    assert set(reachability.ancestors("d")) == {"a", "b", "c"}
+    assert reachability.ancestors("d")[0] == "a"
+    assert set(reachability.descendants("a")) == {"b", "c", "d"}
+    assert reachability.descendants("a")[-1] == "d"
+    assert reachability.ancestors("e") == reachability.descendants("e") == []
+
+
+def test_ReachabilityIndex_matches_networkx():
+    rng = random.Random(42)
+    dag = DependencyDAG()
+    dag.add_nodes_from(range(1000))
+    dag.add_edges_from(
+        (source, target)
+        for target in range(1, 1000)
+        for source in rng.sample(range(target), k=min(target, 3))
+    )
+
+    reachability = dag.reachability()
+
+    for node in rng.sample(range(1000), k=50):
+        assert set(reachability.ancestors(node)) == nx.ancestors(dag, node)
+        assert set(reachability.descendants(node)) == nx.descendants(dag, node)
+
+
 def test_DependencyDAG_from_project():
     dag = DependencyDAG.from_project()
 
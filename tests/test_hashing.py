@@ -0,0 +1,62 @@
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from unittest import mock
+
+from amora.hashing import FileHasher, FileSignature, hash_file
+
+
+def test_hash_file():
+    with NamedTemporaryFile(suffix=".py") as f:
+        hash = hash_file(Path(f.name))
+        assert isinstance(hash, str)
+
+
+def test_hash_file_with_empty_file():
+    with NamedTemporaryFile() as f:
+        assert hash_file(Path(f.name)) == hash_file(Path(os.devnull))
+
+
+def test_hash_file_changes_with_contents():
+    with NamedTemporaryFile() as f:
+        path = Path(f.name)
+        empty_hash = hash_file(path)
+
+        path.write_text("SELECT 1")
+
+        assert hash_file(path) != empty_hash
+        assert hash_file(path) == hash_file(path)
+
+
+def test_FileHasher_skips_files_with_unchanged_signature():
+    hasher = FileHasher()
+    with NamedTemporaryFile() as f:
+        path = Path(f.name)
+        path.write_text("SELECT 1")
+
+        digest = hasher.hash_file(path)
+        with mock.patch("amora.hashing.hash_file") as hash_file_:
+            assert hasher.hash_file(path) == digest
+
+        hash_file_.assert_not_called()
+        assert hasher.stats.hits == 1
+        assert hasher.stats.misses == 1
+        assert hasher.stats.bytes_hashed == len("SELECT 1")
+
+
+def test_FileHasher_hashes_files_with_changed_signature():
+    hasher = FileHasher()
+    with NamedTemporaryFile() as f:
+        path = Path(f.name)
+        stat = path.stat()
+        hasher.remember(path, FileSignature.from_stat(stat), "a-previous-digest")
+        assert hasher.hash_file(path) == "a-previous-digest"
+
+        path.write_text("SELECT 1")
+
+        assert hasher.hash_file(path) == hash_file(path)
+        assert hasher.stats.hits == 1
+        assert hasher.stats.misses == 1
+
+        hasher.reset_stats()
+        assert hasher.stats.hits == hasher.stats.misses == 0
@@ -5,10 +5,9 @@ from tempfile import NamedTemporaryFile
 from unittest import mock
 
 import pytest
-from _hashlib import HASH
 
 from amora.config import settings
-from amora.manifest import Manifest, ModelMetadata, hash_file
+from amora.manifest import Manifest, ModelMetadata
 from amora.models import amora_model_for_path
 
 from tests.models.health import Health
@@ -16,10 +15,8 @@ from tests.models.step_count_by_source import StepCountBySource
 from tests.models.steps import Steps
 
 
-def test_hash_file():
-    with NamedTemporaryFile(suffix=".py") as f:
-        hash = hash_file(Path(f.name))
-        assert isinstance(hash, HASH)
+def _compiled(models_to_compile):
+    return {(model.unique_name(), path) for model, path in models_to_compile}
 
 
 def test_Manifest_from_project():
@@ -49,7 +46,12 @@ def test_Manifest_save():
         settings.MANIFEST_PATH = manifest_path
         manifest.save()
 
-        assert json.load(manifest_file) == manifest
+        lines = manifest_path.read_text().splitlines()
+        assert json.loads(lines[0]) == {"version": 2}
+        assert [json.loads(line) for line in lines[1:]] == [
+            {"name": "a", **model_metadata.dict()}
+        ]
+        assert Manifest.load() == manifest
 
 
 def test_Manifest_load():
@@ -85,23 +87,22 @@ def sample_manifest():
                 stat=1664199318.9002378,
                 size=1181,
                 hash="1a3de26089812ca0b731588a7dd2f3f2",
-                path="amora-data-build-tool/examples/amora_project/models/health.py",
+                path=Health.path().as_posix(),
                 deps=[],
             ),
             "amora-data-build-tool.amora.steps": ModelMetadata(
                 stat=1665147859.6682658,
                 size=1937,
                 hash="c8981d729c89dd8f6afcbe6671fa8c62",
-                path="amora-data-build-tool/examples/amora_project/models/steps.py",
+                path=Steps.path().as_posix(),
                 deps=[],
             ),
         },
     )
 
 
-@mock.patch("amora.manifest.list_models")
 def test_get_models_to_compile_when_both_manifests_are_equal(
-    list_models: mock.MagicMock, sample_manifest: Manifest
+    sample_manifest: Manifest,
 ):
     """
     Case:
@@ -110,20 +111,12 @@ def test_get_models_to_compile_when_both_manifests_are_equal(
         no model need to recompile.
     """
 
-    list_models.return_value = [
-        (Steps, Steps.path()),
-        (Health, Health.path()),
-    ]
-
     models_to_compile = sample_manifest.get_models_to_compile(sample_manifest)
 
     assert len(models_to_compile) == 0
 
 
-@mock.patch("amora.manifest.list_models")
-def test_get_models_to_compile_when_has_new_model(
-    list_models: mock.MagicMock, sample_manifest: Manifest
-):
+def test_get_models_to_compile_when_has_new_model(sample_manifest: Manifest):
     """
     Case:
         current_manifest has a new model that isnt in previous_manifest
@@ -131,31 +124,24 @@ def test_get_models_to_compile_when_has_new_model(
         recompile the new model.
     """
 
-    list_models.return_value = [
-        (Steps, Steps.path()),
-        (Health, Health.path()),
-        (StepCountBySource, StepCountBySource.path()),
-    ]
-
     new_manifest = deepcopy(sample_manifest)
     new_manifest.models[StepCountBySource.unique_name()] = ModelMetadata(
         stat=1664199318.9035711,
         size=4714,
         hash="3df3f2761805fb1ece39581f21fbaf0a",
-        path="amora-data-build-tool/examples/amora_project/models/steps_count_by_source.py",
+        path=StepCountBySource.path().as_posix(),
         deps=[],
     )
 
     models_to_compile = new_manifest.get_models_to_compile(sample_manifest)
 
     assert len(models_to_compile) == 1
-    assert models_to_compile == {(StepCountBySource, StepCountBySource.path())}
+    assert _compiled(models_to_compile) == {
+        (StepCountBySource.unique_name(), StepCountBySource.path())
+    }
 
 
-@mock.patch("amora.manifest.list_models")
-def test_get_models_to_compile_when_a_model_has_changed_size(
-    list_models: mock.MagicMock, sample_manifest: Manifest
-):
+def test_get_models_to_compile_when_a_model_has_changed_size(sample_manifest: Manifest):
     """
     Case:
         a model has changed it size in the current_manifest.
@@ -163,24 +149,16 @@ def test_get_models_to_compile_when_a_model_has_changed_size(
         recompile that model.
     """
 
-    list_models.return_value = [
-        (Steps, Steps.path()),
-        (Health, Health.path()),
-    ]
-
     new_manifest = deepcopy(sample_manifest)
     new_manifest.models["amora-data-build-tool.amora.steps"].size = 4714
 
     models_to_compile = new_manifest.get_models_to_compile(sample_manifest)
 
     assert len(models_to_compile) == 1
-    assert models_to_compile == {(Steps, Steps.path())}
+    assert _compiled(models_to_compile) == {(Steps.unique_name(), Steps.path())}
 
 
-@mock.patch("amora.manifest.list_models")
-def test_get_models_to_compile_when_a_model_has_changed_deps(
-    list_models: mock.MagicMock, sample_manifest: Manifest
-):
+def test_get_models_to_compile_when_a_model_has_changed_deps(sample_manifest: Manifest):
     """
     Case:
         a model has changed it dependencies in the current_manifest.
@@ -188,23 +166,52 @@ def test_get_models_to_compile_when_a_model_has_changed_deps(
         recompile the model.
     """
 
-    list_models.return_value = [
-        (Steps, Steps.path()),
-        (Health, Health.path()),
-    ]
-
     new_manifest = deepcopy(sample_manifest)
     new_manifest.models["amora-data-build-tool.amora.steps"].deps = ["another-model"]
 
     models_to_compile = new_manifest.get_models_to_compile(sample_manifest)
 
     assert len(models_to_compile) == 1
-    assert models_to_compile == {(Steps, Steps.path())}
+    assert _compiled(models_to_compile) == {(Steps.unique_name(), Steps.path())}
+
+
+def test_get_models_to_compile_when_a_new_model_reorders_unrelated_deps(
+    sample_manifest: Manifest,
+):
+    """
+    Case:
+        current_manifest has a new model, and an unrelated model lists the same
+        dependencies in another order.
+    Expected Output:
+        recompile only the new model.
+    """
+    sample_manifest.models["amora-data-build-tool.amora.health"].deps = [
+        Steps.unique_name(),
+        StepCountBySource.unique_name(),
+    ]
+
+    new_manifest = deepcopy(sample_manifest)
+    new_manifest.models["amora-data-build-tool.amora.health"].deps = [
+        StepCountBySource.unique_name(),
+        Steps.unique_name(),
+    ]
+    new_manifest.models[StepCountBySource.unique_name()] = ModelMetadata(
+        stat=1664199318.9035711,
+        size=4714,
+        hash="3df3f2761805fb1ece39581f21fbaf0a",
+        path=StepCountBySource.path().as_posix(),
+        deps=[],
+    )
+
+    models_to_compile = new_manifest.get_models_to_compile(sample_manifest)
+
+    assert _compiled(models_to_compile) == {
+        (StepCountBySource.unique_name(), StepCountBySource.path())
+    }
 
 
-@mock.patch("amora.manifest.list_models")
 def test_get_models_to_compile_when_a_model_stat_was_updated_and_has_no_target_file(
-    list_models: mock.MagicMock, sample_manifest: Manifest
+    sample_manifest: Manifest,
 ):
     """
     Case:
@@ -214,23 +221,17 @@ def test_get_models_to_compile_when_a_model_stat_was_updated_and_has_no_target_f
         recompile the model.
     """
 
-    list_models.return_value = [
-        (Steps, Steps.path()),
-        (Health, Health.path()),
-    ]
-
     new_manifest = deepcopy(sample_manifest)
     new_manifest.models["amora-data-build-tool.amora.steps"].stat = 2665147859.6682658
 
     models_to_compile = new_manifest.get_models_to_compile(sample_manifest)
 
     assert len(models_to_compile) == 1
-    assert models_to_compile == {(Steps, Steps.path())}
+    assert _compiled(models_to_compile) == {(Steps.unique_name(), Steps.path())}
 
 
-@mock.patch("amora.manifest.list_models")
 def test_get_models_to_compile_when_a_model_stat_was_updated_and_hashes_are_different(
-    list_models: mock.MagicMock, sample_manifest: Manifest
+    sample_manifest: Manifest,
 ):
     """
     Case:
@@ -240,11 +241,6 @@ def test_get_models_to_compile_when_a_model_stat_was_updated_and_hashes_are_diff
         recompile the model.
     """
 
-    list_models.return_value = [
-        (Steps, Steps.path()),
-        (Health, Health.path()),
-    ]
-
     new_manifest = deepcopy(sample_manifest)
     new_manifest.models["amora-data-build-tool.amora.steps"].stat = 2665147859.6682658
     new_manifest.models[
@@ -257,12 +253,11 @@ def test_get_models_to_compile_when_a_model_stat_was_updated_and_hashes_are_diff
     models_to_compile = new_manifest.get_models_to_compile(sample_manifest)
 
     assert len(models_to_compile) == 1
-    assert models_to_compile == {(Steps, Steps.path())}
+    assert _compiled(models_to_compile) == {(Steps.unique_name(), Steps.path())}
 
 
-@mock.patch("amora.manifest.list_models")
 def test_get_models_to_compile_return_all_dependencies_from_a_changed_model(
-    list_models: mock.MagicMock, sample_manifest: Manifest
+    sample_manifest: Manifest,
 ):
     """
     Case:
@@ -271,17 +266,6 @@ def test_get_models_to_compile_return_all_dependencies_from_a_changed_model(
         recompile the model and its dependencies.
     """
 
-    expected_models_to_compile = [
-        (amora_model_for_path(Steps.path()), Steps.path()),
-        (amora_model_for_path(Health.path()), Health.path()),
-        (
-            amora_model_for_path(StepCountBySource.path()),
-            StepCountBySource.path(),
-        ),
-    ]
-
-    list_models.return_value = expected_models_to_compile
-
     sample_manifest.models["amora-data-build-tool.amora.health"].deps = [
         "amora-data-build-tool.amora.steps",
         "amora-data-build-tool.amora.step_count_by_source",
@@ -293,7 +277,7 @@ def test_get_models_to_compile_return_all_dependencies_from_a_changed_model(
         stat=1664199318.9035711,
         size=4714,
         hash="3df3f2761805fb1ece39581f21fbaf0a",
-        path="amora-data-build-tool/examples/amora_project/models/steps_count_by_source.py",
+        path=StepCountBySource.path().as_posix(),
         deps=[],
     )
     new_manifest = deepcopy(sample_manifest)
@@ -311,4 +295,18 @@ def test_get_models_to_compile_return_all_dependencies_from_a_changed_model(
             "amora-data-build-tool.amora.steps",
             "amora-data-build-tool.amora.step_count_by_source",
         ]
-    ) == sorted(model.unique_name() for model, _ in expected_models_to_compile)
+    ) == sorted(model.unique_name() for model, _ in models_to_compile)
+
+
+def test_get_models_to_compile_doesnt_import_unchanged_models(
+    sample_manifest: Manifest,
+):
+    new_manifest = deepcopy(sample_manifest)
+    new_manifest.models["amora-data-build-tool.amora.steps"].size = 4714
+
+    with mock.patch(
+        "amora.manifest.amora_model_for_path", wraps=amora_model_for_path
+    ) as model_for_path:
+        new_manifest.get_models_to_compile(sample_manifest)
+
+    model_for_path.assert_called_once_with(Steps.path())
@@ -4,24 +4,41 @@ from uuid import uuid4
 
 import pytest
 from google.api_core.exceptions import BadRequest
-from google.cloud.bigquery import Client
+from google.cloud.bigquery import (
+    Client,
+    CreateDisposition,
+    Table,
+    TimePartitioning,
+    WriteDisposition,
+)
 from pytz import UTC
 from sqlalchemy import TIMESTAMP, DateTime, Integer
 
 from amora.compilation import remove_compiled_files
 from amora.config import settings
 from amora.dag import DependencyDAG
-from amora.materialization import Task, materialize
+from amora.materialization import (
+    STAGING_TABLE_SUFFIX,
+    MaterializationState,
+    Task,
+    materialize,
+    materialize_task,
+    plan,
+    stale_models,
+)
 from amora.models import (
     AmoraModel,
     Field,
+    IncrementalConfig,
     Label,
     MaterializationTypes,
     ModelConfig,
     PartitionConfig,
 )
-from amora.providers.bigquery import schema_for_model
+from amora.providers.bigquery import estimated_query_cost_in_usd, schema_for_model
 
+from tests.fake_bigquery import FakeClient
+from tests.models.health import Health
 from tests.models.heart_agg import HeartRateAgg
 from tests.models.heart_rate import HeartRate
 from tests.models.steps import Steps
@@ -81,10 +98,32 @@ class TableModelByrange(AmoraModel):
     created_at: datetime = Field(DateTime, primary_key=True)
 
 
+class IncrementalModel(AmoraModel):
+    __tablename__override__ = uuid4().hex
+    __model_config__ = ModelConfig(
+        materialized=MaterializationTypes.incremental,
+        partition_by=PartitionConfig(
+            field="created_at", data_type="TIMESTAMP", granularity="day"
+        ),
+        incremental=IncrementalConfig(watermark="updated_at"),
+    )
+
+    id: int = Field(Integer, primary_key=True)
+    created_at: datetime = Field(DateTime)
+    updated_at: datetime = Field(DateTime)
+
+
 def setup_function(module):
     remove_compiled_files()
 
 
+@pytest.fixture
+def client():
+    client = FakeClient()
+    with patch("amora.materialization.get_client", return_value=client):
+        yield client
+
+
 def test_it_creates_a_task_from_a_target_file_path():
     target_path = HeartRate.target_path()
     target_path.write_text("SELECT 1")
@@ -118,78 +157,174 @@ def test_dependency_dags_is_iterable_and_topologicaly_sorted():
     )
 
 
-@patch("amora.materialization.Client", spec=Client)
-def test_materialize_deletes_table(Client: MagicMock):
-    client = Client.return_value
+def test_materialize_creates_table(client: FakeClient):
+    result = materialize(
+        sql="SELECT 1",
+        model_name=TableModelByDay.unique_name(),
+        config=TableModelByDay.__model_config__,
+    )
+
+    assert len(client.queries) == 1
+
+    sql, job_config = client.queries[0]
+    assert sql == "SELECT 1"
+    assert str(job_config.destination) == (
+        TableModelByDay.unique_name() + STAGING_TABLE_SUFFIX
+    )
+    assert job_config.write_disposition == WriteDisposition.WRITE_APPEND
+    assert job_config.create_disposition == CreateDisposition.CREATE_NEVER
+
+    assert list(client.tables) == [TableModelByDay.unique_name()]
+    assert result is not None
+    assert result.destination_table.table_type == "TABLE"
+    assert result.destination_table.schema == schema_for_model(TableModelByDay)
+    assert result.total_bytes_billed == 42
+
+
+def test_materialize_replaces_table_without_deleting_it(client: FakeClient):
     materialize(
         sql="SELECT 1",
         model_name=TableModelByDay.unique_name(),
         config=TableModelByDay.__model_config__,
     )
+    client.calls.clear()
 
-    assert client.delete_table.call_count == 1
-    assert client.delete_table.call_args_list == [
-        call(TableModelByDay.unique_name(), not_found_ok=True)
+    materialize(
+        sql="SELECT 2",
+        model_name=TableModelByDay.unique_name(),
+        config=TableModelByDay.__model_config__,
+    )
+
+    assert TableModelByDay.unique_name() not in client.deleted
+    assert client.calls == [
+        "get_table",
+        "delete_table",
+        "create_table",
+        "query",
+        "copy_table",
+        "delete_table",
+        "update_table",
     ]
 
 
-@patch("amora.materialization.Client", spec=Client)
-def test_materialize_deletes_view(Client: MagicMock):
-    client = Client.return_value
+def test_materialize_updates_table_clustering_in_place(client: FakeClient):
+    table = Table(TableModelByDay.unique_name())
+    table.time_partitioning = TimePartitioning(field="created_at", type_="DAY")
+    table.clustering_fields = ["y"]
+    client.add_table(table)
+
     materialize(
         sql="SELECT 1",
-        model_name=ViewModel.unique_name(),
-        config=ViewModel.__model_config__,
+        model_name=TableModelByDay.unique_name(),
+        config=TableModelByDay.__model_config__,
     )
 
-    assert client.delete_table.call_count == 1
-    assert client.delete_table.call_args_list == [
-        call(ViewModel.unique_name(), not_found_ok=True)
+    assert TableModelByDay.unique_name() not in client.deleted
+    assert client.tables[TableModelByDay.unique_name()].clustering_fields == [
+        "x",
+        "y",
     ]
 
 
-@patch("amora.materialization.Client", spec=Client)
-def test_materialize_creates_view(Client: MagicMock):
-    client = Client.return_value
+def test_materialize_swaps_a_staging_table_when_partitioning_changes(
+    client: FakeClient,
+):
+    table = Table(TableModelByDay.unique_name())
+    table.time_partitioning = TimePartitioning(field="created_at", type_="MONTH")
+    client.add_table(table)
+
+    result = materialize(
+        sql="SELECT 1",
+        model_name=TableModelByDay.unique_name(),
+        config=TableModelByDay.__model_config__,
+    )
+
+    _sql, job_config = client.queries[0]
+    assert str(job_config.destination) == (
+        TableModelByDay.unique_name() + STAGING_TABLE_SUFFIX
+    )
+    replace_sql, _job_config = client.queries[1]
+    assert replace_sql.startswith(
+        f"CREATE OR REPLACE TABLE `{TableModelByDay.unique_name()}` COPY"
+    )
+    assert TableModelByDay.unique_name() not in client.deleted
+    assert "copy_table" not in client.calls
+    assert list(client.tables) == [TableModelByDay.unique_name()]
+    assert result is not None
+    assert result.destination_table.time_partitioning.type_ == "DAY"
+
+
+def test_materialize_keeps_the_table_when_the_query_fails(client: FakeClient):
+    table = Table(TableModelByDay.unique_name())
+    table.time_partitioning = TimePartitioning(field="created_at", type_="MONTH")
+    client.add_table(table)
+
+    with patch.object(
+        client, "query", side_effect=BadRequest("Invalid value for type: INT64")
+    ):
+        with pytest.raises(ValueError, match=TableModelByDay.unique_name()):
+            materialize(
+                sql="SELECT 'a' AS x",
+                model_name=TableModelByDay.unique_name(),
+                config=TableModelByDay.__model_config__,
+            )
+
+    assert list(client.tables) == [TableModelByDay.unique_name()]
+    assert client.tables[TableModelByDay.unique_name()].time_partitioning.type_ == (
+        "MONTH"
+    )
 
+
+def test_materialize_creates_view(client: FakeClient):
     materialize(
         sql="SELECT 1",
         model_name=ViewModel.unique_name(),
         config=ViewModel.__model_config__,
     )
-    assert client.create_table.call_count == 1
 
-    view = client.create_table.call_args.args[0]
+    view = client.tables[ViewModel.unique_name()]
+    assert view.table_type == "VIEW"
     assert view.view_query == "SELECT 1"
     assert view.description == ViewModel.__model_config__.description
     assert view.labels == {"freshness": "daily"}
 
 
-@patch("amora.materialization.Client", spec=Client)
-def test_materialize_creates_table(Client: MagicMock):
-    client = Client.return_value
+def test_materialize_replaces_view_without_deleting_it(client: FakeClient):
+    view = Table(ViewModel.unique_name())
+    view.view_query = "SELECT 0"
+    client.add_table(view)
 
     materialize(
         sql="SELECT 1",
-        model_name=TableModelByDay.unique_name(),
-        config=TableModelByDay.__model_config__,
+        model_name=ViewModel.unique_name(),
+        config=ViewModel.__model_config__,
     )
 
-    assert client.query.call_count == 1
-    assert client.query.call_args_list == [call("SELECT 1", job_config=ANY)]
+    assert client.calls == ["get_table", "update_table"]
+    assert client.tables[ViewModel.unique_name()].view_query == "SELECT 1"
 
 
-@patch("amora.materialization.Client", spec=Client)
-def test_materialize_partition_table_by_range(Client: MagicMock):
-    client = Client.return_value
+def test_materialize_replaces_a_table_with_a_view(client: FakeClient):
+    client.add_table(Table(ViewModel.unique_name()))
 
+    materialize(
+        sql="SELECT 1",
+        model_name=ViewModel.unique_name(),
+        config=ViewModel.__model_config__,
+    )
+
+    assert client.calls == ["get_table", "delete_table", "create_table"]
+    assert client.tables[ViewModel.unique_name()].table_type == "VIEW"
+
+
+def test_materialize_partition_table_by_range(client: FakeClient):
     materialize(
         sql="SELECT 1",
         model_name=TableModelByrange.unique_name(),
         config=TableModelByrange.__model_config__,
     )
 
-    table = client.create_table.call_args.args[0]
+    table = client.tables[TableModelByrange.unique_name()]
     partition_config = table.range_partitioning
 
     assert partition_config.field == "x"
@@ -197,51 +332,41 @@ def test_materialize_partition_table_by_range(Client: MagicMock):
     assert partition_config.range_.end == 10
 
 
-@patch("amora.materialization.Client", spec=Client)
-def test_materialize_partition_table_by_time(Client: MagicMock):
-    client = Client.return_value
-
+def test_materialize_partition_table_by_time(client: FakeClient):
     materialize(
         sql="SELECT 1",
         model_name=TableModelByDay.unique_name(),
         config=TableModelByDay.__model_config__,
     )
 
-    table = client.create_table.call_args.args[0]
+    table = client.tables[TableModelByDay.unique_name()]
     partition_config = table.time_partitioning
 
     assert partition_config.field == "created_at"
     assert partition_config.type_ == "DAY"
 
 
-@patch("amora.materialization.Client", spec=Client)
-def test_materialize_cluster_table(Client: MagicMock):
-    client = Client.return_value
-
+def test_materialize_cluster_table(client: FakeClient):
     materialize(
         sql="SELECT 1",
         model_name=TableModelByDay.unique_name(),
         config=TableModelByDay.__model_config__,
     )
 
-    table = client.create_table.call_args.args[0]
+    table = client.tables[TableModelByDay.unique_name()]
     clustering_fields = table.clustering_fields
 
     assert clustering_fields == ["x", "y"]
 
 
-@patch("amora.materialization.Client", spec=Client)
-def test_materialize_update_table_metadata(Client: MagicMock):
-    client = Client.return_value
-
+def test_materialize_update_table_metadata(client: FakeClient):
     materialize(
         sql="SELECT 1",
         model_name=TableModelByDay.unique_name(),
         config=TableModelByDay.__model_config__,
     )
 
-    assert client.create_table.call_count == 1
-    table = client.create_table.call_args.args[0]
+    table = client.tables[TableModelByDay.unique_name()]
 
     assert table.description == TableModelByDay.__model_config__.description
     assert table.labels == TableModelByDay.__model_config__.labels_dict
@@ -249,29 +374,25 @@ def test_materialize_update_table_metadata(Client: MagicMock):
     assert table.expires == TableModelByDay.__model_config__.hours_to_expire
 
 
-@patch("amora.materialization.Client", spec=Client)
-def test_materialize_with_expiration_table(Client: MagicMock):
-    client = Client.return_value
+def test_materialize_with_expiration_table(client: FakeClient):
     materialize(
         sql="SELECT 1",
         model_name=TableModelByrange.unique_name(),
         config=TableModelByrange.__model_config__,
     )
 
-    table = client.create_table.call_args.args[0]
+    table = client.tables[TableModelByrange.unique_name()]
     assert table.expires > datetime.now(UTC)
 
 
-@patch("amora.materialization.Client", spec=Client)
-def test_materialize_with_expiration_table_is_null(Client: MagicMock):
-    client = Client.return_value
+def test_materialize_with_expiration_table_is_null(client: FakeClient):
     materialize(
         sql="SELECT 1",
         model_name=TableModelByDay.unique_name(),
         config=TableModelByDay.__model_config__,
     )
 
-    table = client.create_table.call_args.args[0]
+    table = client.tables[TableModelByDay.unique_name()]
     assert table.expires is None
 
 
@@ -290,8 +411,8 @@ def test_materialize_invalid_materialization():
         )
 
 
-@patch("amora.materialization.Client", spec=Client)
-def test_materialize_as_ephemeral(Client: MagicMock):
+@patch("amora.materialization.get_client")
+def test_materialize_as_ephemeral(get_client: MagicMock):
     class EphemeralModel(AmoraModel):
         __model_config__ = ModelConfig(
             materialized=MaterializationTypes.ephemeral,
@@ -309,19 +430,19 @@ def test_materialize_as_ephemeral(Client: MagicMock):
         )
         is None
     )
-    assert not Client.called
+    assert not get_client.called
 
 
 def test_materialize_with_error_on_source_query():
     with patch(
-        "amora.materialization.Client",
+        "amora.materialization.get_client",
         return_value=MagicMock(
             query=MagicMock(
                 side_effect=BadRequest("Resources exceeded during query execution")
             ),
         ),
-    ) as Client:
-        client = Client.return_value
+    ) as get_client:
+        client = get_client.return_value
 
         with pytest.raises(ValueError):
             materialize(
@@ -331,3 +452,211 @@ def test_materialize_with_error_on_source_query():
             )
 
         assert client.query.call_args_list == [call("SELECT 1", job_config=ANY)]
+
+
+def test_materialize_with_error_on_table_metadata_update(client: FakeClient):
+    with patch.object(
+        client, "update_table", side_effect=BadRequest("Invalid schema update")
+    ):
+        with pytest.raises(ValueError, match=TableModelByDay.unique_name()):
+            materialize(
+                sql="SELECT 1",
+                model_name=TableModelByDay.unique_name(),
+                config=TableModelByDay.__model_config__,
+            )
+
+
+@patch("amora.materialization.get_client")
+def test_materialize_with_client(get_client: MagicMock):
+    client = MagicMock(spec=Client)
+
+    materialize(
+        sql="SELECT 1",
+        model_name=ViewModel.unique_name(),
+        config=ViewModel.__model_config__,
+        client=client,
+    )
+
+    get_client.assert_not_called()
+    assert client.create_table.call_count == 1
+
+
+def test_materialize_incremental_builds_the_table_on_the_first_run(client: FakeClient):
+    result = materialize(
+        sql="SELECT 1",
+        model_name=IncrementalModel.unique_name(),
+        config=IncrementalModel.__model_config__,
+    )
+
+    _sql, job_config = client.queries[0]
+    assert str(job_config.destination) == (
+        IncrementalModel.unique_name() + STAGING_TABLE_SUFFIX
+    )
+    assert "copy_table" in client.calls
+    assert result is not None
+    assert not result.incremental
+
+
+def test_materialize_incremental_inserts_rows_newer_than_the_watermark(
+    client: FakeClient,
+):
+    materialize(
+        sql="SELECT 1",
+        model_name=IncrementalModel.unique_name(),
+        config=IncrementalModel.__model_config__,
+    )
+    client.queries.clear()
+
+    result = materialize(
+        sql="SELECT 1",
+        model_name=IncrementalModel.unique_name(),
+        config=IncrementalModel.__model_config__,
+    )
+
+    sql, job_config = client.queries[0]
+    assert job_config.destination is None
+    assert sql == (
+        f"DECLARE amora_watermark DEFAULT "
+        f"(SELECT MAX(`updated_at`) FROM `{IncrementalModel.unique_name()}`);\n"
+        f"INSERT INTO `{IncrementalModel.unique_name()}` "
+        f"(`id`, `created_at`, `updated_at`)\n"
+        f"SELECT `id`, `created_at`, `updated_at` FROM (SELECT * FROM (\nSELECT 1\n) "
+        f"WHERE amora_watermark IS NULL OR `updated_at` > amora_watermark)"
+    )
+    assert result is not None
+    assert result.incremental
+    assert result.total_bytes_processed == 42
+    assert "42 Bytes" in str(result)
+
+
+def test_materialize_incremental_merges_rows_by_unique_key(client: FakeClient):
+    config = ModelConfig(
+        materialized=MaterializationTypes.incremental,
+        partition_by=IncrementalModel.__model_config__.partition_by,
+        incremental=IncrementalConfig(
+            watermark="updated_at", unique_key=["id"], prune_partitions=True
+        ),
+    )
+    for _ in range(2):
+        materialize(
+            sql="SELECT 1", model_name=IncrementalModel.unique_name(), config=config
+        )
+
+    sql, _job_config = client.queries[-1]
+    assert f"MERGE `{IncrementalModel.unique_name()}` AS target" in sql
+    assert (
+        "ON target.`id` = source.`id` "
+        "AND target.`created_at` >= amora_partition_lower_bound"
+    ) in sql
+    assert "WHEN MATCHED THEN UPDATE SET `id` = source.`id`" in sql
+
+
+def test_materialize_incremental_without_incremental_config():
+    with pytest.raises(ValueError):
+        materialize(
+            sql="SELECT 1",
+            model_name=IncrementalModel.unique_name(),
+            config=ModelConfig(materialized=MaterializationTypes.incremental),
+        )
+
+
+def test_plan_aggregates_bytes_by_model_and_dag_branch():
+    tasks = [
+        Task(sql_stmt="SELECT 1", model=model, target_file_path=model.target_path())
+        for model in [HeartRate, HeartRateAgg, Steps]
+    ]
+    dag = DependencyDAG.from_tasks(tasks)
+    bytes_by_model = {HeartRate: 300, Steps: 100}
+
+    with patch(
+        "amora.materialization.dry_run_queries",
+        side_effect=lambda queries: {
+            model: MagicMock(total_bytes=bytes_by_model[model]) for model in queries
+        },
+    ) as dry_run_queries:
+        materialization_plan = plan(tasks, dag, max_bytes=200)
+
+    # Views aren't dry run
+    assert set(dry_run_queries.call_args.args[0]) == {HeartRate, Steps}
+
+    heart_rate_agg = materialization_plan.items[HeartRateAgg.unique_name()]
+    assert heart_rate_agg.total_bytes == 0
+    assert heart_rate_agg.branch_bytes == 300
+    assert heart_rate_agg.branch_estimated_cost == estimated_query_cost_in_usd(300)
+
+    assert materialization_plan.total_bytes == 400
+    assert materialization_plan.over_budget == [HeartRate.unique_name()]
+
+
+def test_plan_flags_models_of_unknown_cost_as_over_budget():
+    tasks = [
+        Task(sql_stmt="SELECT 1", model=model, target_file_path=model.target_path())
+        for model in [HeartRate, Steps]
+    ]
+    dag = DependencyDAG.from_tasks(tasks)
+    dry_run_results = {HeartRate: None, Steps: MagicMock(total_bytes=100)}
+
+    with patch("amora.materialization.dry_run_queries", return_value=dry_run_results):
+        assert plan(tasks, dag).over_budget == []
+        materialization_plan = plan(tasks, dag, max_bytes=200)
+
+    assert materialization_plan.unknown_bytes == [HeartRate.unique_name()]
+    assert materialization_plan.over_budget == [HeartRate.unique_name()]
+
+
+def test_stale_models_only_returns_the_changed_subgraph(client: FakeClient):
+    def tasks_for(heart_rate_sql: str):
+        return [
+            Task(sql_stmt=sql, model=model, target_file_path=model.target_path())
+            for model, sql in [
+                (HeartRate, heart_rate_sql),
+                (HeartRateAgg, "SELECT 1"),
+                (Steps, "SELECT 1"),
+            ]
+        ]
+
+    def sql_stmts(tasks):
+        return {task.model.unique_name(): task.sql_stmt for task in tasks}
+
+    tasks = tasks_for(heart_rate_sql="SELECT 1")
+    dag = DependencyDAG.from_tasks(tasks)
+    state = MaterializationState()
+    all_models = {task.model.unique_name() for task in tasks}
+
+    assert stale_models(sql_stmts(tasks), dag, state) == all_models
+
+    for model_name in dag:
+        for task in tasks:
+            if task.model.unique_name() == model_name:
+                materialize_task(task, state)
+
+    assert stale_models(sql_stmts(tasks), dag, state) == set()
+
+    # A change to the compiled SQL makes the model and its downstream models stale
+    changed_tasks = tasks_for(heart_rate_sql="SELECT 2")
+    assert stale_models(sql_stmts(changed_tasks), dag, state) == {
+        HeartRate.unique_name(),
+        HeartRateAgg.unique_name(),
+    }
+
+    # So does a change to the model table, or to a table upstream of it
+    client.update_table(Table(Steps.unique_name()), ["description"])
+    assert stale_models(sql_stmts(tasks), dag, state) == {Steps.unique_name()}
+
+    client.add_table(Table(Health.unique_name()))
+    assert stale_models(sql_stmts(tasks), dag, state) == all_models
+
+
+def test_materialization_state_save_and_load(tmp_path):
+    state = MaterializationState()
+    task = Task(sql_stmt="SELECT 1", model=Steps, target_file_path=Steps.target_path())
+
+    with patch("amora.materialization.get_client", return_value=FakeClient()):
+        materialize_task(task, state)
+
+    with patch.object(
+        settings, "MATERIALIZATION_STATE_PATH", tmp_path.joinpath("state.json")
+    ):
+        assert MaterializationState.load() == MaterializationState()
+        state.save()
+        assert MaterializationState.load() == state
@@ -1,16 +1,30 @@
 from datetime import datetime
 from pathlib import Path
+from unittest.mock import MagicMock, patch
 from uuid import uuid4
 
 import pandas as pd
+import pyarrow as pa
 import pytest
 from sqlalchemy import TIMESTAMP, Float, Integer, String
+from sqlalchemy.sql import Select
 
+from amora.compilation import compile_statement
+from amora.config import SummaryModes, settings
 from amora.feature_store.decorators import feature_view
-from amora.meta_queries import summarize
+from amora.meta_queries import (
+    SUMMARY_STATS,
+    _per_column_statement,
+    _summary_dataframe,
+    _summary_statement,
+    summarize,
+    summarize_models,
+)
 from amora.models import AmoraModel, Field, MaterializationTypes, ModelConfig
 from amora.providers.bigquery import cte_from_dataframe
 
+from tests.models.steps import Steps
+
 
 @pytest.fixture(scope="module")
 def step_count_by_source_100_rows() -> pd.DataFrame:
@@ -265,3 +279,127 @@ def test_summarize_sourceless_ephemeral_model():
 
     with pytest.raises(ValueError):
         summarize(SourcelessModel)
+
+
+def test_summary_statement_scans_the_model_once(simple_model):
+    statement = _summary_statement(simple_model)
+    sql = compile_statement(statement)
+
+    assert isinstance(statement, Select)
+    assert len(statement.get_final_froms()) == 1
+    assert sql.count("count(DISTINCT") == len(simple_model.columns())
+    assert "approx_count_distinct" not in sql
+
+
+def test_summary_statement_with_approximate_unique_counts(simple_model):
+    sql = compile_statement(_summary_statement(simple_model, SummaryModes.approximate))
+
+    assert "count(DISTINCT" not in sql
+    assert sql.count("approx_count_distinct") == len(simple_model.columns())
+
+
+def test_summarize_models_in_a_single_query(simple_model, feature_view_model):
+    def fake_run(statement):
+        columns = statement.selected_columns.keys()
+        assert any(name.startswith("m0_") for name in columns)
+        assert any(name.startswith("m1_") for name in columns)
+        run_result = MagicMock(total_bytes=100, total_bytes_processed=20)
+        run_result.to_arrow.return_value = pa.Table.from_pylist(
+            [{name: 1 for name in columns}]
+        )
+        return run_result
+
+    def fake_dry_run_queries(queries):
+        assert all("UNION ALL" in query for query in queries.values())
+        return {
+            model: MagicMock(total_bytes=total_bytes)
+            for model, total_bytes in zip(queries, [80, 60])
+        }
+
+    with patch("amora.meta_queries.run", side_effect=fake_run) as run, patch(
+        "amora.meta_queries.dry_run_queries", side_effect=fake_dry_run_queries
+    ) as dry_run_queries:
+        result = summarize_models([simple_model, feature_view_model])
+
+    run.assert_called_once()
+    assert list(dry_run_queries.call_args.args[0]) == [
+        simple_model,
+        feature_view_model,
+    ]
+    assert result.total_bytes == 100
+    assert result.bytes_saved == 120
+    assert list(result.summaries) == [
+        simple_model.unique_name(),
+        feature_view_model.unique_name(),
+    ]
+    summary = result.summaries[feature_view_model.unique_name()]
+    assert summary.to_dict(orient="records")[0] == {
+        "column_name": "value_avg",
+        "column_type": "FLOAT",
+        "min": 1,
+        "max": 1,
+        "unique_count": 1,
+        "avg": 1,
+        "stddev": 1,
+        "null_percentage": 1,
+        "is_fv_feature": True,
+        "is_fv_entity": False,
+        "is_fv_event_timestamp": False,
+    }
+
+
+def test_summarize_models_without_dry_run_of_a_model(simple_model, feature_view_model):
+    run_result = MagicMock(total_bytes=100, total_bytes_processed=20)
+    run_result.to_arrow.return_value = pa.Table.from_pylist([{"m0_c0_min": 1}])
+
+    with patch("amora.meta_queries.run", return_value=run_result), patch(
+        "amora.meta_queries.dry_run_queries",
+        return_value={
+            simple_model: MagicMock(total_bytes=80),
+            feature_view_model: None,
+        },
+    ):
+        result = summarize_models([simple_model, feature_view_model])
+
+    assert result.bytes_saved is None
+
+
+def test_per_column_statement_selects_each_column_separately(simple_model):
+    statement = _per_column_statement(simple_model)
+
+    assert len(statement.selects) == len(simple_model.columns())
+    for select in statement.selects:
+        assert len(select.selected_columns) == len(SUMMARY_STATS)
+
+
+def test_sampled_summary_statement_reads_a_sample_of_the_recent_partitions():
+    with patch.object(settings, "SUMMARY_SAMPLE_PERCENTAGE", 5), patch.object(
+        settings, "SUMMARY_SAMPLE_PARTITION_DAYS", 7
+    ):
+        sql = compile_statement(_summary_statement(Steps, SummaryModes.sampled))
+
+    assert "TABLESAMPLE system(5 PERCENT)" in sql
+    assert "timestamp_sub(CURRENT_TIMESTAMP, INTERVAL 7 DAY)" in sql
+    assert "approx_count_distinct" in sql
+    assert "AS `row_count`" in sql
+
+
+def test_sampled_summary_of_a_model_that_cant_be_sampled(simple_model):
+    sampled = compile_statement(_summary_statement(simple_model, SummaryModes.sampled))
+    approximate = compile_statement(
+        _summary_statement(simple_model, SummaryModes.approximate)
+    )
+
+    assert sampled == approximate
+
+
+def test_sampled_summary_error_bounds():
+    row = {"row_count": 400, "c3_stddev": 10.0, "c3_null_percentage": 50.0}
+    summary = _summary_dataframe(Steps, row, SummaryModes.sampled)
+
+    value = summary[summary.column_name == "value"].to_dict(orient="records")[0]
+    assert value["avg_error_bound"] == pytest.approx(0.98)
+    assert value["null_percentage_error_bound"] == pytest.approx(4.9)
+
+    exact_summary = _summary_dataframe(Steps, row, SummaryModes.exact)
+    assert "avg_error_bound" not in exact_summary.columns
@@ -1,13 +1,19 @@
+import importlib
+import sys
 from pathlib import Path
+from tempfile import NamedTemporaryFile
+from unittest import mock
 
 import pytest
 
 from amora.compilation import compile_statement
+from amora.config import settings
 from amora.models import (
     AmoraModel,
     Field,
     Label,
     ModelConfig,
+    ModelIndex,
     amora_model_for_name,
     amora_model_for_path,
     amora_model_for_target_path,
@@ -150,3 +156,84 @@ def test_without_owner():
         id: int = Field(primary_key=True)
 
     assert ModelWithoutOwner.owner() == ""
+
+
+def test_ModelIndex_refresh():
+    index = ModelIndex.empty()
+
+    assert index.refresh()
+
+    steps = index.entry_for_name(Steps.unique_name())
+    assert steps is not None
+    assert steps.path == Steps.path().as_posix()
+    assert steps.dependencies == [Health.unique_name()]
+    assert steps.labels == ["freshness:daily"]
+    assert steps.materialized == "table"
+    assert steps.has_source
+
+    health = index.entry_for_name(Health.unique_name())
+    assert health is not None
+    assert not health.has_source
+
+
+def test_ModelIndex_refresh_without_changes_doesnt_import_models():
+    index = ModelIndex.empty()
+    index.refresh()
+
+    with mock.patch(
+        "amora.models.amora_model_for_path", wraps=amora_model_for_path
+    ) as model_for_path:
+        assert not index.refresh()
+
+    model_for_path.assert_not_called()
+
+
+def test_ModelIndex_refresh_only_imports_changed_files():
+    index = ModelIndex.empty()
+    index.refresh()
+    entry = index.entry_for_name(Steps.unique_name())
+    entry.mtime_ns = 0
+
+    with mock.patch(
+        "amora.models.amora_model_for_path", wraps=amora_model_for_path
+    ) as model_for_path:
+        assert index.refresh()
+        model_for_path.assert_not_called()
+
+        entry.mtime_ns = 0
+        entry.checksum = "a-different-checksum"
+        assert index.refresh()
+
+    model_for_path.assert_called_once_with(Steps.path())
+
+
+def test_ModelIndex_refresh_reloads_changed_files():
+    index = ModelIndex.empty()
+    index.refresh()
+    entry = index.entry_for_name(Steps.unique_name())
+    entry.mtime_ns = 0
+    entry.checksum = "a-different-checksum"
+    module = sys.modules[amora_model_for_path(Steps.path()).__module__]
+
+    with mock.patch("amora.models.importlib.reload", wraps=importlib.reload) as reload:
+        assert index.refresh()
+
+    reload.assert_called_once_with(module)
+    assert index.entry_for_name(Steps.unique_name()).checksum != "a-different-checksum"
+
+
+def test_ModelIndex_save_and_load():
+    index = ModelIndex.empty()
+    index.refresh()
+
+    with NamedTemporaryFile(suffix=".json") as index_file, mock.patch.object(
+        settings, "MODELS_INDEX_PATH", Path(index_file.name)
+    ):
+        index.save()
+
+        assert ModelIndex.load() == index
+
+
+def test_ModelIndex_load_not_found():
+    with mock.patch.object(settings, "MODELS_INDEX_PATH", Path("not-a-real-file")):
+        assert ModelIndex.load() == ModelIndex.empty()
@@ -1,10 +1,19 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Iterator
 from unittest.mock import patch
 
 import pandas as pd
+import pyarrow as pa
 import pytest
 
 from amora import storage
-from amora.config import StorageCacheProviders, settings
+from amora.config import StorageCacheKeyModes, StorageCacheProviders, settings
 
 
 @pytest.fixture(scope="module")
@@ -96,3 +105,451 @@ def test_cache_decorator_can_be_disabled():
         cacheable_func()
 
         assert not CACHE.called
+
+
+@pytest.fixture()
+def memory_cache_key():
+    return storage.CacheKey(
+        func_module="test_storage",
+        func_name="test_MemoryCache",
+        func_checksum="checksum",
+        suffix="",
+    )
+
+
+def test_Cache_reads_from_memory_without_reading_parquet(memory_cache_key):
+    cache = storage.Cache()
+    df = pd.DataFrame([{"amora": 4, "storage": 2}])
+    cache[memory_cache_key] = df
+
+    with patch("amora.storage.pq.read_table") as read_table:
+        assert cache[memory_cache_key].equals(df)
+
+    read_table.assert_not_called()
+    assert cache.memory.stats.hits == 1
+
+
+def test_Cache_reads_parquet_when_evicted_from_memory(memory_cache_key):
+    cache = storage.Cache()
+    cache.memory = storage.MemoryCache(max_bytes=0)
+    df = pd.DataFrame([{"amora": 4, "storage": 2}])
+    cache[memory_cache_key] = df
+
+    assert cache.memory.stats.entries == 0
+    assert cache[memory_cache_key].equals(df)
+
+
+def test_MemoryCache_evicts_least_recently_used_entries():
+    a, b, c = (pa.table({"value": [i] * 100}) for i in range(3))
+    memory = storage.MemoryCache(max_bytes=a.nbytes * 2)
+
+    memory.put("a", a)
+    memory.put("b", b)
+    assert memory.get("a") == (a, False)
+    memory.put("c", c)
+
+    assert memory.get("b") == (None, False)
+    assert memory.get("a") == (a, False)
+    assert memory.get("c") == (c, False)
+    assert memory.stats == storage.MemoryCacheStats(
+        hits=3,
+        misses=1,
+        evictions=1,
+        evicted_bytes=b.nbytes,
+        size_bytes=a.nbytes + c.nbytes,
+        entries=2,
+    )
+
+
+def test_MemoryCache_doesnt_keep_entries_larger_than_the_budget():
+    table = pa.table({"value": list(range(100))})
+    memory = storage.MemoryCache(max_bytes=table.nbytes - 1)
+    memory.put("a", table)
+
+    assert memory.get("a") == (None, False)
+    assert memory.stats.size_bytes == 0
+
+
+def test_Cache_reloads_stale_memory_entries(memory_cache_key):
+    cache = storage.Cache()
+    cache.memory = storage.MemoryCache(max_age=-1)
+    df = pd.DataFrame([{"amora": 4, "storage": 2}])
+    cache[memory_cache_key] = df
+
+    with patch(
+        "amora.storage.pq.read_table", return_value=pa.Table.from_pandas(df)
+    ) as read_table:
+        assert cache[memory_cache_key].equals(df)
+
+    read_table.assert_called_once()
+    assert cache.memory.stats.stale_hits == 1
+
+
+def test_Cache_stale_while_revalidate(memory_cache_key):
+    cache = storage.Cache()
+    cache.memory = storage.MemoryCache(max_age=-1)
+    stale = pd.DataFrame([{"amora": 4, "storage": 2}])
+    fresh = pd.DataFrame([{"amora": 5, "storage": 3}])
+    cache[memory_cache_key] = stale
+
+    with patch.object(
+        settings, "STORAGE_MEMORY_CACHE_STALE_WHILE_REVALIDATE", True
+    ), patch("amora.storage.pq.read_table", return_value=pa.Table.from_pandas(fresh)):
+        assert cache[memory_cache_key].equals(stale)
+        cache._revalidation_executor.shutdown(wait=True)
+
+    table, _stale = cache.memory.get(str(memory_cache_key))
+    assert table.to_pandas().equals(fresh)
+
+
+@pytest.fixture()
+def local_cache():
+    with TemporaryDirectory() as cache_dir, patch.multiple(
+        settings,
+        STORAGE_CACHE_PROVIDER=StorageCacheProviders.local,
+        STORAGE_LOCAL_CACHE_PATH=Path(cache_dir),
+    ):
+        cache = storage.Cache()
+        yield cache
+        cache.flush()
+
+
+def _key(suffix: str, ttl=None) -> storage.CacheKey:
+    return storage.CacheKey(
+        func_module="test_storage",
+        func_name="test_gc",
+        func_checksum="checksum",
+        suffix=suffix,
+        ttl=ttl,
+    )
+
+
+def test_cache_key_ttl_isnt_part_of_the_key_name():
+    assert str(_key("a", ttl=timedelta(days=1))) == str(_key("a"))
+
+
+def test_Cache_expired_entries_are_missing(local_cache):
+    df = pd.DataFrame([{"amora": 4, "storage": 2}])
+    local_cache[_key("a", ttl=timedelta(days=1))] = df
+    local_cache[_key("b", ttl=timedelta(0))] = df
+
+    assert local_cache[_key("a", ttl=timedelta(days=1))].equals(df)
+    with pytest.raises(KeyError):
+        local_cache[_key("b", ttl=timedelta(0))]
+
+
+def test_Cache_expired_entries_are_missing_from_other_processes(local_cache):
+    key = _key("a", ttl=timedelta(hours=1))
+    local_cache[key] = pd.DataFrame([{"amora": 4, "storage": 2}])
+    two_hours_ago = time.time() - 2 * 60 * 60
+    os.utime(local_cache.filepath_for_key(key), (two_hours_ago, two_hours_ago))
+
+    local_cache.memory.clear()
+    with pytest.raises(KeyError):
+        local_cache[key]
+
+
+def test_Cache_index_records_the_entries(local_cache):
+    local_cache[_key("a", ttl=timedelta(days=1))] = pd.DataFrame([{"amora": 4}])
+    local_cache.flush()
+
+    index = storage.Cache()._load_index()
+    entry = index.entries[str(_key("a"))]
+    assert entry.size == os.path.getsize(local_cache.filepath_for_key(_key("a")))
+    assert entry.expires_at == pytest.approx(entry.created_at + 24 * 60 * 60)
+
+
+def test_Cache_gc_removes_expired_and_least_recently_used_entries(local_cache):
+    df = pd.DataFrame([{"amora": 4, "storage": 2}])
+    for suffix in ["a", "b", "c"]:
+        local_cache[_key(suffix)] = df
+    local_cache[_key("expired", ttl=timedelta(0))] = df
+    local_cache[_key("a")]
+
+    entry_size = local_cache._index().entries[str(_key("a"))].size
+    result = local_cache.gc(max_bytes=entry_size * 2)
+
+    assert result == storage.CacheGCResult(
+        removed_entries=2,
+        removed_bytes=entry_size * 2,
+        entries=2,
+        size_bytes=entry_size * 2,
+    )
+    assert sorted(storage.Cache()._load_index().entries) == [
+        str(_key("a")),
+        str(_key("c")),
+    ]
+    with pytest.raises(KeyError):
+        local_cache[_key("b")]
+    assert local_cache[_key("a")].equals(df)
+
+
+def test_Cache_gc_indexes_unknown_files(local_cache):
+    pd.DataFrame([{"amora": 4}]).to_parquet(local_cache.filepath_for_key(_key("a")))
+
+    assert local_cache.gc(max_age=timedelta(days=1)).entries == 1
+    assert local_cache.gc(max_age=timedelta(0)).removed_entries == 1
+    assert not os.path.exists(local_cache.filepath_for_key(_key("a")))
+
+
+def test_Cache_gc_dry_run(local_cache):
+    local_cache[_key("a")] = pd.DataFrame([{"amora": 4}])
+
+    assert local_cache.gc(max_bytes=0, dry_run=True).removed_entries == 1
+    assert os.path.exists(local_cache.filepath_for_key(_key("a")))
+
+
+def test_Cache_gc_on_flush_over_the_size_budget(local_cache):
+    with patch.object(settings, "STORAGE_CACHE_MAX_BYTES", 0), patch.object(
+        local_cache, "gc"
+    ) as gc:
+        local_cache[_key("a")] = pd.DataFrame([{"amora": 4}])
+        gc.assert_not_called()
+
+        local_cache.flush()
+
+    gc.assert_called_once_with()
+
+
+def test_Cache_index_is_flushed_in_the_background(local_cache):
+    index_path = Path(local_cache.root, local_cache.index_filename)
+
+    with patch.object(settings, "STORAGE_CACHE_INDEX_FLUSH_INTERVAL_SECONDS", 60):
+        for suffix in ["a", "b", "c"]:
+            local_cache[_key(suffix)] = pd.DataFrame([{"amora": 4}])
+    assert not index_path.exists()
+    local_cache.flush()
+
+    with patch.object(settings, "STORAGE_CACHE_INDEX_FLUSH_INTERVAL_SECONDS", 0):
+        local_cache[_key("d")] = pd.DataFrame([{"amora": 4}])
+
+    deadline = time.time() + 5
+    while str(_key("d")) not in storage.Cache()._load_index().entries:
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_Cache_flush_merges_the_entries_of_other_caches(local_cache):
+    other_cache = storage.Cache()
+    local_cache[_key("a")] = pd.DataFrame([{"amora": 4}])
+    other_cache[_key("b")] = pd.DataFrame([{"amora": 4}])
+
+    local_cache.flush()
+    other_cache.flush()
+
+    assert sorted(storage.Cache()._load_index().entries) == [
+        str(_key("a")),
+        str(_key("b")),
+    ]
+
+
+def test_Cache_gc_doesnt_lock_the_index_while_listing_files(local_cache):
+    df = pd.DataFrame([{"amora": 4}])
+    local_cache[_key("a")] = df
+    ls = local_cache.fs.ls
+
+    def ls_while_reading(*args, **kwargs):
+        reader = threading.Thread(target=local_cache.get_arrow, args=(_key("a"),))
+        reader.start()
+        reader.join(timeout=5)
+        assert not reader.is_alive()
+        local_cache[_key("b")] = df
+        return ls(*args, **kwargs)
+
+    with patch.object(type(local_cache.fs), "ls", side_effect=ls_while_reading):
+        local_cache.gc()
+
+    assert sorted(local_cache._index().entries) == [str(_key("a")), str(_key("b"))]
+    assert local_cache.root in local_cache._dirty_indexes
+
+
+def test_cache_decorator_coalesces_concurrent_misses(local_cache):
+    computing = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    @storage.cache()
+    def cacheable_func():
+        calls.append(1)
+        computing.set()
+        release.wait(timeout=10)
+        return pd.DataFrame([{"amora": 4, "storage": 2}])
+
+    with patch.object(settings, "STORAGE_CACHE_ENABLED", True), patch.object(
+        storage, "CACHE", local_cache
+    ), ThreadPoolExecutor(max_workers=4) as executor:
+        leader = executor.submit(cacheable_func)
+        computing.wait(timeout=10)
+        followers = [executor.submit(cacheable_func) for _ in range(3)]
+        release.set()
+
+        results = [leader.result(), *(f.result() for f in followers)]
+
+    assert len(calls) == 1
+    assert all(result.equals(results[0]) for result in results)
+
+
+def test_Cache_get_or_compute_shares_exceptions_without_caching_them(local_cache):
+    computing = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        computing.set()
+        release.wait(timeout=10)
+        raise ValueError("Query failed")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(local_cache.get_or_compute, _key("a"), compute)
+        computing.wait(timeout=10)
+        follower = executor.submit(local_cache.get_or_compute, _key("a"), compute)
+        release.set()
+
+        for future in (leader, follower):
+            with pytest.raises(ValueError, match="Query failed"):
+                future.result()
+
+    df = pd.DataFrame([{"amora": 4}])
+    assert local_cache.get_or_compute(_key("a"), lambda: df).equals(df)
+
+
+def test_Cache_get_or_compute_serializes_processes_on_a_file_lock(local_cache):
+    # Each `Cache` has its own in-process futures, as if on different processes
+    other_process_cache = storage.Cache()
+    computing = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        computing.set()
+        release.wait(timeout=10)
+        return pd.DataFrame([{"amora": 4}])
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        leader = executor.submit(local_cache.get_or_compute, _key("a"), compute)
+        computing.wait(timeout=10)
+        follower = executor.submit(
+            other_process_cache.get_or_compute, _key("a"), compute
+        )
+        release.set()
+
+        assert follower.result().equals(leader.result())
+
+    assert len(calls) == 1
+
+
+def test_Cache_writes_are_atomic(local_cache):
+    with patch("amora.storage.os.replace", wraps=os.replace) as replace:
+        local_cache[_key("a")] = pd.DataFrame([{"amora": 4}])
+        local_cache.flush()
+
+    path = local_cache.filepath_for_key(_key("a"))
+    assert path in [call.args[1] for call in replace.call_args_list]
+    assert sorted(os.listdir(settings.STORAGE_LOCAL_CACHE_PATH)) == [
+        f".{local_cache.index_filename}.lock",
+        local_cache.index_filename,
+        os.path.basename(path),
+    ]
+
+
+def test_Cache_with_arrow_tables(local_cache):
+    table = pa.table({"amora": [4], "storage": [2]})
+    local_cache[_key("a")] = table
+    local_cache.memory.clear()
+
+    assert local_cache.get_arrow(_key("a")).equals(table)
+    assert local_cache[_key("a")].equals(table.to_pandas())
+
+
+def test_cache_decorator_with_arrow_tables(local_cache):
+    @storage.cache()
+    def cacheable_func() -> pa.Table:
+        return pa.table({"amora": [4], "storage": [2]})
+
+    with patch.object(settings, "STORAGE_CACHE_ENABLED", True), patch.object(
+        storage, "CACHE", local_cache
+    ):
+        uncached_call_result = cacheable_func()
+        cached_call_result = cacheable_func()
+
+    assert local_cache.memory.stats.hits == 1
+    assert isinstance(cached_call_result, pa.Table)
+    assert cached_call_result.equals(uncached_call_result)
+
+
+def test_Cache_put_and_iter_batches(local_cache):
+    batches = [
+        pa.RecordBatch.from_pydict({"value": list(range(i, i + 10))}) for i in (0, 10)
+    ]
+    local_cache.put_batches(_key("a"), iter(batches))
+
+    assert local_cache.memory.stats.entries == 0
+    streamed = list(local_cache.iter_batches(_key("a"), batch_size=5))
+    assert len(streamed) == 4
+    assert pa.Table.from_batches(streamed).equals(pa.Table.from_batches(batches))
+    assert local_cache.get_arrow(_key("a")).equals(pa.Table.from_batches(batches))
+
+
+def test_Cache_put_batches_without_batches(local_cache):
+    local_cache.put_batches(_key("a"), iter([]))
+
+    assert list(local_cache.iter_batches(_key("a"))) == []
+
+
+def test_Cache_put_batches_is_atomic(local_cache):
+    def failing_batches():
+        yield pa.RecordBatch.from_pydict({"value": [1]})
+        raise ValueError("Query failed")
+
+    with pytest.raises(ValueError, match="Query failed"):
+        local_cache.put_batches(_key("a"), failing_batches())
+
+    assert os.listdir(settings.STORAGE_LOCAL_CACHE_PATH) == []
+    with pytest.raises(KeyError):
+        local_cache.iter_batches(_key("a"))
+
+
+def test_cache_decorator_with_record_batch_iterators(local_cache):
+    calls = []
+
+    @storage.cache()
+    def cacheable_func() -> Iterator[pa.RecordBatch]:
+        calls.append(1)
+        yield pa.RecordBatch.from_pydict({"value": [1, 2]})
+        yield pa.RecordBatch.from_pydict({"value": [3]})
+
+    with patch.object(settings, "STORAGE_CACHE_ENABLED", True), patch.object(
+        storage, "CACHE", local_cache
+    ):
+        uncached_call_result = pa.Table.from_batches(cacheable_func())
+        cached_call_result = pa.Table.from_batches(cacheable_func())
+
+    assert len(calls) == 1
+    assert cached_call_result.equals(uncached_call_result)
+    assert cached_call_result.column("value").to_pylist() == [1, 2, 3]
+
+
+@pytest.mark.parametrize(
+    "key_mode, expected_suffix, expected_ttl",
+    [
+        (StorageCacheKeyModes.ttl, "4", timedelta(days=1)),
+        (StorageCacheKeyModes.content, "4.version-4", None),
+    ],
+)
+def test_cache_decorator_with_version(key_mode, expected_suffix, expected_ttl):
+    @storage.cache(
+        suffix=lambda arg: str(arg),
+        ttl=timedelta(days=1),
+        version=lambda arg: f"version-{arg}",
+    )
+    def cacheable_func(arg):
+        return pd.DataFrame([{"amora": arg}])
+
+    with patch.multiple(
+        settings, STORAGE_CACHE_ENABLED=True, STORAGE_CACHE_KEY_MODE=key_mode
+    ), patch("amora.storage.CACHE") as CACHE:
+        cacheable_func(4)
+
+    cache_key = CACHE.get_or_compute.call_args.args[0]
+    assert cache_key.suffix == expected_suffix
+    assert cache_key.ttl == expected_ttl